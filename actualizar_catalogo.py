@@ -9,10 +9,24 @@ Estrategia de matching optimizada:
   4. Selección del scraper con MÁS productos (no el más reciente)
 """
 
-import os, json, glob, re, unicodedata
+import os, sys, json, re
 from datetime import datetime
 from collections import defaultdict
 
+import numpy as np
+import pandas as pd
+
+from scripts.core.delta import aplicar_deltas
+from scripts.core.etapas import Etapa, Pipeline
+from scripts.core.indice_jaccard import firma, indice_persistente
+from scripts.core.jaccard_matricial import MatrizJaccard
+from scripts.core.cache_matches import CacheMatches
+from scripts.core import normalizacion
+from scripts.core.normalizacion import CacheNombres, tokenizar
+from scripts.core.referencia import compilado, hojas, huella
+from scripts.core.columnar import FALTA
+from scripts.core.salida import aplicar_escala, convertir_columnar, leer_columnas, leer_productos, listar_outputs, manifiesto
+
 try:
     import openpyxl
     EXCEL_DISPONIBLE = True
@@ -31,6 +45,14 @@ RAW_DIR         = os.path.join(BASE_DIR, "data", "raw")
 CODIGOS_FILE    = os.path.join(RAW_DIR, "CODIGOS.xlsx")
 MAESTRO_FILE    = os.path.join(RAW_DIR, "Listado Maestro 09-03.xlsx")
 OUTPUT_FILE     = os.path.join(BASE_DIR, "BRUJULA-DE-PRECIOS", "data", "processed", "catalogo_unificado.json")
+INDICES_DIR     = os.path.join(BASE_DIR, "data", "cache_indices")
+MATCHES_FILE    = os.path.join(INDICES_DIR, "matches.json")
+ESTADO_FILE     = os.path.join(INDICES_DIR, "catalogo_estado.json")
+HUNTERPRICE_FILE = os.path.join(BASE_DIR, "archive", "data_hunterprice.json")
+HP_CACHE_DIAS   = 7   # vida de un link hunterprice -> MaxiCarrefour en el cache de matches
+
+# Únicos campos de los productos de los scrapers que usa el catálogo
+CAMPOS_SCRAPER = ("sku", "nombre", "precio", "imagen", "ean", "categoria", "sector")
 
 # ---------------------------------------------------------------------------
 # Sectores
@@ -78,37 +100,9 @@ def mapear_sector_yaguar(raw):
 # Normalización de nombres
 # ---------------------------------------------------------------------------
 def clave_nombre(nombre):
-    """Clave de matching: sin acentos, unidades canónicas, sin puntuación."""
-    n = (nombre or "").lower().strip()
-    n = unicodedata.normalize("NFD", n)
-    n = "".join(c for c in n if unicodedata.category(c) != "Mn")
-    # Decimales con coma → punto  ("1,5" → "1.5")
-    n = re.sub(r"(\d),(\d)", r"\1.\2", n)
-    # Eliminar puntuación excepto punto decimal y dígitos
-    n = re.sub(r"[^a-z0-9. ]", " ", n)
-    # Eliminar 'x' multiplicador antes de número ("x354ml", "x 6", "x500g" → cantidad sin x)
-    n = re.sub(r"\bx\s*(\d)", r"\1", n)
-    # Canonicalizar unidades de volumen/masa/cantidad
-    # CM3 y CC son equivalentes a ML
-    n = re.sub(r"(\d+)\s*cm3\b",  lambda m: m.group(1)+"ml",  n)
-    n = re.sub(r"(\d+)\s*ccm\b",  lambda m: m.group(1)+"ml",  n)
-    # Litros → ml para unificar comparaciones de cantidad
-    n = re.sub(r"(\d+\.?\d*)\s*lts?\b", lambda m: str(int(float(m.group(1))*1000))+"ml", n)
-    n = re.sub(r"(\d+\.?\d*)\s*lt\b",   lambda m: str(int(float(m.group(1))*1000))+"ml", n)
-    # "L" aislado después de número → ml  ("1.5 l" → "1500ml", "2 l" → "2000ml")
-    n = re.sub(r"(\d+\.?\d*)\s*l\b",    lambda m: str(int(float(m.group(1))*1000))+"ml", n)
-    # GRS → GR
-    n = re.sub(r"(\d+)\s*grs\b", lambda m: m.group(1)+"gr", n)
-    # KG → GR
-    n = re.sub(r"(\d+\.?\d*)\s*kgs?\b", lambda m: str(int(float(m.group(1))*1000))+"gr", n)
-    # UNIDADES: "uni" → "un" (variante larga, ej "X 2 Uni", "12 Uni")
-    n = re.sub(r"(\d+)\s*uni\b", lambda m: m.group(1)+"un", n)
-    # Pegar dígito+unidad (sin espacio) para matching exacto
-    n = re.sub(r"(\d+)\s*(cc|ml|gr|kg|un|ul)\b", r"\1\2", n)
-    # Eliminar puntos residuales
-    n = re.sub(r"\.", " ", n)
-    n = re.sub(r"\s+", " ", n).strip()
-    return n
+    """Clave de matching: sin acentos, unidades canónicas, sin puntuación.
+    ("Gaseosa Cola x 2,25 Lts." → "gaseosa cola 2250ml"; ver scripts/core/normalizacion.py)"""
+    return tokenizar(nombre).clave
 
 def normalizar_nombre_display(nombre):
     """Nombre limpio para mostrar al usuario."""
@@ -158,6 +152,9 @@ def mejor_imagen(imagenes):
 # ---------------------------------------------------------------------------
 def cargar_excel_referencia():
     """
+    Mapas de referencia de CODIGOS.xlsx y el Listado Maestro. Se arman una vez
+    y quedan en un snapshot (scripts/core/referencia.py) hasta que cambie alguno
+    de los Excel o el código que los interpreta.
     Retorna:
       yag_sku_to_ean  : SKU Yaguar  -> EAN
       mco_sku_to_ean  : SKU Maxiconsumo -> EAN
@@ -166,6 +163,17 @@ def cargar_excel_referencia():
       ean_to_master   : EAN -> {nombre, sector, categoria, abc}
       nombre_norm_to_ean : nombre_normalizado -> EAN  (NUEVO - fallback por nombre)
     """
+    if not EXCEL_DISPONIBLE:
+        return {}, {}, {}, {}, {}, {}
+    fuentes = [f for f in (CODIGOS_FILE, MAESTRO_FILE) if os.path.isfile(f)]
+    fuentes += [os.path.abspath(__file__), normalizacion.__file__]
+    mapas = compilado("referencia_catalogo", fuentes, _leer_excel_referencia)
+    print(f"  Referencia: {len(mapas[0])} SKUs Yaguar, {len(mapas[1])} SKUs Maxiconsumo, "
+          f"{len(mapas[4])} EANs y {len(mapas[5])} nombres del Maestro")
+    return mapas
+
+
+def _leer_excel_referencia():
     yag_sku_to_ean  = {}
     mco_sku_to_ean  = {}
     ean_to_yag_sku  = {}
@@ -173,16 +181,13 @@ def cargar_excel_referencia():
     ean_to_master   = {}
     nombre_norm_to_ean = {}
 
-    if not EXCEL_DISPONIBLE:
-        return yag_sku_to_ean, mco_sku_to_ean, ean_to_yag_sku, ean_to_mco_sku, ean_to_master, nombre_norm_to_ean
-
     # --- CODIGOS.xlsx ---
     if os.path.isfile(CODIGOS_FILE):
-        wb = openpyxl.load_workbook(CODIGOS_FILE, read_only=True, data_only=True)
+        wb = hojas(CODIGOS_FILE)
 
         # YAGUAR: col1=SKU Yaguar, col2=EAN
-        if "YAGUAR" in wb.sheetnames:
-            for row in wb["YAGUAR"].iter_rows(min_row=2, values_only=True):
+        if "YAGUAR" in wb:
+            for row in wb["YAGUAR"][1:]:
                 sku_raw, ean_raw = row[1], row[2]
                 if not sku_raw or not ean_raw:
                     continue
@@ -196,8 +201,8 @@ def cargar_excel_referencia():
                     pass
 
         # MAXICONSUMO: col1=SKU, col3=EAN (Código de barras)
-        if "MAXICONSUMO" in wb.sheetnames:
-            for row in wb["MAXICONSUMO"].iter_rows(min_row=2, values_only=True):
+        if "MAXICONSUMO" in wb:
+            for row in wb["MAXICONSUMO"][1:]:
                 sku_raw, ean_raw = row[1], row[3]
                 if not sku_raw or not ean_raw:
                     continue
@@ -210,7 +215,6 @@ def cargar_excel_referencia():
                 except (ValueError, TypeError):
                     pass
 
-        wb.close()
         print(f"  CODIGOS.xlsx: Yaguar={len(yag_sku_to_ean)} SKUs, Maxiconsumo={len(mco_sku_to_ean)} SKUs")
         print(f"  Mapas inversos: EAN->Yaguar={len(ean_to_yag_sku)}, EAN->Maxiconsumo={len(ean_to_mco_sku)}")
     else:
@@ -218,9 +222,7 @@ def cargar_excel_referencia():
 
     # --- Listado Maestro ---
     if os.path.isfile(MAESTRO_FILE):
-        wb = openpyxl.load_workbook(MAESTRO_FILE, read_only=True, data_only=True)
-        ws = wb["Sheet1"]
-        for row in ws.iter_rows(min_row=2, values_only=True):
+        for row in hojas(MAESTRO_FILE)["Sheet1"][1:]:
             nombre  = row[1]
             abc     = str(row[2] or "").strip().upper()
             sector  = row[3]
@@ -256,7 +258,6 @@ def cargar_excel_referencia():
             if clave and len(clave) > 5:
                 nombre_norm_to_ean[clave] = ean_val
 
-        wb.close()
         print(f"  Listado Maestro: {len(ean_to_master)} EANs, {len(nombre_norm_to_ean)} nombres indexados")
     else:
         print(f"  [WARN] No encontrado: {MAESTRO_FILE}")
@@ -274,105 +275,139 @@ def precios_validos(data):
     """Cuenta productos con precio razonable para Argentina (> $200)."""
     return sum(1 for p in data if p.get("precio", 0) > 200)
 
-def encontrar_mejor(directorio, patron, max_check=8):
+def productos_corregidos(ruta):
+    """
+    Itera un output (.json o .jsonl[.gz]) con la escala de precios corregida
+    según su manifiesto (una sola pasada en streaming; el promedio del archivo
+    ya está en el manifiesto). Sólo trae CAMPOS_SCRAPER, de la versión
+    columnar del output si la tiene.
+    """
+    escala = manifiesto(ruta)["escala"]
+    for p in leer_productos(ruta, CAMPOS_SCRAPER):
+        yield aplicar_escala(p, escala)
+
+def productos_delta(ruta):
+    """Productos de un delta (crawl --delta), con el mismo filtro que los outputs completos."""
+    for p in productos_corregidos(ruta):
+        if str(p.get("sku", "")).strip() and p.get("precio", 0) > 0:
+            yield p
+
+def encontrar_mejor(directorio, prefijo, max_check=8):
     """
     Evalua los ultimos max_check archivos y elige el mejor por:
       score = productos_con_precio_valido (>$200)
     Descarta archivos con precio promedio < $200 (bug x1000).
+    El score sale del manifiesto de cada archivo; sólo el elegido se lee.
     """
-    archivos = sorted(
-        glob.glob(os.path.join(directorio, patron)),
-        key=os.path.getmtime, reverse=True
-    )[:max_check]
+    archivos = listar_outputs(directorio, prefijo, max_check)
 
     if not archivos:
         return None, []
 
     mejor_archivo = None
-    mejor_data    = []
     mejor_score   = -1
 
     for f in archivos:
         try:
-            with open(f, encoding="utf-8") as fh:
-                data = json.load(fh)
-            prom = precio_promedio(data)
-            if 0 < prom < 200:
-                for p in data:
-                    if 0 < p.get("precio", 0) < 200:
-                        p["precio"] = round(p["precio"] * 1000, 2)
-            elif prom >= 200:
-                for p in data:
-                    if 0 < p.get("precio", 0) < 100:
-                        p["precio"] = round(p["precio"] * 100, 2)
-            score = precios_validos(data)
+            score = manifiesto(f)["precios_validos"]
             if score > mejor_score:
                 mejor_score   = score
                 mejor_archivo = f
-                mejor_data    = data
         except Exception:
             pass
 
-    return mejor_archivo, mejor_data
+    if mejor_archivo is None:
+        return None, []
+    return mejor_archivo, list(productos_corregidos(mejor_archivo))
 
 
-def cargar_yaguar():
+def combinar_por_sku(archivos):
     """
-    Combina los últimos max_check archivos de Yaguar por SKU único.
-    Para cada SKU, usa el producto del archivo más reciente con precio válido (>$200).
-    Esto maximiza la cobertura de productos sin requerir scraping perfecto en cada run.
+    Un producto por SKU a partir de varios outputs (del más reciente al más
+    viejo). Queda la primera aparición de cada SKU con precio > 0, salvo que
+    su precio sea < $200 y el SKU aparezca después con uno > $200: entonces
+    la primera de esas.
+    Todo por columnas: sku y precio de todos los archivos van a un DataFrame,
+    el fix de escala de cada archivo (de su manifiesto) es una máscara y el
+    ganador por SKU sale de dos drop_duplicates (primera fila por grupo). Sólo
+    se arman dicts para los productos elegidos. Los archivos sin precios o
+    repetidos (mismo sha1) se saltean sin leerlos.
+    Devuelve (productos, {archivo: manifiesto} de los que se pudieron abrir).
     """
-    archivos = sorted(
-        glob.glob(os.path.join(YAGUAR_DIR, "output_yaguar_*.json")),
-        key=os.path.getmtime, reverse=True
-    )[:8]
-
-    if not archivos:
-        print("  [SKIP] No se encontró output de Yaguar")
-        return []
-
-    sku_to_mejor = {}
-    archivos_validos = 0
-
+    abiertos, tablas, vistos = {}, [], set()
     for f in archivos:
         try:
-            with open(f, encoding="utf-8") as fh:
-                data = json.load(fh)
-            if not data:
+            m = manifiesto(f)
+            abiertos[f] = m
+            if not m["con_precio"] or m["sha1"] in vistos:
                 continue
-            prom = precio_promedio(data)
-            if 0 < prom < 200:
-                for p in data:
-                    if 0 < p.get("precio", 0) < 200:
-                        p["precio"] = round(p["precio"] * 1000, 2)
-            elif prom >= 200:
-                for p in data:
-                    if 0 < p.get("precio", 0) < 100:
-                        p["precio"] = round(p["precio"] * 100, 2)
-            archivos_validos += 1
-            for p in data:
-                sku = str(p.get("sku", "")).strip()
-                precio = p.get("precio", 0)
-                if not sku or precio <= 0:
-                    continue
-                existing = sku_to_mejor.get(sku)
-                if existing is None:
-                    sku_to_mejor[sku] = p
-                else:
-                    precio_ex = existing.get("precio", 0)
-                    if precio > 200 and precio_ex < 200:
-                        sku_to_mejor[sku] = p
+            vistos.add(m["sha1"])
+            tablas.append((m["escala"], leer_columnas(f, CAMPOS_SCRAPER)))
         except Exception:
             pass
+    if not tablas:
+        return [], abiertos
+
+    partes, escalados = [], []
+    for i, (escala, cols) in enumerate(tablas):
+        precio = np.array([0 if v is FALTA else v for v in cols["precio"]], dtype=float)
+        escalar = np.zeros(len(precio), dtype=bool)
+        if escala:
+            escalar = (precio > 0) & (precio < escala[1])
+            precio[escalar] = [round(v * escala[0], 2) for v in precio[escalar].tolist()]
+        escalados.append(escalar)
+        partes.append(pd.DataFrame({
+            "sku": ["" if v is FALTA else str(v).strip() for v in cols["sku"]],
+            "precio": precio,
+            "archivo": i,
+            "fila": np.arange(len(precio)),
+        }))
+    df = pd.concat(partes, ignore_index=True)
+    df = df[(df["sku"] != "") & (df["precio"] > 0)]
+
+    primeros = df.drop_duplicates("sku").set_index("sku")
+    validos = df[df["precio"] > 200].drop_duplicates("sku").set_index("sku").reindex(primeros.index)
+    reemplazar = (validos["archivo"].notna() & (primeros["precio"] < 200)).to_numpy()
+    archivo = np.where(reemplazar, validos["archivo"], primeros["archivo"]).astype(np.int64)
+    fila = np.where(reemplazar, validos["fila"], primeros["fila"]).astype(np.int64)
+
+    productos = []
+    for a, r in zip(archivo.tolist(), fila.tolist()):
+        escala, cols = tablas[a]
+        p = {c: cols[c][r] for c in CAMPOS_SCRAPER if cols[c][r] is not FALTA}
+        if escalados[a][r]:
+            p["precio"] = round(p["precio"] * escala[0], 2)
+        productos.append(p)
+    return productos, abiertos
+
 
-    combined = list(sku_to_mejor.values())
+def cargar_yaguar():
+    """
+    Combina los últimos 8 archivos de Yaguar por SKU único (combinar_por_sku):
+    para cada SKU, el producto del archivo más reciente, prefiriendo un precio
+    válido (>$200). Esto maximiza la cobertura de productos sin requerir
+    scraping perfecto en cada run.
+    """
+    archivos = listar_outputs(YAGUAR_DIR, "output_yaguar_", 8)
+
+    if not archivos:
+        print("  [SKIP] No se encontró output de Yaguar")
+        return []
+
+    combined, abiertos = combinar_por_sku(archivos)
+    archivos_validos = sum(1 for m in abiertos.values() if m["productos"])
+    # Categorías re-scrapeadas con --delta después del último output completo
+    combined, n_deltas = aplicar_deltas(combined, YAGUAR_DIR, "yaguar", "categoria",
+                                        desde=os.path.getmtime(archivos[0]), leer=productos_delta)
     con_precio = precios_validos(combined)
     print(f"  Yaguar: {archivos_validos} archivos combinados -> {len(combined)} prods únicos ({con_precio} válidos)")
+    if n_deltas:
+        print(f"    + {n_deltas} deltas aplicados")
     return combined
 
 
 def cargar_maxicarrefour():
-    archivo, data = encontrar_mejor(MAXICARRE_DIR, "output_maxicarrefour_*.json")
+    archivo, data = encontrar_mejor(MAXICARRE_DIR, "output_maxicarrefour_")
     if not archivo:
         print("  [SKIP] No se encontró output de MaxiCarrefour")
         return []
@@ -385,76 +420,51 @@ def cargar_maxicarrefour():
 
 def cargar_maxiconsumo():
     """
-    Carga y combina los archivos de Maxiconsumo disponibles.
-    Estrategia: para cada SKU, prefiere el precio del archivo con mayor
-    promedio (enriquecido) si es válido (>$200); sino usa el raw.
+    Carga y combina los archivos de Maxiconsumo disponibles (combinar_por_sku):
+    para cada SKU, el producto del archivo más reciente, salvo que tenga un
+    precio inválido (<$200) y un archivo más viejo lo tenga válido.
     Así se aprovecha la mayor cobertura del raw y la mayor calidad del enriquecido.
     """
     if not os.path.isdir(MAXICONSUMO_DIR):
         return []
 
-    archivos = sorted(
-        glob.glob(os.path.join(MAXICONSUMO_DIR, "output_maxiconsumo_*.json")),
-        key=os.path.getmtime, reverse=True
-    )[:8]
+    archivos = listar_outputs(MAXICONSUMO_DIR, "output_maxiconsumo_", 8)
     if not archivos:
         return []
 
-    # Cargar todos los archivos y construir un mapa SKU → mejor precio
-    sku_to_mejor = {}   # sku → producto con mejor precio validado
-    archivos_cargados = []
-
-    for f in archivos:
-        try:
-            with open(f, encoding="utf-8") as fh:
-                data = json.load(fh)
-            prom = precio_promedio(data)
-            # Fix precio × 1000 si el promedio es sospechosamente bajo
-            if 0 < prom < 200:
-                for p in data:
-                    if 0 < p.get("precio", 0) < 200:
-                        p["precio"] = round(p["precio"] * 1000, 2)
-            elif prom >= 200:
-                for p in data:
-                    if 0 < p.get("precio", 0) < 100:
-                        p["precio"] = round(p["precio"] * 100, 2)
-            archivos_cargados.append((f, data, precio_promedio(data)))
-        except Exception:
-            pass
-
-    if not archivos_cargados:
+    combined, abiertos = combinar_por_sku(archivos)
+    if not abiertos:
         return []
 
-    # Combinar: para cada SKU usar el archivo con precio más alto (>$200 preferido)
-    for _, data, prom_f in archivos_cargados:
-        for p in data:
-            sku = str(p.get("sku", "")).strip()
-            precio = p.get("precio", 0)
-            if not sku or precio <= 0:
-                continue
-            existing = sku_to_mejor.get(sku)
-            if existing is None:
-                sku_to_mejor[sku] = p
-            else:
-                precio_ex = existing.get("precio", 0)
-                # Preferir precio válido (>$200) sobre inválido (<$200)
-                if precio > 200 and precio_ex < 200:
-                    sku_to_mejor[sku] = p
-                elif precio > 200 and precio_ex > 200 and precio > precio_ex:
-                    # Si ambos válidos, quedarse con el del archivo más reciente
-                    # (el primero en la iteración ya es el más reciente, no sobreescribir)
-                    pass
-
-    combined = list(sku_to_mejor.values())
+    # Categorías re-scrapeadas con --delta después del último output completo
+    combined, n_deltas = aplicar_deltas(combined, MAXICONSUMO_DIR, "maxiconsumo", "sector",
+                                        desde=os.path.getmtime(archivos[0]), leer=productos_delta)
     con_precio = sum(1 for p in combined if p.get("precio", 0) > 200)
     bajos = sum(1 for p in combined if 0 < p.get("precio", 0) < 200)
-    print(f"  Maxiconsumo: {len(archivos_cargados)} archivos combinados -> {len(combined)} productos")
+    print(f"  Maxiconsumo: {len(abiertos)} archivos combinados -> {len(combined)} productos")
+    if n_deltas:
+        print(f"    + {n_deltas} deltas aplicados")
     print(f"    {con_precio} precios válidos (>$200), {bajos} precios bajos (<$200)")
     return combined
 
 
+def convertir_outputs():
+    """--columnar: versión columnar de los outputs y deltas que lee el catálogo."""
+    convertidos = 0
+    for directorio, prefijos in ((YAGUAR_DIR, ("output_yaguar_", "delta_yaguar_")),
+                                 (MAXICARRE_DIR, ("output_maxicarrefour_",)),
+                                 (MAXICONSUMO_DIR, ("output_maxiconsumo_", "delta_maxiconsumo_"))):
+        for prefijo in prefijos:
+            for f in listar_outputs(directorio, prefijo):
+                try:
+                    convertidos += convertir_columnar(f)
+                except Exception as e:
+                    print(f"  [WARN] {os.path.basename(f)}: {e}")
+    print(f"  Columnar: {convertidos} outputs convertidos")
+
+
 def cargar_hunterprice():
-    ruta = os.path.join(BASE_DIR, "archive", "data_hunterprice.json")
+    ruta = HUNTERPRICE_FILE
     if not os.path.isfile(ruta):
         print("  [SKIP] No encontrado: archive/data_hunterprice.json")
         return []
@@ -465,48 +475,127 @@ def cargar_hunterprice():
     print(f"  Hunterprice: {len(data)} productos total, {len(filtrado)} con precio MaxiCarrefour")
     return filtrado
 
+# ---------------------------------------------------------------------------
+# Salteo sin cambios (--solo-si-cambio)
+#   Si no cambió el contenido de ninguna entrada del catálogo (fuentes, Excel,
+#   hunterprice, código) se mantiene el catalogo_unificado.json anterior y no
+#   se arma nada. Si cambió algo, aunque sea un output de un solo scraper, el
+#   catálogo se arma entero como en una corrida normal: los pasos cruzan las
+#   tres fuentes (links por nombre, puente hunterprice) y los precios de una
+#   fuente deciden outliers y fusiones de productos de las otras, así que no
+#   se reutilizan filas del catálogo anterior. Lo único que se ahorra en ese
+#   caso es releer las fuentes sin outputs nuevos, que salen de un snapshot.
+#   Recalcular sólo los productos de la fuente que cambió queda pendiente; por
+#   eso los scrape_*.py no pasan el flag.
+# ---------------------------------------------------------------------------
+CORE_DIR = os.path.join(BASE_DIR, "scripts", "core")
+CODIGO_CARGA = [__file__] + [os.path.join(CORE_DIR, f) for f in ("salida.py", "columnar.py", "delta.py")]
+CODIGO_CATALOGO = [__file__] + [os.path.join(CORE_DIR, f) for f in (
+    "normalizacion.py", "jaccard_matricial.py", "indice_jaccard.py", "cache_matches.py", "etapas.py")]
+
+# fuente -> (directorio, prefijo de outputs, prefijo de deltas, cargador)
+FUENTES = {
+    "yaguar":        (YAGUAR_DIR, "output_yaguar_", "delta_yaguar_", cargar_yaguar),
+    "maxicarrefour": (MAXICARRE_DIR, "output_maxicarrefour_", None, cargar_maxicarrefour),
+    "maxiconsumo":   (MAXICONSUMO_DIR, "output_maxiconsumo_", "delta_maxiconsumo_", cargar_maxiconsumo),
+}
+
+def archivos_fuente(directorio, prefijo, prefijo_delta):
+    """Outputs que mira el cargador de una fuente y los deltas que aplicaría, en el orden en que los usa."""
+    archivos = listar_outputs(directorio, prefijo, 8)
+    if archivos and prefijo_delta:
+        desde = os.path.getmtime(archivos[0])
+        archivos += [f for f in reversed(listar_outputs(directorio, prefijo_delta)) if os.path.getmtime(f) > desde]
+    return archivos
+
+def cargar_fuente(nombre):
+    """(productos, huella del contenido) de una fuente, del snapshot si sus archivos no cambiaron."""
+    directorio, prefijo, prefijo_delta, cargar = FUENTES[nombre]
+    leidas = []
+
+    def construir():
+        leidas.append(nombre)
+        data = cargar()
+        return data, firma(data)
+
+    data, h = compilado(f"fuente_{nombre}", archivos_fuente(directorio, prefijo, prefijo_delta) + CODIGO_CARGA, construir)
+    if not leidas:
+        print(f"  {nombre}: sin outputs nuevos -> {len(data)} productos del snapshot")
+    return data, h
+
+def huellas_fijas():
+    """Huellas de las entradas del catálogo que no son scrapers."""
+    def _de(rutas):
+        return firma(*[huella(r) if os.path.isfile(r) else "" for r in rutas])
+    return {
+        "referencia":  _de([CODIGOS_FILE, MAESTRO_FILE]),
+        "hunterprice": _de([HUNTERPRICE_FILE]),
+        "codigo":      _de(CODIGO_CATALOGO),
+    }
+
+def leer_estado():
+    try:
+        with open(ESTADO_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def guardar_estado(entradas):
+    """Huellas de las entradas con las que se armó el catalogo_unificado.json actual."""
+    estado = {"entradas": entradas, "salida": huella(OUTPUT_FILE), "fecha": datetime.now().strftime("%Y-%m-%d")}
+    os.makedirs(INDICES_DIR, exist_ok=True)
+    tmp = f"{ESTADO_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=1)
+    os.replace(tmp, ESTADO_FILE)
+
+def catalogo_vigente(estado, entradas):
+    """
+    True si el catálogo en disco es el que se armó con estas mismas entradas.
+    Vence a los HP_CACHE_DIAS: los links hunterprice del cache de matches
+    también vencen y una corrida completa los volvería a buscar.
+    """
+    if estado.get("entradas") != entradas or not os.path.isfile(OUTPUT_FILE):
+        return False
+    try:
+        dias = (datetime.now() - datetime.strptime(estado["fecha"], "%Y-%m-%d")).days
+    except (KeyError, ValueError):
+        return False
+    return dias < HP_CACHE_DIAS and huella(OUTPUT_FILE) == estado.get("salida")
+
 # ---------------------------------------------------------------------------
 # Constructor del catálogo unificado
 # ---------------------------------------------------------------------------
-def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
-                       yag_sku_to_ean, mco_sku_to_ean,
-                       ean_to_yag_sku, ean_to_mco_sku,
-                       ean_to_master, nombre_norm_to_ean):
-
-    catalogo = {}   # prod_id -> entry
-
-    # ------------------------------------------------------------------
-    # Helpers
-    # ------------------------------------------------------------------
-    def info_master(ean, fb_nombre, fb_sector):
-        if ean and ean in ean_to_master:
-            m = ean_to_master[ean]
-            return m["nombre"], m["sector"], m["categoria"], m["abc"]
-        return normalizar_nombre_display(fb_nombre), normalizar_sector(fb_sector), "", ""
-
-    def nuevo_producto(prod_id, ean, nombre, imagen, sector, subcategoria, abc=""):
-        return {
-            "id_unificado":   prod_id,
-            "ean":            ean,
-            "nombre_display": nombre,
-            "imagen":         imagen,
-            "sector":         sector,
-            "subcategoria":   subcategoria,
-            "abc":            abc,
-            "precios":        {"yaguar": 0, "maxicarrefour": 0, "maxiconsumo": 0},
-            "fuentes":        {},
-        }
-
-    def resolver_ean(sku, sku_to_ean, nombre):
-        """Obtiene EAN para un producto: CODIGOS primero, luego nombre->Maestro."""
-        ean = sku_to_ean.get(str(sku).strip(), "")
-        if not ean and nombre:
-            ean = nombre_norm_to_ean.get(clave_nombre(nombre), "")
-        return ean
-
-    # ------------------------------------------------------------------
-    # PASO 1: Indexar Yaguar y Maxiconsumo por SKU y por nombre
-    # ------------------------------------------------------------------
+def _info_master(ean_to_master, ean, fb_nombre, fb_sector):
+    if ean and ean in ean_to_master:
+        m = ean_to_master[ean]
+        return m["nombre"], m["sector"], m["categoria"], m["abc"]
+    return normalizar_nombre_display(fb_nombre), normalizar_sector(fb_sector), "", ""
+
+def _nuevo_producto(prod_id, ean, nombre, imagen, sector, subcategoria, abc=""):
+    return {
+        "id_unificado":   prod_id,
+        "ean":            ean,
+        "nombre_display": nombre,
+        "imagen":         imagen,
+        "sector":         sector,
+        "subcategoria":   subcategoria,
+        "abc":            abc,
+        "precios":        {"yaguar": 0, "maxicarrefour": 0, "maxiconsumo": 0},
+        "fuentes":        {},
+    }
+
+def _resolver_ean(nombres, nombre_norm_to_ean, sku, sku_to_ean, nombre):
+    """Obtiene EAN para un producto: CODIGOS primero, luego nombre->Maestro."""
+    ean = sku_to_ean.get(str(sku).strip(), "")
+    if not ean and nombre:
+        ean = nombre_norm_to_ean.get(nombres.clave(nombre), "")
+    return ean
+
+# ------------------------------------------------------------------
+# PASO 1: Indexar Yaguar y Maxiconsumo por SKU y por nombre
+# ------------------------------------------------------------------
+def _indexar_yaguar(yaguar_data, nombres):
     yag_by_sku   = {}
     yag_by_clave = {}
     for p in yaguar_data:
@@ -515,8 +604,10 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
         if sku:
             yag_by_sku[sku] = p
         if nom:
-            yag_by_clave[clave_nombre(nom)] = p
+            yag_by_clave[nombres.clave(nom)] = p
+    return {"yag_by_sku": yag_by_sku, "yag_by_clave": yag_by_clave}
 
+def _indexar_maxiconsumo(maxiconsumo_data, nombres):
     mco_by_sku   = {}
     mco_by_clave = {}
     for p in maxiconsumo_data:
@@ -527,52 +618,48 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
         if sku:
             mco_by_sku[sku] = p
         if nom:
-            mco_by_clave[clave_nombre(nom)] = p
-
-    yag_merged = set()   # SKUs de Yaguar ya procesados
-    mco_merged = set()   # SKUs de Maxiconsumo ya procesados
-
-    # ------------------------------------------------------------------
-    # PASO 1b: Enriquecer ean_to_yag_sku y ean_to_mco_sku con Listado Maestro
-    #   Tres estrategias en orden: campo ean externo → nombre exacto → Jaccard fuzzy.
-    #   El índice fuzzy corre sobre nombre_norm_to_ean (25k+ entradas del Maestro)
-    #   con threshold 0.60 — igual que enriquecer_eans.py pero sin depender del
-    #   archivo preseleccionado por encontrar_mejor().
-    # ------------------------------------------------------------------
-    _FUZZ1B_TH   = 0.60
-    _FUZZ1B_STOP = {"de", "la", "el", "en", "y", "x", "con", "por", "para",
-                    "un", "una", "del", "los", "las", "al", "ml", "gr", "cc", "kg"}
-    _fuzz_entries  = []   # (clave, word_set, ean)
-    _fuzz_word_idx = defaultdict(list)
-    for _clave, _ean in nombre_norm_to_ean.items():
-        _ws = {w for w in _clave.split() if len(w) > 1 and w not in _FUZZ1B_STOP}
-        if not _ws:
-            continue
-        _fi = len(_fuzz_entries)
-        _fuzz_entries.append((_clave, _ws, _ean))
-        for _fw in _ws:
-            _fuzz_word_idx[_fw].append(_fi)
-
-    def _fuzzy_ean_1b(nombre_prod):
-        _cl   = clave_nombre(nombre_prod)
-        _ws_p = {w for w in _cl.split() if len(w) > 1 and w not in _FUZZ1B_STOP}
-        if not _ws_p:
-            return ""
-        _cands = set()
-        for _w in _ws_p:
-            for _i in _fuzz_word_idx.get(_w, []):
-                _cands.add(_i)
-        _best_sim = 0.0
-        _best_ean = ""
-        for _i in _cands:
-            _, _ws_m, _ean = _fuzz_entries[_i]
-            _inter = len(_ws_p & _ws_m)
-            _union = len(_ws_p | _ws_m)
-            _sim   = _inter / _union if _union else 0.0
-            if _sim > _best_sim:
-                _best_sim = _sim
-                _best_ean = _ean
-        return _best_ean if _best_sim >= _FUZZ1B_TH else ""
+            mco_by_clave[nombres.clave(nom)] = p
+    return {"mco_by_sku": mco_by_sku, "mco_by_clave": mco_by_clave}
+
+# ------------------------------------------------------------------
+# PASO 1b: Enriquecer ean_to_yag_sku y ean_to_mco_sku con Listado Maestro
+#   Tres estrategias en orden: campo ean externo → nombre exacto → Jaccard fuzzy.
+#   El índice fuzzy corre sobre nombre_norm_to_ean (25k+ entradas del Maestro)
+#   con threshold 0.60 — igual que enriquecer_eans.py pero sin depender del
+#   archivo preseleccionado por encontrar_mejor().
+# ------------------------------------------------------------------
+_FUZZ1B_TH   = 0.60
+_FUZZ1B_STOP = {"de", "la", "el", "en", "y", "x", "con", "por", "para",
+                "un", "una", "del", "los", "las", "al", "ml", "gr", "cc", "kg"}
+
+def _indice_1b(nombre_norm_to_ean):
+    # El índice del Maestro sólo cambia con el Maestro: se reutiliza el de la corrida anterior
+    indice = indice_persistente(
+        os.path.join(INDICES_DIR, "maestro_1b.npz"),
+        (({w for w in _clave.split() if len(w) > 1 and w not in _FUZZ1B_STOP}, _ean)
+         for _clave, _ean in nombre_norm_to_ean.items()),
+        sorted(_FUZZ1B_STOP),
+    )
+    return {"indice_1b": indice}
+
+def _paso_1b(yaguar_data, maxiconsumo_data, ean_to_yag_sku, ean_to_mco_sku,
+             nombre_norm_to_ean, indice_1b, nombres, cache_matches):
+    # Los links del 1b sólo dependen del nombre, del Maestro y del umbral
+    if cache_matches is not None:
+        cache_matches.version("1b", os.path.getmtime(MAESTRO_FILE) if os.path.isfile(MAESTRO_FILE) else 0,
+                              _FUZZ1B_TH, sorted(_FUZZ1B_STOP))
+
+    def _fuzzy_ean_1b(fuente, sku, nombre_prod):
+        _e = nombres(nombre_prod)
+        if cache_matches is not None:
+            guardado = cache_matches.buscar("1b", fuente, sku, _e.clave)
+            if guardado is not None:
+                return guardado[0]
+        _ws_p = {w for w in _e.tokens if len(w) > 1 and w not in _FUZZ1B_STOP}
+        _ean, _sim = indice_1b.mejor(_ws_p, _FUZZ1B_TH) if _ws_p else (None, 0.0)
+        if cache_matches is not None:
+            cache_matches.guardar("1b", fuente, sku, _e.clave, _ean or "", _sim)
+        return _ean or ""
 
     ean_yag_nuevos = 0
     yag_sku_set = set(ean_to_yag_sku.values())
@@ -582,9 +669,9 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
             continue
         ean_resuelto = str(p.get("ean", "") or "").strip()
         if not ean_resuelto or ean_resuelto in ("0", "None", "nan"):
-            ean_resuelto = nombre_norm_to_ean.get(clave_nombre(p.get("nombre", "")), "")
+            ean_resuelto = nombre_norm_to_ean.get(nombres.clave(p.get("nombre", "")), "")
         if not ean_resuelto:
-            ean_resuelto = _fuzzy_ean_1b(p.get("nombre", ""))
+            ean_resuelto = _fuzzy_ean_1b("yaguar", sku, p.get("nombre", ""))
         if ean_resuelto and ean_resuelto not in ean_to_yag_sku:
             ean_to_yag_sku[ean_resuelto] = sku
             yag_sku_set.add(sku)
@@ -598,20 +685,28 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
             continue
         ean_resuelto = str(p.get("ean", "") or "").strip()
         if not ean_resuelto or ean_resuelto in ("0", "None", "nan"):
-            ean_resuelto = nombre_norm_to_ean.get(clave_nombre(p.get("nombre", "")), "")
+            ean_resuelto = nombre_norm_to_ean.get(nombres.clave(p.get("nombre", "")), "")
         if not ean_resuelto:
-            ean_resuelto = _fuzzy_ean_1b(p.get("nombre", ""))
+            ean_resuelto = _fuzzy_ean_1b("maxiconsumo", sku, p.get("nombre", ""))
         if ean_resuelto and ean_resuelto not in ean_to_mco_sku:
             ean_to_mco_sku[ean_resuelto] = sku
             mco_sku_set.add(sku)
             ean_mco_nuevos += 1
 
     print(f"  Paso 1b: +{ean_yag_nuevos} EANs Yaguar via Maestro, +{ean_mco_nuevos} EANs Maxiconsumo via Maestro")
-
-    # ------------------------------------------------------------------
-    # PASO 2: MaxiCarrefour como HUB (100% EAN)
-    #   Para cada producto MC busca en Yaguar y Maxiconsumo via CODIGOS
-    # ------------------------------------------------------------------
+    st = indice_1b.stats()
+    print(f"  Paso 1b: {st['consultas']} búsquedas fuzzy, {st['candidatos']} candidatos puntuados "
+          f"({st['sin_poda']} sin filtro de prefijo)")
+    return {"ean_to_yag_sku": ean_to_yag_sku, "ean_to_mco_sku": ean_to_mco_sku}
+
+# ------------------------------------------------------------------
+# PASO 2: MaxiCarrefour como HUB (100% EAN)
+#   Para cada producto MC busca en Yaguar y Maxiconsumo via CODIGOS
+# ------------------------------------------------------------------
+def _paso_2(maxicarre_data, ean_to_master, ean_to_yag_sku, ean_to_mco_sku, yag_by_sku, mco_by_sku):
+    catalogo = {}        # prod_id -> entry
+    yag_merged = set()   # SKUs de Yaguar ya procesados
+    mco_merged = set()   # SKUs de Maxiconsumo ya procesados
     stats_mc = {"match_yag": 0, "match_mco": 0, "nuevo": 0}
 
     for p in maxicarre_data:
@@ -624,9 +719,9 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
         imagen_mc   = p.get("imagen", "")
         sector_raw  = p.get("sector", "")
 
-        nombre_display, sector, subcategoria, abc = info_master(ean, nombre, sector_raw)
+        nombre_display, sector, subcategoria, abc = _info_master(ean_to_master, ean, nombre, sector_raw)
 
-        entry = nuevo_producto(ean, ean, nombre_display, imagen_mc, sector, subcategoria, abc)
+        entry = _nuevo_producto(ean, ean, nombre_display, imagen_mc, sector, subcategoria, abc)
         entry["precios"]["maxicarrefour"] = precio
         entry["fuentes"]["maxicarrefour"] = {"nombre": nombre, "imagen": imagen_mc}
 
@@ -678,10 +773,12 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
     print(f"  MaxiCarrefour: {stats_mc['nuevo']} productos procesados")
     print(f"    -> Matches Yaguar via CODIGOS:      {stats_mc['match_yag']}")
     print(f"    -> Matches Maxiconsumo via CODIGOS: {stats_mc['match_mco']}")
+    return {"catalogo": catalogo, "yag_merged": yag_merged, "mco_merged": mco_merged}
 
-    # ------------------------------------------------------------------
-    # PASO 3: Yaguar - productos no mergeados con MaxiCarrefour
-    # ------------------------------------------------------------------
+# ------------------------------------------------------------------
+# PASO 3: Yaguar - productos no mergeados con MaxiCarrefour
+# ------------------------------------------------------------------
+def _paso_3(yaguar_data, yag_sku_to_ean, ean_to_master, nombre_norm_to_ean, nombres, catalogo, yag_merged):
     stats_yag = {"match_ean_catalogo": 0, "match_nombre_maestro": 0, "nuevo": 0}
 
     for p in yaguar_data:
@@ -698,9 +795,9 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
         sector_raw = mapear_sector_yaguar(p.get("categoria", ""))
 
         # Resolver EAN
-        ean = resolver_ean(sku, yag_sku_to_ean, nombre)
+        ean = _resolver_ean(nombres, nombre_norm_to_ean, sku, yag_sku_to_ean, nombre)
 
-        nombre_display, sector, subcategoria, abc = info_master(ean, nombre, sector_raw)
+        nombre_display, sector, subcategoria, abc = _info_master(ean_to_master, ean, nombre, sector_raw)
 
         if ean and ean in catalogo:
             # El EAN ya existe en catálogo (poco probable, pero por si acaso)
@@ -716,7 +813,7 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
                 img_final = imagen
                 if "/0000-" in img_final and ean:
                     img_final = f"https://tupedido.carrefour.com.ar/imagenesPDA/{ean}.jpg"
-                entry = nuevo_producto(prod_id, ean, nombre_display, img_final, sector, subcategoria, abc)
+                entry = _nuevo_producto(prod_id, ean, nombre_display, img_final, sector, subcategoria, abc)
                 catalogo[prod_id] = entry
                 stats_yag["nuevo"] += 1
 
@@ -730,17 +827,19 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
     print(f"  Yaguar (restantes): {stats_yag['nuevo']} nuevos, "
           f"{stats_yag['match_ean_catalogo']} match EAN, "
           f"{stats_yag['match_nombre_maestro']} con EAN via Maestro")
+    return {"catalogo": catalogo, "yag_merged": yag_merged}
 
-    # ------------------------------------------------------------------
-    # PASO 4: Maxiconsumo - productos no mergeados
-    # ------------------------------------------------------------------
+# ------------------------------------------------------------------
+# PASO 4: Maxiconsumo - productos no mergeados
+# ------------------------------------------------------------------
+def _paso_4(maxiconsumo_data, mco_sku_to_ean, ean_to_master, nombre_norm_to_ean, nombres, catalogo, mco_merged):
     stats_mco = {"match_ean_catalogo": 0, "match_nombre_yaguar": 0, "nuevo": 0}
 
     # Índice de claves de productos Yaguar sin EAN (para match por nombre)
     yag_clave_a_id = {}
     for prod_id, entry in catalogo.items():
         if not entry.get("ean") or prod_id.startswith("yaguar_"):
-            clave = clave_nombre(entry["nombre_display"])
+            clave = nombres.clave(entry["nombre_display"])
             if clave:
                 yag_clave_a_id[clave] = prod_id
 
@@ -758,9 +857,9 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
         sector_raw = p.get("sector", "")
 
         # Resolver EAN
-        ean = resolver_ean(sku, mco_sku_to_ean, nombre)
+        ean = _resolver_ean(nombres, nombre_norm_to_ean, sku, mco_sku_to_ean, nombre)
 
-        nombre_display, sector, subcategoria, abc = info_master(ean, nombre, sector_raw)
+        nombre_display, sector, subcategoria, abc = _info_master(ean_to_master, ean, nombre, sector_raw)
 
         if ean and ean in catalogo:
             # EAN ya en catálogo
@@ -773,7 +872,7 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
             continue
 
         # Fallback: match por nombre con Yaguar sin EAN
-        clave = clave_nombre(nombre_display)
+        clave = nombres.clave(nombre_display)
         if clave in yag_clave_a_id:
             prod_id = yag_clave_a_id[clave]
             catalogo[prod_id]["precios"]["maxiconsumo"] = precio
@@ -787,7 +886,7 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
         # Producto nuevo
         prod_id = ean if ean else f"mco_{sku}"
         if prod_id not in catalogo:
-            entry = nuevo_producto(prod_id, ean, nombre_display, imagen, sector, subcategoria, abc)
+            entry = _nuevo_producto(prod_id, ean, nombre_display, imagen, sector, subcategoria, abc)
             catalogo[prod_id] = entry
             stats_mco["nuevo"] += 1
 
@@ -798,151 +897,114 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
     print(f"  Maxiconsumo (restantes): {stats_mco['nuevo']} nuevos, "
           f"{stats_mco['match_ean_catalogo']} match EAN, "
           f"{stats_mco['match_nombre_yaguar']} match nombre Yaguar")
-
-    # ------------------------------------------------------------------
-    # PASO 5: Hunterprice bridge (triple Jaccard matching)
-    #   Para cada producto de hunterprice:
-    #     1. Buscar en MaxiCarrefour por nombre → obtener EAN → entry en catálogo
-    #     2. Si le falta Yaguar: buscar en Yaguar scraper por nombre
-    #     3. Si le falta Maxiconsumo: buscar en Maxiconsumo scraper por nombre
-    #   Esto cubre productos que CODIGOS no pudo linkear por EAN.
-    # ------------------------------------------------------------------
-    hp_data = cargar_hunterprice()
-    stats_hp = {"completados_yag": 0, "completados_mco": 0, "no_match_mc": 0}
-
-    # Palabras de ruido para matching
-    _STOP = {"x", "de", "la", "el", "y", "con", "sin", "pet", "pvc",
-             "bot", "sdo", "fco", "brik", "p", "s", "en"}
-
-    def _pals(clave):
-        return {w for w in clave.split()
-                if len(w) > 1 and w not in _STOP and not w.isdigit()}
-
-    # Captura tanto números dentro de tokens de unidad ("1500ml", "500gr")
-    # como números sueltos ("12", "4"). Dos grupos: uno con unidad, uno sin.
-    _NUM_RE = re.compile(r"(\d+)(?:ml|gr|kg|un|cc)\b|\b(\d{2,5})\b")
-
-    def _nums(clave):
-        """Extrae números significativos (cantidad/tamaño) de una clave.
-        Captura tanto '1500' de '1500ml' como números sueltos tipo '12'.
-        """
-        result = set()
-        for m in _NUM_RE.finditer(clave):
-            n = m.group(1) or m.group(2)
-            if n:
-                result.add(n)
-        return result
-
-    def _mejor_match(hp_ps, entries_list, word_index, threshold, hp_clave="", qty_ref=""):
-        """
-        Mejor match Jaccard en entries_list para hp_ps.
-        Si el referente de cantidad (qty_ref > hp_clave cuando disponible) tiene números,
-        el candidato debe compartir al menos uno. Esto evita cruzar tamaños distintos.
-        qty_ref se usa para validar cantidad; si vacío, se cae a hp_clave.
-        """
-        cands = set()
-        for _w in hp_ps:
-            for _i in word_index.get(_w, []):
-                cands.add(_i)
-        if not cands:
-            return None, 0.0
-        # Preferir qty_ref (ej. nombre de MaxiCarrefour en catálogo) sobre hp_clave
-        # para la validación de cantidad, ya que MC tiene el EAN correcto.
-        _ref = qty_ref if qty_ref else hp_clave
-        hp_numeros = _nums(_ref) if _ref else set()
-        mejor_sim = 0.0
-        mejor_val = None
-        for _i in cands:
-            _entry = entries_list[_i]
-            _val   = _entry[0]
-            _ps_c  = _entry[1]
-            _clave_c = _entry[2] if len(_entry) > 2 else ""
-            _inter = len(hp_ps & _ps_c)
-            _union = len(hp_ps | _ps_c)
-            _sim = _inter / _union if _union else 0.0
-            if _sim < threshold:
-                continue
-            # Validar compatibilidad de cantidades
-            # Si el referente tiene números y el candidato también, deben coincidir al menos 1
-            if hp_numeros and _clave_c:
-                _mc_numeros = _nums(_clave_c)
-                if _mc_numeros and not (hp_numeros & _mc_numeros):
-                    continue  # cantidades incompatibles
-            if _sim > mejor_sim:
-                mejor_sim = _sim
-                mejor_val = _val
-        if not mejor_val:
-            return None, mejor_sim
-        return mejor_val, mejor_sim
-
-    _TH = 0.50  # Jaccard mínimo
-
-    # Índice invertido MaxiCarrefour: (ean, pals, clave)
-    mc_entries_hp = []
-    mc_word_idx   = defaultdict(list)
+    return {"catalogo": catalogo, "mco_merged": mco_merged}
+
+# ------------------------------------------------------------------
+# PASO 5: Hunterprice bridge (triple Jaccard matching)
+#   Para cada producto de hunterprice:
+#     1. Buscar en MaxiCarrefour por nombre → obtener EAN → entry en catálogo
+#     2. Si le falta Yaguar: buscar en Yaguar scraper por nombre
+#     3. Si le falta Maxiconsumo: buscar en Maxiconsumo scraper por nombre
+#   Esto cubre productos que CODIGOS no pudo linkear por EAN.
+#
+# Palabras (sin ruido) y cantidades de cada nombre: nombres(n).palabras / .cantidades
+# Los matches Jaccard se resuelven en bloque (MatrizJaccard.mejores) para todas
+# las filas. Si el referente de cantidad (las del nombre MaxiCarrefour o, si no
+# hay, las de hunterprice) tiene números, el candidato debe compartir al menos
+# uno. Esto evita cruzar tamaños distintos.
+# ------------------------------------------------------------------
+_HP_TH = 0.50  # Jaccard mínimo
+
+def _indices_hp(maxicarre_data, yaguar_data, maxiconsumo_data, nombres):
+    # MaxiCarrefour: pals -> ean
+    mc_hp = MatrizJaccard()
     for _p in maxicarre_data:
         _ean = str(_p.get("ean", "")).strip()
         _nom = _p.get("nombre", "")
         if not _ean or not _nom:
             continue
-        _cl = clave_nombre(_nom)
-        _ps = _pals(_cl)
-        if not _ps:
-            continue
-        _i = len(mc_entries_hp)
-        mc_entries_hp.append((_ean, _ps, _cl))
-        for _w in _ps:
-            mc_word_idx[_w].append(_i)
-
-    # Índice invertido Yaguar: (producto, pals, clave)
-    yag_entries_hp = []
-    yag_word_idx   = defaultdict(list)
+        _e = nombres(_nom)
+        if _e.palabras:
+            mc_hp.agregar(_e.palabras, _ean, _e.cantidades)
+
+    # Yaguar: pals -> producto
+    yag_hp = MatrizJaccard()
     for _p in yaguar_data:
         _nom = _p.get("nombre", "")
         if not _nom or _p.get("precio", 0) <= 0:
             continue
-        _cl = clave_nombre(_nom)
-        _ps = _pals(_cl)
-        if not _ps:
-            continue
-        _i = len(yag_entries_hp)
-        yag_entries_hp.append((_p, _ps, _cl))
-        for _w in _ps:
-            yag_word_idx[_w].append(_i)
-
-    # Índice invertido Maxiconsumo: (producto, pals, clave)
-    mco_entries_hp = []
-    mco_word_idx   = defaultdict(list)
+        _e = nombres(_nom)
+        if _e.palabras:
+            yag_hp.agregar(_e.palabras, _p, _e.cantidades)
+
+    # Maxiconsumo: pals -> producto
+    mco_hp = MatrizJaccard()
     for _p in maxiconsumo_data:
         _nom = _p.get("nombre", "")
         if not _nom or _p.get("precio", 0) <= 0:
             continue
-        _cl = clave_nombre(_nom)
-        _ps = _pals(_cl)
-        if not _ps:
-            continue
-        _i = len(mco_entries_hp)
-        mco_entries_hp.append((_p, _ps, _cl))
-        for _w in _ps:
-            mco_word_idx[_w].append(_i)
-
-    for hp in hp_data:
+        _e = nombres(_nom)
+        if _e.palabras:
+            mco_hp.agregar(_e.palabras, _p, _e.cantidades)
+    return {"mc_hp": mc_hp, "yag_hp": yag_hp, "mco_hp": mco_hp}
+
+def _filas_hp(nombres):
+    hp_filas = []   # (hp, nombres(hp_nombre))
+    for hp in cargar_hunterprice():
         hp_nombre = (hp.get("Descripcion_Norm") or hp.get("Nombre_Unificado") or "").strip()
         if not hp_nombre:
             continue
-        hp_ps = _pals(clave_nombre(hp_nombre))
-        if not hp_ps:
+        hp_e = nombres(hp_nombre)
+        if not hp_e.palabras:
             continue
+        if not hp.get("YAGUAR") and not hp.get("MAXICONSUMO"):
+            continue
+        hp_filas.append((hp, hp_e))
+    return {"hp_filas": hp_filas}
+
+def _hp_maxicarrefour(hp_filas, mc_hp, cache_matches):
+    # PASO A (en bloque): Encontrar EAN via MaxiCarrefour.
+    # Del cache sólo se toman los links positivos cuyo EAN sigue en MaxiCarrefour y
+    # con menos de HP_CACHE_DIAS (un producto nuevo en MC puede ser mejor match);
+    # los que no tuvieron match se vuelven a buscar.
+    eans_mc = [None] * len(hp_filas)
+    if cache_matches is not None:
+        cache_matches.version("hunterprice", _HP_TH)
+        _eans_mc_validos = set(mc_hp.valores)
+        for _i, (_, hp_e) in enumerate(hp_filas):
+            guardado = cache_matches.buscar("hunterprice", "maxicarrefour", "", hp_e.clave, HP_CACHE_DIAS)
+            if guardado is not None and guardado[0] in _eans_mc_validos:
+                eans_mc[_i] = tuple(guardado)
+    _faltan = [i for i, r in enumerate(eans_mc) if r is None]
+    for _i, r in zip(_faltan, mc_hp.mejores([hp_filas[i][1].palabras for i in _faltan], _HP_TH,
+                                            [hp_filas[i][1].cantidades for i in _faltan])):
+        eans_mc[_i] = r
+        if cache_matches is not None and r[0]:
+            cache_matches.guardar("hunterprice", "maxicarrefour", "", hp_filas[_i][1].clave, r[0], r[1])
+    return {"eans_mc": eans_mc}
+
+def _paso_5(hp_filas, eans_mc, yag_hp, mco_hp, nombres, catalogo, ean_to_yag_sku, ean_to_mco_sku,
+            yag_by_sku, mco_by_sku, yag_merged, mco_merged):
+    stats_hp = {"completados_yag": 0, "completados_mco": 0, "no_match_mc": 0}
+
+    # Cantidad de referencia = nombre del producto en MaxiCarrefour (tiene EAN correcto).
+    # Usarla en PASO B y C para no cruzar tamaños distintos cuando HP no tiene unidad.
+    qty_refs = []
+    for (_, hp_e), (ean, _) in zip(hp_filas, eans_mc):
+        _mc_src_nombre = catalogo[ean]["fuentes"].get("maxicarrefour", {}).get("nombre", "") if ean in catalogo else ""
+        _qty_ref = nombres(_mc_src_nombre) if _mc_src_nombre else hp_e
+        qty_refs.append(_qty_ref.cantidades if _qty_ref.clave else hp_e.cantidades)
 
+    # Jaccard sobre Yaguar / Maxiconsumo scraper (en bloque, MC como referente de cantidad)
+    _consultas = [e.palabras for _, e in hp_filas]
+    yag_hp_match = yag_hp.mejores(_consultas, _HP_TH, qty_refs)
+    mco_hp_match = mco_hp.mejores(_consultas, _HP_TH, qty_refs)
+
+    for (hp, hp_e), (ean, _), (yag_jacc, _), (mco_jacc, _) in zip(hp_filas, eans_mc, yag_hp_match, mco_hp_match):
         hp_tiene_yag = bool(hp.get("YAGUAR"))
         hp_tiene_mco = bool(hp.get("MAXICONSUMO"))
-        if not hp_tiene_yag and not hp_tiene_mco:
-            continue
-
-        hp_clave = clave_nombre(hp_nombre)
 
-        # PASO A: Encontrar EAN via MaxiCarrefour
-        ean, sim_mc = _mejor_match(hp_ps, mc_entries_hp, mc_word_idx, _TH, hp_clave)
+        # PASO A: EAN via MaxiCarrefour
         if not ean:
             stats_hp["no_match_mc"] += 1
             continue
@@ -951,11 +1013,6 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
             continue
         entry = catalogo[ean]
 
-        # Cantidad de referencia = nombre del producto en MaxiCarrefour (tiene EAN correcto).
-        # Usarla en PASO B y C para no cruzar tamaños distintos cuando HP no tiene unidad.
-        _mc_src_nombre = entry["fuentes"].get("maxicarrefour", {}).get("nombre", "")
-        _qty_ref = clave_nombre(_mc_src_nombre) if _mc_src_nombre else hp_clave
-
         # PASO B: Completar Yaguar si falta
         if hp_tiene_yag and entry["precios"].get("yaguar", 0) == 0:
             # Primero via CODIGOS (ya intentado en PASO 2, pero por si acaso)
@@ -963,7 +1020,7 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
             yag_prod = yag_by_sku.get(yag_sku) if yag_sku else None
             # Si no: Jaccard sobre Yaguar scraper (usar MC como referente de cantidad)
             if not yag_prod:
-                yag_prod, _ = _mejor_match(hp_ps, yag_entries_hp, yag_word_idx, _TH, hp_clave, qty_ref=_qty_ref)
+                yag_prod = yag_jacc
                 yag_sku = str(yag_prod.get("sku", "")).strip() if yag_prod else ""
             if yag_prod and yag_prod.get("precio", 0) > 0:
                 entry["precios"]["yaguar"] = yag_prod["precio"]
@@ -981,7 +1038,7 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
             mco_sku  = ean_to_mco_sku.get(ean)
             mco_prod = mco_by_sku.get(mco_sku) if mco_sku else None
             if not mco_prod:
-                mco_prod, _ = _mejor_match(hp_ps, mco_entries_hp, mco_word_idx, _TH, hp_clave, qty_ref=_qty_ref)
+                mco_prod = mco_jacc
                 mco_sku = str(mco_prod.get("sku", "")).strip() if mco_prod else ""
             if mco_prod and mco_prod.get("precio", 0) > 0:
                 entry["precios"]["maxiconsumo"] = mco_prod["precio"]
@@ -997,14 +1054,36 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
     print(f"  Hunterprice bridge: +{stats_hp['completados_yag']} Yaguar, "
           f"+{stats_hp['completados_mco']} Maxiconsumo | "
           f"{stats_hp['no_match_mc']} sin match MC")
-
-    # ------------------------------------------------------------------
-    # PASO 6: Post-proceso
-    #   - Validación cruzada de precios (descarta outliers)
-    #   - Eliminar productos sin precio
-    #   - Reparar imágenes 0000- con CDN Carrefour (si tienen EAN)
-    #   - Fusionar duplicados de nombre exacto
-    # ------------------------------------------------------------------
+    return {"catalogo": catalogo, "yag_merged": yag_merged, "mco_merged": mco_merged}
+
+# ------------------------------------------------------------------
+# PASO 6: Post-proceso
+#   - Validación cruzada de precios (descarta outliers)
+#   - Eliminar productos sin precio
+#   - Reparar imágenes 0000- con CDN Carrefour (si tienen EAN)
+#   - Fusionar duplicados de nombre exacto
+# ------------------------------------------------------------------
+def _fusionar_grupo(items):
+    """Fusiona una lista de productos al mejor representante (prioridad: EAN real)."""
+    base = max(items, key=lambda x: bool(x.get("ean")))
+    for item in items:
+        for fuente, precio in item["precios"].items():
+            if precio > 0 and base["precios"].get(fuente, 0) == 0:
+                base["precios"][fuente] = precio
+        for fuente, info in item.get("fuentes", {}).items():
+            if fuente not in base["fuentes"]:
+                base["fuentes"][fuente] = info
+        if not base.get("imagen") or "/0000-" in base.get("imagen", ""):
+            if item.get("imagen") and "/0000-" not in item.get("imagen", ""):
+                base["imagen"] = item["imagen"]
+        if not base.get("abc") and item.get("abc"):
+            base["abc"] = item["abc"]
+    return base
+
+def _es_sintetico(prod_id):
+    return str(prod_id).startswith("yaguar_") or str(prod_id).startswith("mco_")
+
+def _paso_6(catalogo, nombres):
     lista = list(catalogo.values())
 
     # ------ Validación cruzada de precios ------
@@ -1039,26 +1118,6 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
         if ("/0000-" in img or not img) and ean:
             p["imagen"] = f"https://tupedido.carrefour.com.ar/imagenesPDA/{ean}.jpg"
 
-    def _fusionar_grupo(items):
-        """Fusiona una lista de productos al mejor representante (prioridad: EAN real)."""
-        base = max(items, key=lambda x: bool(x.get("ean")))
-        for item in items:
-            for fuente, precio in item["precios"].items():
-                if precio > 0 and base["precios"].get(fuente, 0) == 0:
-                    base["precios"][fuente] = precio
-            for fuente, info in item.get("fuentes", {}).items():
-                if fuente not in base["fuentes"]:
-                    base["fuentes"][fuente] = info
-            if not base.get("imagen") or "/0000-" in base.get("imagen", ""):
-                if item.get("imagen") and "/0000-" not in item.get("imagen", ""):
-                    base["imagen"] = item["imagen"]
-            if not base.get("abc") and item.get("abc"):
-                base["abc"] = item["abc"]
-        return base
-
-    def _es_sintetico(prod_id):
-        return str(prod_id).startswith("yaguar_") or str(prod_id).startswith("mco_")
-
     # Paso 6a: Fusionar duplicados de nombre_display exacto
     por_nombre = defaultdict(list)
     for p in lista:
@@ -1077,7 +1136,7 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
     #   Si ambos tienen EAN real, son SKUs genuinamente distintos → no tocar.
     por_clave = defaultdict(list)
     for p in lista_paso6a:
-        por_clave[clave_nombre(p["nombre_display"])].append(p)
+        por_clave[nombres.clave(p["nombre_display"])].append(p)
 
     lista_final = []
     fusiones_norm = 0
@@ -1095,77 +1154,71 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
 
     if fusiones_norm:
         print(f"  Paso 6b: {fusiones_norm} duplicados por nombre normalizado fusionados")
-
-    # ------------------------------------------------------------------
-    # PASO 6c: Fusión fuzzy de productos complementarios
-    #   Para cada producto con precios faltantes, busca en los productos
-    #   que tienen esa(s) fuente(s) faltante(s) usando Jaccard > 0.82.
-    #   Prioridad de base: maxicarrefour (tiene EAN) > yaguar > maxiconsumo.
-    # ------------------------------------------------------------------
-    _STOP6 = {"de", "la", "el", "y", "con", "sin", "pet", "pvc",
-              "bot", "sdo", "fco", "brik", "p", "s", "en"}
-    # Mismo patrón que _NUM_RE: captura números dentro de unidades y sueltos
-    _NUM6  = re.compile(r"(\d+)(?:ml|gr|kg|un|cc)\b|\b(\d{2,6})\b")
-
-    def _w6(clave):
-        return {w for w in clave.split() if len(w) > 1 and w not in _STOP6 and not w.isdigit()}
-
-    def _n6(clave):
-        result = set()
-        for m in _NUM6.finditer(clave):
-            n = m.group(1) or m.group(2)
-            if n:
-                result.add(n)
-        return result
-
-    _TH6 = 0.65
-
-    def _buscar_candidato(ws_p, ns_p, index_entries, index_wi, usados):
-        """Devuelve (idx_en_lista_final, sim) del mejor match fuzzy."""
-        cands = set()
-        for w in ws_p:
-            for ei in index_wi.get(w, []):
-                cands.add(ei)
-        mejor_sim = 0.0
-        mejor_idx = None
-        for ei in cands:
-            lf_idx, ws_c, cl_c, ns_c = index_entries[ei]
-            if lf_idx in usados:
-                continue
-            inter = len(ws_p & ws_c)
-            union = len(ws_p | ws_c)
-            sim   = inter / union if union else 0.0
-            if sim < _TH6:
-                continue
-            if ns_p and ns_c and not (ns_p & ns_c):
-                continue  # cantidades incompatibles
-            if sim > mejor_sim:
-                mejor_sim = sim
-                mejor_idx = lf_idx
-        return mejor_idx, mejor_sim
-
-    # Construir índices por fuente
+    return {"lista": lista_final}
+
+# ------------------------------------------------------------------
+# PASO 6c: Fusión fuzzy de productos complementarios
+#   Para cada producto con precios faltantes, busca en los productos
+#   que tienen esa(s) fuente(s) faltante(s) usando Jaccard > 0.82.
+#   Prioridad de base: maxicarrefour (tiene EAN) > yaguar > maxiconsumo.
+# ------------------------------------------------------------------
+# Palabras: nombres(n).palabras (mismo filtro de ruido que el puente hunterprice)
+# Como normalizacion.cantidades() pero hasta 6 dígitos: captura números dentro de unidades y sueltos
+_NUM6  = re.compile(r"(\d+)(?:ml|gr|kg|un|cc)\b|\b(\d{2,6})\b")
+
+def _n6(clave):
+    result = set()
+    for m in _NUM6.finditer(clave):
+        n = m.group(1) or m.group(2)
+        if n:
+            result.add(n)
+    return result
+
+_TH6 = 0.65
+
+def _paso_6c(lista, nombres):
+    lista_final = lista
+
+    # Construir matrices por fuente
     def _build_index(fuente, lista):
-        """(idx_lista_final, ws, cl, ns) para productos que TIENEN fuente y solo fuente."""
-        entries = []
-        wi      = defaultdict(list)
+        """Palabras -> idx_lista_final (con sus cantidades) de los productos que TIENEN fuente."""
+        matriz = MatrizJaccard()
         for idx, p in enumerate(lista):
             if p["precios"].get(fuente, 0) <= 0:
                 continue
-            cl = clave_nombre(p["nombre_display"])
-            ws = _w6(cl)
-            ns = _n6(cl)
-            if not ws:
-                continue
-            ei = len(entries)
-            entries.append((idx, ws, cl, ns))
-            for w in ws:
-                wi[w].append(ei)
-        return entries, wi
-
-    mc_idx_entries,  mc_idx_wi  = _build_index("maxicarrefour", lista_final)
-    yag_idx_entries, yag_idx_wi = _build_index("yaguar", lista_final)
-    mco_idx_entries, mco_idx_wi = _build_index("maxiconsumo", lista_final)
+            e = nombres(p["nombre_display"])
+            if e.palabras:
+                matriz.agregar(e.palabras, idx, _n6(e.clave))
+        return matriz
+
+    # Las fusiones se aplican recién al final (parches), así que nombres y precios
+    # no cambian durante el loop: los candidatos de cada producto incompleto se
+    # calculan en bloque de antemano, ya filtrados por umbral y cantidades
+    # compatibles y ordenados de mejor a peor. En el loop sólo se descartan los usados.
+    consultas_6c = []   # (idx_p, ws_p, ns_p)
+    for idx_p, p in enumerate(lista_final):
+        if sum(1 for f in ("maxicarrefour", "yaguar", "maxiconsumo") if p["precios"].get(f, 0) > 0) == 3:
+            continue
+        e_p = nombres(p["nombre_display"])
+        if e_p.palabras:
+            consultas_6c.append((idx_p, e_p.palabras, _n6(e_p.clave)))
+    fila_6c = {idx_p: i for i, (idx_p, _, _) in enumerate(consultas_6c)}
+
+    candidatos_6c = {}
+    for fuente in ("maxicarrefour", "yaguar", "maxiconsumo"):
+        matriz = _build_index(fuente, lista_final)
+        inicios, docs, _ = matriz.pares([c[1] for c in consultas_6c], _TH6, [c[2] for c in consultas_6c])
+        valores = matriz.valores
+        candidatos_6c[fuente] = (inicios, [valores[d] for d in docs.tolist()])
+
+    def _buscar_candidato(fuente, idx_p, usados):
+        """idx_en_lista_final del mejor match fuzzy todavía libre, o None."""
+        inicios, cands = candidatos_6c[fuente]
+        i = fila_6c[idx_p]
+        for lf_idx in cands[inicios[i]:inicios[i + 1]]:
+            if lf_idx != idx_p and lf_idx not in usados and lf_idx not in parches:
+                return lf_idx
+        return None
 
     fusiones_fuzzy = 0
     usados_como_base = set()   # índices de lista_final que ya absorbieron algo
@@ -1184,22 +1237,15 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
         if n_fuentes == 3:
             continue  # completo
 
-        cl_p = clave_nombre(p["nombre_display"])
-        ws_p = _w6(cl_p)
-        ns_p = _n6(cl_p)
-        if not ws_p:
-            continue
+        if idx_p not in fila_6c:
+            continue  # sin palabras útiles
 
         # Buscar fuentes faltantes en orden de prioridad
-        for fuente_falt, entries_f, wi_f in [
-            ("maxicarrefour", mc_idx_entries,  mc_idx_wi),
-            ("yaguar",        yag_idx_entries, yag_idx_wi),
-            ("maxiconsumo",   mco_idx_entries, mco_idx_wi),
-        ]:
+        for fuente_falt in ("maxicarrefour", "yaguar", "maxiconsumo"):
             if pr.get(fuente_falt, 0) > 0:
                 continue  # ya tiene esta fuente
 
-            lf_idx, sim = _buscar_candidato(ws_p, ns_p, entries_f, wi_f, usados_como_base | set(parches.keys()) | {idx_p})
+            lf_idx = _buscar_candidato(fuente_falt, idx_p, usados_como_base)
             if lf_idx is None:
                 continue
 
@@ -1249,29 +1295,26 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
     lista_final = [p for p in lista_final if not p.get("_eliminar")]
 
     print(f"  Paso 6c: {fusiones_fuzzy} fusiones fuzzy complementarias")
+    return {"lista": lista_final}
+
+# ------------------------------------------------------------------
+# PASO 6d: Validación de cantidad entre fuentes (cleanup defensivo)
+#   Para cada producto con 2+ fuentes, extrae la cantidad (en unidades
+#   canónicas) del nombre de cada fuente. Si una fuente tiene cantidades
+#   incompatibles con el "ancla" (MC > Yaguar > MCO), la elimina.
+#   Sólo actúa cuando hay diferencia > 2x para evitar falsos positivos
+#   en variantes con nombres levemente distintos (ej. 950ml vs 930ml).
+# ------------------------------------------------------------------
+_ANCHOR_ORDER = ["maxicarrefour", "yaguar", "maxiconsumo"]
 
-    # ------------------------------------------------------------------
-    # PASO 6d: Validación de cantidad entre fuentes (cleanup defensivo)
-    #   Para cada producto con 2+ fuentes, extrae la cantidad (en unidades
-    #   canónicas) del nombre de cada fuente. Si una fuente tiene cantidades
-    #   incompatibles con el "ancla" (MC > Yaguar > MCO), la elimina.
-    #   Sólo actúa cuando hay diferencia > 2x para evitar falsos positivos
-    #   en variantes con nombres levemente distintos (ej. 950ml vs 930ml).
-    # ------------------------------------------------------------------
-    _QTY_RE = re.compile(r"(\d+)(?:ml|gr|kg|un|cc)\b|\b(\d{2,5})\b")
+def _paso_6d(lista, nombres):
+    lista_final = lista
 
     def _src_nums(nombre):
         """Extrae numeros de cantidad del nombre crudo de una fuente."""
-        cl = clave_nombre(nombre)
-        result = set()
-        for m in _QTY_RE.finditer(cl):
-            n = m.group(1) or m.group(2)
-            if n:
-                result.add(int(n))
-        return result
+        return {int(n) for n in nombres(nombre).cantidades}
 
     fuentes_eliminadas_6d = 0
-    _ANCHOR_ORDER = ["maxicarrefour", "yaguar", "maxiconsumo"]
 
     for p in lista_final:
         precios_activos = {k: v for k, v in p["precios"].items() if v > 0}
@@ -1321,8 +1364,74 @@ def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
 
     # Eliminar productos que quedaron sin precio tras la limpieza 6d
     lista_final = [p for p in lista_final if any(v > 0 for v in p["precios"].values())]
+    return {"lista": lista_final}
+
+# ------------------------------------------------------------------
+# Pipeline: cada paso con lo que lee y lo que escribe (ver scripts/core/etapas.py).
+# Los índices de Yaguar/Maxiconsumo, el del Maestro y los del puente
+# hunterprice no dependen entre sí: con paralelo=True corren a la vez.
+# ------------------------------------------------------------------
+ETAPAS_CATALOGO = [
+    Etapa("indice_yaguar", _indexar_yaguar, ("yaguar_data", "nombres"), ("yag_by_sku", "yag_by_clave")),
+    Etapa("indice_maxiconsumo", _indexar_maxiconsumo, ("maxiconsumo_data", "nombres"), ("mco_by_sku", "mco_by_clave")),
+    Etapa("indice_1b", _indice_1b, ("nombre_norm_to_ean",), ("indice_1b",)),
+    Etapa("paso_1b", _paso_1b,
+          ("yaguar_data", "maxiconsumo_data", "ean_to_yag_sku", "ean_to_mco_sku",
+           "nombre_norm_to_ean", "indice_1b", "nombres", "cache_matches"),
+          ("ean_to_yag_sku", "ean_to_mco_sku")),
+    Etapa("paso_2", _paso_2,
+          ("maxicarre_data", "ean_to_master", "ean_to_yag_sku", "ean_to_mco_sku", "yag_by_sku", "mco_by_sku"),
+          ("catalogo", "yag_merged", "mco_merged")),
+    Etapa("paso_3", _paso_3,
+          ("yaguar_data", "yag_sku_to_ean", "ean_to_master", "nombre_norm_to_ean", "nombres", "catalogo", "yag_merged"),
+          ("catalogo", "yag_merged")),
+    Etapa("paso_4", _paso_4,
+          ("maxiconsumo_data", "mco_sku_to_ean", "ean_to_master", "nombre_norm_to_ean", "nombres", "catalogo", "mco_merged"),
+          ("catalogo", "mco_merged")),
+    Etapa("indices_hp", _indices_hp, ("maxicarre_data", "yaguar_data", "maxiconsumo_data", "nombres"),
+          ("mc_hp", "yag_hp", "mco_hp")),
+    Etapa("filas_hp", _filas_hp, ("nombres",), ("hp_filas",)),
+    Etapa("hp_maxicarrefour", _hp_maxicarrefour, ("hp_filas", "mc_hp", "cache_matches"), ("eans_mc",)),
+    Etapa("paso_5", _paso_5,
+          ("hp_filas", "eans_mc", "yag_hp", "mco_hp", "nombres", "catalogo", "ean_to_yag_sku", "ean_to_mco_sku",
+           "yag_by_sku", "mco_by_sku", "yag_merged", "mco_merged"),
+          ("catalogo", "yag_merged", "mco_merged")),
+    Etapa("paso_6", _paso_6, ("catalogo", "nombres"), ("lista",)),
+    Etapa("paso_6c", _paso_6c, ("lista", "nombres"), ("lista",)),
+    Etapa("paso_6d", _paso_6d, ("lista", "nombres"), ("lista",)),
+]
 
-    return lista_final
+def construir_catalogo(yaguar_data, maxicarre_data, maxiconsumo_data,
+                       yag_sku_to_ean, mco_sku_to_ean,
+                       ean_to_yag_sku, ean_to_mco_sku,
+                       ean_to_master, nombre_norm_to_ean, cache_matches=None,
+                       paralelo=False, medir_memoria=False):
+    """
+    Corre ETAPAS_CATALOGO e imprime tiempo, memoria y conteos de cada etapa.
+    cache_matches: CacheMatches opcional; los links fuzzy de los pasos 1b y
+    hunterprice se leen de ahí antes de buscarlos y se guardan los nuevos.
+    paralelo: las etapas independientes corren a la vez (hilos).
+    medir_memoria: pico de memoria de cada etapa con tracemalloc (más lento).
+    """
+    # Todos los pasos piden la clave de los mismos nombres: se tokeniza una vez por nombre
+    nombres = CacheNombres()
+    pipeline = Pipeline(ETAPAS_CATALOGO, compartidos=("nombres", "cache_matches"))
+    estado = pipeline.correr({
+        "yaguar_data": yaguar_data, "maxicarre_data": maxicarre_data, "maxiconsumo_data": maxiconsumo_data,
+        "yag_sku_to_ean": yag_sku_to_ean, "mco_sku_to_ean": mco_sku_to_ean,
+        "ean_to_yag_sku": ean_to_yag_sku, "ean_to_mco_sku": ean_to_mco_sku,
+        "ean_to_master": ean_to_master, "nombre_norm_to_ean": nombre_norm_to_ean,
+        "nombres": nombres, "cache_matches": cache_matches,
+    }, paralelo=paralelo, medir_memoria=medir_memoria)
+
+    st = nombres.stats()
+    print(f"  Cache de nombres: {st['nombres']} distintos, {st['pedidos']} pedidos, "
+          f"{st['tasa_aciertos']:.0%} aciertos, ~{st['memoria_kb']} KB")
+    print("  Etapas:")
+    for linea in pipeline.reporte():
+        print(f"    {linea}")
+
+    return estado["lista"]
 
 
 # ---------------------------------------------------------------------------
@@ -1334,23 +1443,54 @@ def main():
     print(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
 
+    solo_si_cambio = "--solo-si-cambio" in sys.argv
+    if solo_si_cambio:
+        print("\nSolo si cambió: cargando fuentes (snapshot si no hay outputs nuevos)...")
+        if "--columnar" in sys.argv:
+            convertir_outputs()
+        datos, entradas = {}, {}
+        for fuente in FUENTES:
+            datos[fuente], entradas[fuente] = cargar_fuente(fuente)
+        entradas.update(huellas_fijas())
+        estado = leer_estado()
+        if catalogo_vigente(estado, entradas):
+            print(f"\n  Sin cambios en las entradas: se mantiene {OUTPUT_FILE}")
+            print("=" * 60)
+            return
+        previas = estado.get("entradas", {})
+        cambiaron = [k for k, h in entradas.items() if previas.get(k) != h]
+        print(f"  Cambiaron: {', '.join(cambiaron) if cambiaron else 'nada (el catálogo anterior no está vigente)'}"
+              " -> se arma el catálogo completo")
+        yaguar, maxicarre, maxiconsumo = datos["yaguar"], datos["maxicarrefour"], datos["maxiconsumo"]
+
     print("\nCargando tablas de referencia (Excel)...")
     (yag_sku_to_ean, mco_sku_to_ean,
      ean_to_yag_sku, ean_to_mco_sku,
      ean_to_master, nombre_norm_to_ean) = cargar_excel_referencia()
 
-    print("\nCargando datos de scrapers (mejor archivo por cantidad)...")
-    yaguar      = cargar_yaguar()
-    maxicarre   = cargar_maxicarrefour()
-    maxiconsumo = cargar_maxiconsumo()
+    if not solo_si_cambio:
+        print("\nCargando datos de scrapers (mejor archivo por cantidad)...")
+        if "--columnar" in sys.argv:
+            convertir_outputs()
+        yaguar      = cargar_yaguar()
+        maxicarre   = cargar_maxicarrefour()
+        maxiconsumo = cargar_maxiconsumo()
 
     print("\nConstruyendo catálogo unificado...")
+    cache_matches = CacheMatches(MATCHES_FILE)
     catalogo = construir_catalogo(
         yaguar, maxicarre, maxiconsumo,
         yag_sku_to_ean, mco_sku_to_ean,
         ean_to_yag_sku, ean_to_mco_sku,
         ean_to_master, nombre_norm_to_ean,
+        cache_matches=cache_matches,
+        paralelo="--paralelo" in sys.argv,
+        medir_memoria="--perfil" in sys.argv,
     )
+    guardadas = cache_matches.escribir()
+    for etapa, (aciertos, fallos) in cache_matches.stats().items():
+        print(f"  Cache de matches {etapa}: {aciertos} aciertos, {fallos} búsquedas nuevas")
+    print(f"  Cache de matches: {guardadas} links guardados en {MATCHES_FILE}")
 
     # Stats
     con_yag  = sum(1 for p in catalogo if p["precios"]["yaguar"] > 0)
@@ -1377,6 +1517,8 @@ def main():
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(catalogo, f, ensure_ascii=False, indent=2)
+    if solo_si_cambio:
+        guardar_estado(entradas)
 
     print(f"\n  Guardado en: {OUTPUT_FILE}")
     print("=" * 60)
@@ -37,8 +37,9 @@ YAGUAR_CONFIG = {
         "referer": "https://yaguar.com.ar/",
     },
     "impersonate": "safari15_3",
-    "delay_entre_paginas": 1.0,
-    "delay_entre_categorias": 2.0,
+    "rps_inicial": 1.0,             # modo secuencial; el limitador adaptativo la ajusta
+    "workers": 4,                   # modo --concurrente
+    "requests_por_segundo": 3.0,    # presupuesto global del modo --concurrente
     "min_products_expected": 1000
 }
 
@@ -68,7 +69,7 @@ MAXICARREFOUR_CONFIG = {
         ("Bazar y Textil", "bazar-y-textil"),
     ],
     "productos_por_pagina": 24,
-    "delay": 0.5,
+    "rps_inicial": 0.5,
     "min_products_expected": 500
 }
 
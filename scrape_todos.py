@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Crawlea Yaguar, Maxiconsumo y MaxiCarrefour en un solo proceso (asyncio),
+cada uno limitado sólo por la tasa de su propio host.
+Uso: python scrape_todos.py [yaguar] [maxiconsumo] [maxicarrefour]
+"""
+import os
+import sys
+import asyncio
+import subprocess
+from datetime import datetime
+
+from config import GENERAL_CONFIG
+from scripts.core.crawler import CrawlerAsync
+
+
+def crear_objetivos(nombres):
+    objetivos = []
+    if "yaguar" in nombres:
+        from targets.yaguar.scraper_pro import ObjetivoYaguar
+        objetivos.append(ObjetivoYaguar())
+    if "maxiconsumo" in nombres:
+        from targets.maxiconsumo.scraper_pro import ObjetivoMaxiconsumo
+        objetivos.append(ObjetivoMaxiconsumo())
+    if "maxicarrefour" in nombres:
+        from targets.maxicarrefour.scraper_api_real import ObjetivoMaxiCarrefour
+        objetivos.append(ObjetivoMaxiCarrefour())
+    return objetivos
+
+
+def main():
+    print("=== SCRAPER TODOS (async) ===")
+    print(f"Iniciando: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    nombres = [a for a in sys.argv[1:] if not a.startswith("-")] or ["yaguar", "maxiconsumo", "maxicarrefour"]
+    crawler = CrawlerAsync(
+        crear_objetivos(nombres),
+        max_reintentos=GENERAL_CONFIG["max_retries"],
+        backoff=GENERAL_CONFIG["retry_delay"],
+        timeout=GENERAL_CONFIG["timeout"],
+    )
+
+    try:
+        resultados = asyncio.run(crawler.correr())
+    except KeyboardInterrupt:
+        print("\nCancelado: se guarda lo scrapeado hasta ahora")
+        resultados = crawler.productos()
+
+    for host, m in crawler.metricas().items():
+        print(f"Limitador {host}: {m}")
+
+    guardados = 0
+    for objetivo in crawler.objetivos:
+        productos = resultados.get(objetivo.nombre, [])
+        print(f"\n{objetivo.nombre}: {len(productos)} productos ({crawler.errores[objetivo.nombre]} errores)")
+        if productos:
+            print(f"  Guardado en: {objetivo.guardar(productos)}")
+            guardados += 1
+
+    if guardados:
+        print("\n=== UNIFICANDO DATOS ===")
+        subprocess.run([sys.executable, "actualizar_catalogo.py"], cwd=os.path.dirname(os.path.abspath(__file__)))
+        print("\nPara iniciar el servidor: cd BRUJULA-DE-PRECIOS && npm run dev")
+    else:
+        print("ERROR: ningún scraper devolvió productos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BITÁCORA DE CRAWL - checkpoints para retomar scrapeos largos
+Cada unidad terminada (categoría, página) se agrega como una línea JSONL con
+los productos ya parseados. Si el scraper se corta (crash, 403, Ctrl+C) la
+próxima corrida del mismo día relee la bitácora y sólo pide lo que falta.
+Los scrapers de listados sólo registran páginas con productos: una página
+vacía puede ser un bloqueo o un challenge con status 200, y registrarla
+haría que la reanudación corte la categoría ahí.
+
+Un archivo por target y por día:  <directorio>/bitacora_<target>_<AAAAMMDD>.jsonl
+Con fecha= el archivo es el de ese id en vez del día (ej. un barrido que
+dura más de un día se identifica por su inicio); bitacoras() lista los ids.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+
+
+def bitacoras(directorio, target):
+    """Ids de las bitácoras de `target` en `directorio` (lo que sigue a bitacora_<target>_), ordenados."""
+    prefijo = f"bitacora_{target}_"
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(f[len(prefijo):-len(".jsonl")] for f in os.listdir(directorio)
+                  if f.startswith(prefijo) and f.endswith(".jsonl"))
+
+
+class BitacoraCrawl:
+    def __init__(self, directorio, target, fecha=None, reiniciar=False):
+        fecha = fecha or datetime.now().strftime("%Y%m%d")
+        self.ruta = os.path.join(directorio, f"bitacora_{target}_{fecha}.jsonl")
+        self._unidades = {}   # (categoria, pagina) -> {"productos": [...], ...meta}
+        self._lock = threading.Lock()
+
+        if reiniciar and os.path.exists(self.ruta):
+            os.remove(self.ruta)
+        if os.path.exists(self.ruta):
+            self._cargar()
+        self._fh = open(self.ruta, "a", encoding="utf-8")
+
+    def _cargar(self):
+        with open(self.ruta, encoding="utf-8") as fh:
+            for linea in fh:
+                try:
+                    reg = json.loads(linea)
+                except ValueError:
+                    continue   # última línea truncada por un corte a mitad de escritura
+                self._unidades[(reg["categoria"], reg["pagina"])] = reg
+        if self._unidades:
+            print(f"  Bitácora: {len(self._unidades)} unidades ya completadas ({os.path.basename(self.ruta)})")
+
+    def completada(self, categoria, pagina):
+        return (categoria, pagina) in self._unidades
+
+    def productos(self, categoria, pagina):
+        return self._unidades[(categoria, pagina)]["productos"]
+
+    def registros(self):
+        """Todas las unidades completadas: las de corridas anteriores con la misma bitácora y las nuevas."""
+        return list(self._unidades.values())
+
+    def meta(self, categoria, pagina, clave, default=None):
+        return self._unidades.get((categoria, pagina), {}).get(clave, default)
+
+    def registrar(self, categoria, pagina, productos, **meta):
+        """Marca la unidad como terminada. Se escribe y flushea en el momento."""
+        reg = {"categoria": categoria, "pagina": pagina, **meta, "productos": productos}
+        linea = json.dumps(reg, ensure_ascii=False)
+        with self._lock:
+            self._unidades[(categoria, pagina)] = reg
+            self._fh.write(linea + "\n")
+            self._fh.flush()
+
+    def cerrar(self):
+        self._fh.close()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CACHE HTTP - respuestas en disco con requests condicionales
+SesionCacheada envuelve una sesión (curl_cffi Session, o el módulo
+curl_requests) y guarda cada respuesta 200 por URL. En la próxima corrida:
+  - manda If-None-Match / If-Modified-Since si el sitio dio ETag/Last-Modified;
+    un 304 se sirve desde disco sin volver a bajar la página
+  - si el cuerpo es idéntico al guardado (mismo sha1) la respuesta queda
+    marcada sin_cambios y parsear_respuesta() reutiliza el parseo anterior,
+    siempre que lo haya hecho el mismo parser (código, backend HTML y
+    argumentos): si se corrige el parser o se pasa a --bs4 se vuelve a parsear
+
+Las entradas vencen a las `ttl` horas y, si el directorio supera `max_mb`,
+se borran las menos usadas (LRU por fecha de último acceso).
+
+Por entrada: <sha1(url)>.json (metadatos), .body (HTML), .parseo.json (resultado)
+"""
+
+import os
+import json
+import time
+import inspect
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from scripts.core import parseo as _parseo
+from scripts.core.replay import RespuestaGrabada, clave_url
+
+CAMPOS_FECHA = ("fecha", "fecha_scraping")   # se actualizan al reutilizar un parseo
+
+
+def _sha1(texto):
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def _escribir(ruta, contenido):
+    """Escritura atómica: nunca queda un archivo a medias si el proceso se corta."""
+    tmp = f"{ruta}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(contenido)
+    os.replace(tmp, ruta)
+
+
+class CacheHttp:
+    """Almacenamiento en disco de respuestas y parseos, seguro entre hilos."""
+
+    def __init__(self, directorio, ttl=72, max_mb=500):
+        self.directorio = directorio
+        self.ttl = ttl * 3600
+        self.max_bytes = max_mb * 1024 * 1024
+        self.aciertos = 0     # 304 o cuerpo idéntico
+        self.descargas = 0    # cuerpo nuevo
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+        self._bytes = sum(e.stat().st_size for e in os.scandir(directorio) if e.is_file())
+
+    def _ruta(self, clave, ext):
+        return os.path.join(self.directorio, _sha1(clave) + ext)
+
+    def leer(self, clave):
+        """Metadatos de la entrada vigente, o None. Marca el acceso para el LRU."""
+        ruta = self._ruta(clave, ".json")
+        try:
+            with open(ruta, encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if time.time() - meta["guardado"] > self.ttl:
+            self.borrar(clave)
+            return None
+        os.utime(ruta)
+        return meta
+
+    def cuerpo(self, clave):
+        with open(self._ruta(clave, ".body"), encoding="utf-8") as fh:
+            return fh.read()
+
+    def guardar(self, clave, r, texto, hash_cuerpo):
+        meta = {
+            "url": clave,
+            "etag": r.headers.get("etag"),
+            "last_modified": r.headers.get("last-modified"),
+            "hash": hash_cuerpo,
+            "guardado": time.time(),
+        }
+        _escribir(self._ruta(clave, ".body"), texto)
+        _escribir(self._ruta(clave, ".json"), json.dumps(meta))
+        with self._lock:
+            self._bytes += len(texto) + 300
+            if self._bytes > self.max_bytes:
+                self._desalojar()
+
+    def renovar(self, clave, meta):
+        """La página no cambió: reinicia el TTL de la entrada."""
+        meta["guardado"] = time.time()
+        _escribir(self._ruta(clave, ".json"), json.dumps(meta))
+
+    def parseo(self, clave, hash_cuerpo, parser):
+        """Resultado guardado para ese mismo cuerpo y la misma firma de parser, o None."""
+        try:
+            with open(self._ruta(clave, ".parseo.json"), encoding="utf-8") as fh:
+                guardado = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if guardado["hash"] != hash_cuerpo or guardado.get("parser") != parser:
+            return None
+        return guardado["resultado"]
+
+    def guardar_parseo(self, clave, hash_cuerpo, parser, resultado):
+        _escribir(self._ruta(clave, ".parseo.json"),
+                  json.dumps({"hash": hash_cuerpo, "parser": parser, "resultado": resultado}, ensure_ascii=False))
+
+    def borrar(self, clave):
+        for ext in (".json", ".body", ".parseo.json"):
+            try:
+                os.remove(self._ruta(clave, ext))
+            except OSError:
+                pass
+
+    def _desalojar(self):
+        """Borra las entradas menos usadas hasta quedar en el 90% de max_bytes."""
+        entradas = defaultdict(lambda: [0, 0])   # sha1 -> [último acceso, bytes]
+        total = 0
+        for e in os.scandir(self.directorio):
+            if not e.is_file():
+                continue
+            base, ext = e.name.split(".", 1)
+            st = e.stat()
+            total += st.st_size
+            entradas[base][1] += st.st_size
+            if ext == "json":   # leer() toca el .json de metadatos en cada acceso
+                entradas[base][0] = st.st_mtime
+        objetivo = self.max_bytes * 0.9
+        for base, (_, tam) in sorted(entradas.items(), key=lambda kv: kv[1][0]):
+            if total <= objetivo:
+                break
+            for ext in (".json", ".body", ".parseo.json"):
+                try:
+                    os.remove(os.path.join(self.directorio, base + ext))
+                except OSError:
+                    pass
+            total -= tam
+        self._bytes = total
+
+
+class SesionCacheada:
+    """
+    Sesión con cache HTTP delante. get() devuelve la respuesta real (o una
+    RespuestaGrabada si fue 304) con estos atributos extra:
+      sin_cambios : el cuerpo es idéntico al de la corrida anterior
+      cache, cache_clave, cache_hash : para parsear_respuesta()
+    El resto de los métodos (post, cookies, headers...) pasan a la sesión original.
+    """
+
+    def __init__(self, sesion, cache):
+        self.sesion = sesion
+        self.cache = cache
+
+    def __getattr__(self, nombre):
+        return getattr(self.sesion, nombre)
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        clave = clave_url(url, params)
+        meta = self.cache.leer(clave)
+        headers = dict(headers or {})
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        r = self.sesion.get(url, params=params, headers=headers, **kwargs)
+
+        if r.status_code == 304 and meta:
+            self.cache.renovar(clave, meta)
+            self.cache.aciertos += 1
+            r = RespuestaGrabada(url, 200, self.cache.cuerpo(clave), r.headers)
+            return self._marcar(r, clave, meta["hash"], True)
+        if r.status_code != 200:
+            return r
+
+        texto = r.text
+        hash_cuerpo = _sha1(texto)
+        sin_cambios = bool(meta) and meta["hash"] == hash_cuerpo
+        if sin_cambios:
+            self.cache.renovar(clave, meta)
+            self.cache.aciertos += 1
+        else:
+            self.cache.guardar(clave, r, texto, hash_cuerpo)
+            self.cache.descargas += 1
+        return self._marcar(r, clave, hash_cuerpo, sin_cambios)
+
+    def _marcar(self, r, clave, hash_cuerpo, sin_cambios):
+        r.sin_cambios = sin_cambios
+        r.cache = self.cache
+        r.cache_clave = clave
+        r.cache_hash = hash_cuerpo
+        return r
+
+
+def _refechar(resultado, hoy):
+    if isinstance(resultado, dict):
+        for campo in CAMPOS_FECHA:
+            if campo in resultado:
+                resultado[campo] = hoy
+    elif isinstance(resultado, list):
+        for x in resultado:
+            _refechar(x, hoy)
+    return resultado
+
+
+_CODIGO_PARSERS = {}   # parser -> sha1 de su código
+
+
+def firma_parser(parser, args=()):
+    """
+    Identidad de un parseo: código del módulo del parser y de parseo.py,
+    backend HTML activo (parseo.BACKEND) y argumentos extra del parser.
+    """
+    codigo = _CODIGO_PARSERS.get(parser)
+    if codigo is None:
+        try:
+            fuente = inspect.getsource(inspect.getmodule(parser))
+        except (OSError, TypeError):
+            fuente = inspect.getsource(parser)
+        codigo = _CODIGO_PARSERS[parser] = _sha1(fuente + inspect.getsource(_parseo))
+    return _sha1(f"{codigo}|{_parseo.BACKEND}|{args!r}")
+
+
+def parsear_respuesta(r, parser, *args):
+    """
+    parser(r.text, *args), salvo que el cuerpo sea idéntico al de la corrida
+    anterior y lo haya parseado el mismo parser (firma_parser): ahí devuelve
+    el parseo guardado (con la fecha de hoy).
+    Sin SesionCacheada de por medio simplemente parsea.
+    """
+    cache = getattr(r, "cache", None)
+    if cache is None:
+        return parser(r.text, *args)
+    firma = firma_parser(parser, args)
+    if r.sin_cambios:
+        previo = cache.parseo(r.cache_clave, r.cache_hash, firma)
+        if previo is not None:
+            return _refechar(previo, datetime.now().strftime("%Y-%m-%d"))
+    resultado = parser(r.text, *args)
+    cache.guardar_parseo(r.cache_clave, r.cache_hash, firma, resultado)
+    return resultado
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DIRECTORIO_CACHE = os.path.join(BASE_DIR, "data", "cache_http")
+TTL_HORAS = 72
+MAX_MB = 500
+
+
+def cache_target(nombre, ttl=TTL_HORAS, max_mb=MAX_MB):
+    """Cache propio de un target en data/cache_http/<nombre>."""
+    return CacheHttp(os.path.join(DIRECTORIO_CACHE, nombre), ttl=ttl, max_mb=max_mb)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CACHE DE MATCHES - links fuzzy resueltos en corridas anteriores
+actualizar_catalogo.py vuelve a derivar cada día los mismos links fuzzy
+(SKU -> EAN vía Maestro en el paso 1b, hunterprice -> EAN MaxiCarrefour).
+Se guardan en <ruta> (JSON) como:
+
+  "etapa|fuente|sku|clave": {"valor": ..., "sim": 0.71, "version": "...", "fecha": "AAAA-MM-DD"}
+
+  - la clave normalizada del nombre es parte de la llave: si el producto
+    cambia de nombre, la entrada vieja simplemente no se encuentra
+  - cada etapa declara su versión (mtime del Maestro, umbral, palabras
+    vacías...): una entrada de otra versión no vale y se descarta al guardar
+  - valor "" = se buscó y no hubo match (también se cachea)
+"""
+
+import os
+import json
+from datetime import datetime, timedelta
+
+from scripts.core.indice_jaccard import firma
+
+
+class CacheMatches:
+    """buscar()/guardar() por etapa; escribir() persiste sólo las entradas vigentes."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._versiones = {}
+        self._aciertos = {}
+        self._fallos = {}
+        self._entradas = {}
+        try:
+            with open(ruta, encoding="utf-8") as fh:
+                self._entradas = json.load(fh)
+        except (OSError, ValueError):
+            pass
+
+    def version(self, etapa, *partes):
+        """Declara la versión de las entradas de `etapa` en esta corrida."""
+        self._versiones[etapa] = firma(*partes)
+        self._aciertos.setdefault(etapa, 0)
+        self._fallos.setdefault(etapa, 0)
+
+    @staticmethod
+    def _llave(etapa, fuente, sku, clave):
+        return f"{etapa}|{fuente}|{sku}|{clave}"
+
+    def buscar(self, etapa, fuente, sku, clave, max_dias=None):
+        """(valor, sim) guardado y vigente, o None."""
+        e = self._entradas.get(self._llave(etapa, fuente, sku, clave))
+        vigente = e is not None and e["version"] == self._versiones[etapa]
+        if vigente and max_dias is not None:
+            vigente = datetime.strptime(e["fecha"], "%Y-%m-%d") + timedelta(days=max_dias) > datetime.now()
+        if not vigente:
+            self._fallos[etapa] += 1
+            return None
+        self._aciertos[etapa] += 1
+        return e["valor"], e["sim"]
+
+    def guardar(self, etapa, fuente, sku, clave, valor, sim=0.0):
+        self._entradas[self._llave(etapa, fuente, sku, clave)] = {
+            "valor": valor,
+            "sim": round(sim, 4),
+            "version": self._versiones[etapa],
+            "fecha": datetime.now().strftime("%Y-%m-%d"),
+        }
+
+    def escribir(self):
+        """Guarda (atómico) las entradas de la versión actual de cada etapa."""
+        vigentes = {
+            k: e for k, e in self._entradas.items()
+            if self._versiones.get(k.split("|", 1)[0]) == e["version"]
+        }
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        tmp = self.ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(vigentes, fh, ensure_ascii=False)
+        os.replace(tmp, self.ruta)
+        return len(vigentes)
+
+    def stats(self):
+        """{etapa: (aciertos, fallos)}"""
+        return {etapa: (self._aciertos[etapa], self._fallos[etapa]) for etapa in self._versiones}
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ALMACÉN COLUMNAR - outputs de scrapers como columnas numpy mapeadas en memoria
+Un output JSON/JSONL repite en cada producto las mismas claves (nombre,
+precio, sku, imagen, fuente, fecha...) y para leer tres campos hay que
+parsear todo. La versión columnar de un output vive al lado, en
+<ruta>.columnas/:
+
+  meta.json        {"version", "filas", "sha1" (del output), "campos": {campo: "num" | "dic"}}
+  <campo>.npy      "num": int64/float64, una fila por producto (el campo está
+                   en todos los productos y siempre es del mismo tipo numérico)
+  <campo>.cod.npy  "dic": int32 por producto, índice en el diccionario
+                   (-1 = el producto no tiene ese campo)
+  <campo>.dic.json "dic": los valores distintos, como array JSON (se decodifica
+                   de una sola vez)
+
+Los .npy se abren con mmap: leer sólo sku/precio/nombre no toca el resto de
+los archivos, y los strings repetidos (fuente, sector, fecha) se decodifican
+una vez por valor distinto. numpy viene con pandas; no hace falta pyarrow.
+"""
+
+import os
+import json
+import shutil
+
+import numpy as np
+
+VERSION = 1
+FALTA = object()   # valor de un campo que el producto no tiene
+
+
+def ruta_columnas(ruta):
+    return ruta + ".columnas"
+
+
+def _serializar(v):
+    return json.dumps(v, ensure_ascii=False, sort_keys=True)
+
+
+def escribir(ruta, productos, sha1):
+    """Escribe la versión columnar del output `ruta` (productos = sus filas, sha1 = el del manifiesto)."""
+    campos = {}     # campo -> códigos, diccionario {json: código}, tipos vistos, valores crudos, filas sin el campo
+    filas = 0
+    for p in productos:
+        for campo, v in p.items():
+            c = campos.get(campo)
+            if c is None:
+                c = campos[campo] = {"cod": [-1] * filas, "dic": {}, "tipos": set(), "num": [None] * filas, "faltan": filas}
+            c["cod"].append(c["dic"].setdefault(_serializar(v), len(c["dic"])))
+            c["tipos"].add(type(v))
+            c["num"].append(v)
+        filas += 1
+        for c in campos.values():
+            if len(c["cod"]) < filas:
+                c["cod"].append(-1)
+                c["num"].append(None)
+                c["faltan"] += 1
+
+    destino = ruta_columnas(ruta)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    tipos = {}
+    for campo, c in campos.items():
+        base = os.path.join(tmp, campo)
+        numerica = None
+        if not c["faltan"] and c["tipos"] == {float}:
+            numerica = np.asarray(c["num"], dtype=np.float64)
+        elif not c["faltan"] and c["tipos"] == {int} and all(-2 ** 63 <= v < 2 ** 63 for v in c["num"]):
+            numerica = np.asarray(c["num"], dtype=np.int64)
+        if numerica is not None:
+            tipos[campo] = "num"
+            np.save(base + ".npy", numerica)
+            continue
+        tipos[campo] = "dic"
+        np.save(base + ".cod.npy", np.asarray(c["cod"], dtype=np.int32))
+        with open(base + ".dic.json", "w", encoding="utf-8") as fh:
+            fh.write("[" + ",".join(c["dic"]) + "]")
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump({"version": VERSION, "filas": filas, "sha1": sha1, "campos": tipos}, fh, indent=1)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(tmp, destino)
+    return destino
+
+
+class TablaColumnar:
+    """
+    Lectura de <ruta>.columnas/.
+      numerica(campo)   -> ndarray mapeado (None si el campo no es "num")
+      codigos(campo)    -> (códigos int32, diccionario) para columnas "dic"
+      valores(campo)    -> lista de valores Python (FALTA donde el producto no lo tiene)
+      productos(campos) -> dicts sólo con `campos`, como los del output original
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta_columnas(ruta)
+        with open(os.path.join(self.ruta, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta["version"] != VERSION:
+            raise ValueError(f"{self.ruta}: versión {meta['version']}")
+        self.filas = meta["filas"]
+        self.sha1 = meta["sha1"]
+        self.campos = meta["campos"]
+
+    def _npy(self, nombre):
+        return np.load(os.path.join(self.ruta, nombre), mmap_mode="r")
+
+    def numerica(self, campo):
+        if self.campos.get(campo) != "num":
+            return None
+        return self._npy(campo + ".npy")
+
+    def codigos(self, campo):
+        with open(os.path.join(self.ruta, campo + ".dic.json"), encoding="utf-8") as fh:
+            diccionario = json.load(fh)
+        return self._npy(campo + ".cod.npy"), diccionario
+
+    def valores(self, campo):
+        tipo = self.campos.get(campo)
+        if tipo is None:
+            return [FALTA] * self.filas
+        if tipo == "num":
+            return self.numerica(campo).tolist()
+        cod, diccionario = self.codigos(campo)
+        diccionario.append(FALTA)   # código -1
+        return [diccionario[c] for c in cod.tolist()]
+
+    def productos(self, campos):
+        campos = [c for c in campos if c in self.campos]
+        if not campos:
+            yield from ({} for _ in range(self.filas))
+            return
+        for fila in zip(*[self.valores(c) for c in campos]):
+            p = dict(zip(campos, fila))
+            if FALTA in fila:
+                p = {k: v for k, v in p.items() if v is not FALTA}
+            yield p
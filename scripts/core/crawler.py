@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CRAWLER ASYNC - núcleo compartido por los scrapers
+Un solo proceso crawlea varios mayoristas a la vez. El núcleo se encarga de:
+  - pool de conexiones (una AsyncSession de curl_cffi por objetivo)
+  - límite de requests/seg por host (LimitadorAdaptativo: frena ante 429/403)
+  - reintentos con backoff exponencial + jitter (timeouts, 429, 5xx)
+  - cancelación (cancelar() o Ctrl+C) conservando lo ya parseado
+
+Cada target sólo aporta un Objetivo: las tareas iniciales (URLs) y el parser.
+"""
+
+import asyncio
+import random
+import time
+from urllib.parse import urlparse
+
+from curl_cffi.requests import AsyncSession
+
+from scripts.core.limitador import LimitadorAdaptativo
+
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class Tarea:
+    """
+    Una URL a descargar.
+      clave : tupla para ordenar los resultados (ej. (idx_categoria, pagina))
+      datos : contexto que el parser necesita (categoría, EAN buscado, ...)
+    """
+
+    __slots__ = ("url", "params", "clave", "datos")
+
+    def __init__(self, url, clave=(), datos=None, params=None):
+        self.url = url
+        self.params = params
+        self.clave = clave
+        self.datos = datos or {}
+
+    def __repr__(self):
+        return f"Tarea({self.url!r}, clave={self.clave!r})"
+
+
+class Objetivo:
+    """
+    Lo que cada target le aporta al crawler. Subclases definen:
+      tareas_iniciales()        -> iterable de Tarea
+      parsear(tarea, respuesta) -> (productos, nuevas_tareas)
+      guardar(productos)        -> escribe el output y devuelve la ruta
+    y opcionalmente preparar() (login -> cookies) y consolidar().
+    """
+
+    nombre = "objetivo"
+    rps = 1.0            # requests/seg iniciales del host (se adapta según las respuestas)
+    concurrencia = 4     # requests simultáneos como máximo
+    impersonate = None
+    headers = {}
+
+    def preparar(self):
+        """Se ejecuta antes de crawlear (ej. login). Devuelve cookies para la sesión, o None si falla."""
+        return {}
+
+    def tareas_iniciales(self):
+        return []
+
+    def parsear(self, tarea, respuesta):
+        raise NotImplementedError
+
+    def consolidar(self, resultados):
+        """Une [(tarea, productos)] en la lista final, ordenada por tarea.clave."""
+        productos = []
+        for _, prods in sorted(resultados, key=lambda r: r[0].clave):
+            productos.extend(prods)
+        return productos
+
+    def guardar(self, productos):
+        raise NotImplementedError
+
+
+class CrawlerAsync:
+    """Ejecuta uno o más Objetivos concurrentemente en un solo event loop."""
+
+    def __init__(self, objetivos, max_reintentos=3, backoff=2.0, timeout=30):
+        self.objetivos = list(objetivos)
+        self.max_reintentos = max_reintentos
+        self.backoff = backoff
+        self.timeout = timeout
+        self.resultados = {o.nombre: [] for o in self.objetivos}   # nombre -> [(tarea, productos)]
+        self.errores = {o.nombre: 0 for o in self.objetivos}
+        self._limitadores = {}
+        self._cancelado = False
+
+    def cancelar(self):
+        """Deja de tomar tareas nuevas; lo ya parseado queda en self.resultados."""
+        self._cancelado = True
+
+    def limitador(self, host, rps):
+        """Un limitador por host, compartido si dos objetivos apuntan al mismo sitio."""
+        if host not in self._limitadores:
+            self._limitadores[host] = LimitadorAdaptativo(rps)
+        return self._limitadores[host]
+
+    def metricas(self):
+        """{host: tasa final, respuestas, bloqueos, latencia} para el resumen de la corrida."""
+        return {host: lim.metricas() for host, lim in self._limitadores.items()}
+
+    async def _pedir(self, objetivo, sesion, tarea):
+        limitador = self.limitador(urlparse(tarea.url).netloc, objetivo.rps)
+        for intento in range(self.max_reintentos + 1):
+            await asyncio.sleep(limitador.reservar())
+            t = time.monotonic()
+            try:
+                r = await sesion.get(tarea.url, params=tarea.params, timeout=self.timeout)
+                limitador.registrar(r, time.monotonic() - t)
+                if r.status_code not in ESTADOS_REINTENTABLES:
+                    return r
+                motivo = f"status {r.status_code}"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                limitador.registrar(None)
+                motivo = str(e)
+            if intento < self.max_reintentos:
+                espera = self.backoff * (2 ** intento) + random.uniform(0, self.backoff)
+                print(f"  [{objetivo.nombre}] Reintento {intento + 1} {tarea.url}: {motivo} (espera {espera:.1f}s)")
+                await asyncio.sleep(espera)
+        raise Exception(f"Sin respuesta tras {self.max_reintentos} reintentos: {motivo}")
+
+    async def _trabajador(self, objetivo, sesion, cola):
+        while True:
+            tarea = await cola.get()
+            try:
+                if self._cancelado:
+                    continue
+                r = await self._pedir(objetivo, sesion, tarea)
+                productos, nuevas = objetivo.parsear(tarea, r)
+                self.resultados[objetivo.nombre].append((tarea, productos))
+                for t in nuevas or []:
+                    cola.put_nowait(t)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errores[objetivo.nombre] += 1
+                print(f"  [{objetivo.nombre}] [ERROR] {tarea.url}: {e}")
+            finally:
+                cola.task_done()
+
+    async def _crawlear(self, objetivo):
+        cookies = await asyncio.to_thread(objetivo.preparar)
+        if cookies is None:
+            print(f"  [{objetivo.nombre}] preparar() falló, se omite")
+            return
+        cola = asyncio.Queue()
+        for t in objetivo.tareas_iniciales():
+            cola.put_nowait(t)
+
+        async with AsyncSession(
+            headers=objetivo.headers,
+            cookies=cookies,
+            impersonate=objetivo.impersonate,
+            max_clients=objetivo.concurrencia,
+        ) as sesion:
+            trabajadores = [
+                asyncio.create_task(self._trabajador(objetivo, sesion, cola))
+                for _ in range(objetivo.concurrencia)
+            ]
+            try:
+                await cola.join()
+            finally:
+                for t in trabajadores:
+                    t.cancel()
+                await asyncio.gather(*trabajadores, return_exceptions=True)
+
+    async def correr(self):
+        """Crawlea todos los objetivos a la vez. Devuelve {nombre: [productos]}."""
+        await asyncio.gather(*(self._crawlear(o) for o in self.objetivos))
+        return self.productos()
+
+    def productos(self):
+        """Resultados consolidados hasta el momento (sirve también tras cancelar)."""
+        return {o.nombre: o.consolidar(self.resultados[o.nombre]) for o in self.objetivos}
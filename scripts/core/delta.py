@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CRAWL DELTA - re-scrapear sólo las categorías que cambiaron
+Por target se guarda el estado de la última corrida en
+<directorio>/estado_delta_<target>.json:
+  {categoria: {"huella": sha1 de la página 1, "productos": N, "completa": "AAAA-MM-DD"}}
+
+En modo --delta el scraper baja la página 1 de cada categoría y, si su huella
+(nombre/sku/precio de los productos + cantidad de páginas) es la misma que la
+vez anterior y la categoría se recorrió completa hace menos de REFRESCO_DIAS,
+la omite. Lo re-scrapeado va a delta_<target>_<ts>.jsonl; el catálogo aplica
+esos deltas sobre el último output completo con aplicar_deltas().
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+
+from scripts.core.salida import listar_outputs, leer_productos
+
+REFRESCO_DIAS = 7
+
+
+def huella_pagina(productos, paginas=None):
+    """Huella estable de una página: ignora campos que cambian solos (fecha, imagen)."""
+    claves = [(p.get("sku", ""), p.get("nombre", ""), p.get("precio", 0)) for p in productos]
+    return hashlib.sha1(json.dumps([paginas, claves], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class EstadoDelta:
+    """
+    Estado por categoría de la última corrida.
+      activo : True en modo --delta (omite categorías sin cambios); si no,
+               sólo se registra el estado para la próxima corrida delta
+    """
+
+    def __init__(self, directorio, target, activo=False, refresco_dias=REFRESCO_DIAS):
+        self.ruta = os.path.join(directorio, f"estado_delta_{target}.json")
+        self.activo = activo
+        self.refresco_dias = refresco_dias
+        self.omitidas = []
+        self._estado = {}
+        if os.path.exists(self.ruta):
+            with open(self.ruta, encoding="utf-8") as fh:
+                self._estado = json.load(fh)
+
+    def sin_cambios(self, categoria, huella):
+        """True si (en modo delta) la categoría se puede omitir en esta corrida."""
+        previo = self._estado.get(categoria)
+        if not self.activo or not previo or previo["huella"] != huella:
+            return False
+        vence = datetime.strptime(previo["completa"], "%Y-%m-%d") + timedelta(days=self.refresco_dias)
+        if datetime.now() >= vence:
+            return False   # refresco completo periódico aunque la página 1 no cambie
+        self.omitidas.append(categoria)
+        return True
+
+    def productos_previos(self, categoria):
+        return self._estado.get(categoria, {}).get("productos", 0)
+
+    def registrar(self, categoria, huella, productos):
+        """La categoría se recorrió completa en esta corrida."""
+        self._estado[categoria] = {
+            "huella": huella,
+            "productos": productos,
+            "completa": datetime.now().strftime("%Y-%m-%d"),
+        }
+
+    def guardar(self):
+        with open(self.ruta, "w", encoding="utf-8") as fh:
+            json.dump(self._estado, fh, ensure_ascii=False, indent=2)
+
+
+def aplicar_deltas(productos, directorio, target, campo_categoria, desde=0, leer=leer_productos):
+    """
+    Aplica sobre `productos` (el snapshot completo) los delta_<target>_* más
+    nuevos que `desde` (mtime del snapshot), del más viejo al más nuevo: cada
+    categoría presente en un delta reemplaza entera a la del snapshot, y un
+    SKU del delta reemplaza al mismo SKU aunque esté en otra categoría.
+    Devuelve (productos, cantidad de deltas aplicados).
+    """
+    deltas = [f for f in reversed(listar_outputs(directorio, f"delta_{target}_")) if os.path.getmtime(f) > desde]
+    for ruta in deltas:
+        nuevos = list(leer(ruta))
+        categorias = {p.get(campo_categoria) for p in nuevos}
+        skus = {str(p.get("sku", "")).strip() for p in nuevos} - {""}
+        productos = [
+            p for p in productos
+            if p.get(campo_categoria) not in categorias and str(p.get("sku", "")).strip() not in skus
+        ] + nuevos
+    return productos, len(deltas)
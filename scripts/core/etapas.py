@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ETAPAS - pipeline declarado de pasos con dependencias, tiempos y memoria
+construir_catalogo() es una secuencia de pasos que se pasan diccionarios.
+Cada paso se declara como una Etapa con las entradas que lee y las salidas
+que produce; el Pipeline arma las dependencias, los corre y mide cada uno.
+
+  Etapa(nombre, funcion, entradas, salidas)
+      funcion(**{entrada: valor}) -> {salida: valor}
+      Una etapa que modifica un objeto que recibe (un dict, un set) lo
+      declara también como salida.
+  Pipeline(etapas).correr(estado, paralelo=False, medir_memoria=False)
+      estado: {nombre: valor} con los datos iniciales; vuelve con las salidas
+      de todas las etapas. mediciones: tiempo, memoria y largo de cada salida.
+
+Dependencias, según el orden de declaración:
+  - una etapa que lee X espera a la última anterior que escribe X
+  - una etapa que escribe X espera además a las anteriores que leen X
+Así el resultado es el mismo que correrlas en orden. Con paralelo=True las
+etapas sin dependencias pendientes corren a la vez en hilos (sirve sobre todo
+para las que pasan el tiempo en numpy/scipy o leyendo archivos). Los print
+de etapas simultáneas pueden salir intercalados, y con medir_memoria el pico
+de tracemalloc es el de todo el proceso mientras la etapa corría.
+
+`compartidos` son objetos que muchas etapas usan pero ninguna "produce" (el
+memo de nombres, el cache de matches): no generan dependencias.
+"""
+
+import time
+import resource
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Etapa:
+    __slots__ = ("nombre", "funcion", "entradas", "salidas")
+
+    def __init__(self, nombre, funcion, entradas, salidas):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.entradas = tuple(entradas)
+        self.salidas = tuple(salidas)
+
+    def __repr__(self):
+        return f"Etapa({self.nombre!r}, {self.entradas} -> {self.salidas})"
+
+
+class Medicion:
+    """Lo que el Pipeline registra de una etapa."""
+
+    __slots__ = ("nombre", "segundos", "pico_kb", "rss_mb", "conteos")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.segundos = 0.0
+        self.pico_kb = None     # pico de tracemalloc (sólo con medir_memoria)
+        self.rss_mb = 0         # máximo RSS del proceso al terminar la etapa
+        self.conteos = {}       # salida -> len()
+
+    def linea(self):
+        mem = f"pico {self.pico_kb / 1024:7.1f} MB" if self.pico_kb is not None else f"rss {self.rss_mb:5d} MB"
+        conteos = ", ".join(f"{k}={v}" for k, v in self.conteos.items())
+        return f"{self.nombre:<20} {self.segundos:7.2f}s  {mem}  {conteos}"
+
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+class Pipeline:
+    """Etapas en orden de declaración; ver el docstring del módulo."""
+
+    def __init__(self, etapas, compartidos=()):
+        self.etapas = list(etapas)
+        self.compartidos = set(compartidos)
+        self.mediciones = []
+        self.segundos = 0.0
+        nombres = [e.nombre for e in self.etapas]
+        if len(set(nombres)) != len(nombres):
+            raise ValueError(f"Etapas con nombre repetido: {nombres}")
+        self.dependencias = self._dependencias()
+
+    def _dependencias(self):
+        """{nombre: set de etapas anteriores que tienen que terminar antes}"""
+        ultimo_escritor = {}     # dato -> etapa
+        lectores = {}            # dato -> etapas que lo leyeron desde la última escritura
+        deps = {}
+        for e in self.etapas:
+            d = set()
+            for x in e.entradas:
+                if x in self.compartidos:
+                    continue
+                if x in ultimo_escritor:
+                    d.add(ultimo_escritor[x])
+            for x in e.salidas:
+                if x in ultimo_escritor:
+                    d.add(ultimo_escritor[x])
+                d.update(lectores.get(x, ()))
+            d.discard(e.nombre)
+            deps[e.nombre] = d
+            for x in e.entradas:
+                lectores.setdefault(x, set()).add(e.nombre)
+            for x in e.salidas:
+                ultimo_escritor[x] = e.nombre
+                lectores[x] = set()
+        return deps
+
+    def _correr_etapa(self, etapa, entradas, medir_memoria):
+        m = Medicion(etapa.nombre)
+        t = time.perf_counter()
+        if medir_memoria:
+            tracemalloc.reset_peak()
+        salida = etapa.funcion(**entradas)
+        faltan = set(etapa.salidas) - set(salida)
+        if faltan:
+            raise ValueError(f"La etapa {etapa.nombre} no devolvió {sorted(faltan)}")
+        m.segundos = time.perf_counter() - t
+        if medir_memoria:
+            m.pico_kb = tracemalloc.get_traced_memory()[1] / 1024
+        m.rss_mb = _rss_mb()
+        m.conteos = {k: len(v) for k, v in salida.items() if hasattr(v, "__len__")}
+        return salida, m
+
+    def correr(self, estado, paralelo=False, medir_memoria=False, hilos=4):
+        estado = dict(estado)
+        self.mediciones = []
+        faltan = {x for e in self.etapas for x in e.entradas} - estado.keys() - {x for e in self.etapas for x in e.salidas}
+        if faltan:
+            raise ValueError(f"Entradas sin etapa ni valor inicial: {sorted(faltan)}")
+        iniciar_tracemalloc = medir_memoria and not tracemalloc.is_tracing()
+        if iniciar_tracemalloc:
+            tracemalloc.start()
+        t = time.perf_counter()
+        try:
+            if paralelo:
+                self._correr_paralelo(estado, medir_memoria, hilos)
+            else:
+                for e in self.etapas:
+                    salida, m = self._correr_etapa(e, {x: estado[x] for x in e.entradas}, medir_memoria)
+                    estado.update(salida)
+                    self.mediciones.append(m)
+        finally:
+            self.segundos = time.perf_counter() - t
+            if iniciar_tracemalloc:
+                tracemalloc.stop()
+        return estado
+
+    def _correr_paralelo(self, estado, medir_memoria, hilos):
+        pendientes = list(self.etapas)
+        terminadas = set()
+        en_curso = {}   # future -> etapa
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            while pendientes or en_curso:
+                for e in [e for e in pendientes if self.dependencias[e.nombre] <= terminadas]:
+                    pendientes.remove(e)
+                    entradas = {x: estado[x] for x in e.entradas}
+                    en_curso[pool.submit(self._correr_etapa, e, entradas, medir_memoria)] = e
+                listos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for fut in listos:
+                    e = en_curso.pop(fut)
+                    salida, m = fut.result()
+                    estado.update(salida)
+                    self.mediciones.append(m)
+                    terminadas.add(e.nombre)
+
+    def reporte(self):
+        """Líneas con la medición de cada etapa (en el orden en que terminaron) y el total real."""
+        suma = sum(m.segundos for m in self.mediciones)
+        return [m.linea() for m in self.mediciones] + [f"{'total':<20} {self.segundos:7.2f}s  (suma de etapas {suma:.2f}s)"]
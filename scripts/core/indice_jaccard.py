@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ÍNDICE JACCARD - índice invertido único para los matchings fuzzy por palabras
+Reemplaza los índices palabra -> [posiciones] armados a mano en cada paso
+(1b, puente hunterprice, 6c, fuzzy del unificador), cada uno con su propio
+loop de puntaje.
+
+  - cada palabra se guarda una sola vez con un id entero; la lista de
+    documentos de cada palabra es un array('i') (4 bytes por documento)
+  - la consulta concatena las listas de las palabras buscadas y cuenta
+    coincidencias con numpy: |A∩B| por documento sin armar sets por candidato,
+    y Jaccard = |A∩B| / (|A| + |B| - |A∩B|)
+  - empates de similitud: gana el documento agregado primero (determinista)
+
+Con umbral > 0 los candidatos salen sólo de las palabras más raras de la
+consulta (filtro de prefijo): si Jaccard(q, d) >= t, d comparte al menos
+ceil(t·|q|) palabras con q, así que alguna de las |q| - ceil(t·|q|) + 1 de
+menor frecuencia tiene que estar en d. Las palabras comunes ("leche",
+"gaseosa", la marca) no generan candidatos: sólo se usan para contar la
+intersección con searchsorted sobre su lista (ordenada). Además se descartan
+los documentos cuyo largo no permite llegar al umbral
+(t·|q| <= |d| <= |q|/t). El resultado es exactamente el mismo que puntuando
+todos los que comparten alguna palabra; si la consulta toca pocas entradas en
+total (< PODA_MINIMA) se puntúan todas directamente, que ahí es más barato.
+
+guardar()/cargar() lo persisten en un .npz; indice_persistente() lo reutiliza
+entre corridas mientras la firma de las entradas no cambie.
+"""
+
+import os
+import json
+import math
+import hashlib
+from array import array
+
+import numpy as np
+
+_VACIO = np.zeros(0, dtype=np.int32)
+PODA_MINIMA = 2000   # entradas de las listas de la consulta a partir de las que conviene podar
+
+
+def firma(*partes):
+    """sha1 de cualquier dato serializable en JSON (ej. las entradas del índice)."""
+    return hashlib.sha1(json.dumps(partes, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class IndiceJaccard:
+    """
+    Documentos = conjuntos de palabras con un valor asociado.
+      agregar(palabras, valor)           -> número de documento
+      mejor(palabras, umbral, filtro)    -> (valor, sim) del más parecido
+      top_k(palabras, k, umbral)         -> [(valor, sim)] de mayor a menor
+    """
+
+    def __init__(self):
+        self._ids = {}              # palabra -> id entero
+        self._postings = []         # id de palabra -> array('i') de documentos
+        self._largos = array("i")   # documento -> cantidad de palabras
+        self.valores = []
+        self.consultas = 0
+        self.candidatos = 0         # documentos puntuados tras el filtro de prefijo
+        self.sin_poda = 0           # los que se habrían puntuado uniendo todas las listas
+
+    def __len__(self):
+        return len(self.valores)
+
+    def agregar(self, palabras, valor):
+        """Agrega un documento (`palabras` es un conjunto, sin repetidos)."""
+        doc = len(self.valores)
+        for w in palabras:
+            t = self._ids.get(w)
+            if t is None:
+                t = self._ids[w] = len(self._postings)
+                self._postings.append(array("i"))
+            self._postings[t].append(doc)
+        self._largos.append(len(palabras))
+        self.valores.append(valor)
+        return doc
+
+    def puntajes(self, palabras, umbral=0.0):
+        """
+        (documentos, similitudes) de los que comparten al menos una palabra;
+        con umbral > 0, sólo los candidatos que pasan los filtros de prefijo y
+        de largo (incluye a todos los que tienen sim >= umbral).
+        """
+        n = len(palabras)
+        listas = [self._postings[t] for t in map(self._ids.get, palabras) if t is not None]
+        total = sum(map(len, listas))
+        self.consultas += 1
+        self.sin_poda += total
+        if not listas:
+            return _VACIO, np.zeros(0)
+        largos = np.frombuffer(self._largos, dtype=np.int32)
+        if umbral <= 0 or total < PODA_MINIMA:
+            todos = np.concatenate([np.frombuffer(l, dtype=np.int32) for l in listas])
+            docs, inter = np.unique(todos, return_counts=True)
+            self.candidatos += len(docs)
+            return docs, inter / (n + largos[docs] - inter)
+
+        minimo = math.ceil(umbral * n - 1e-9)          # palabras en común necesarias
+        prefijo = len(listas) - minimo + 1               # las desconocidas (df 0) ya ocupan el resto
+        if prefijo <= 0:
+            return _VACIO, np.zeros(0)
+        listas.sort(key=len)
+        docs, inter = np.unique(np.concatenate([np.frombuffer(l, dtype=np.int32) for l in listas[:prefijo]]),
+                                return_counts=True)
+        largo_d = largos[docs]
+        sel = (largo_d >= minimo) & (largo_d <= math.floor(n / umbral + 1e-9))
+        docs, inter = docs[sel], inter[sel]
+        self.candidatos += len(docs)
+        if not len(docs):
+            return _VACIO, np.zeros(0)
+        for l in listas[prefijo:]:
+            lista = np.frombuffer(l, dtype=np.int32)
+            pos = np.minimum(np.searchsorted(lista, docs), len(lista) - 1)
+            inter += lista[pos] == docs
+        return docs, inter / (n + largos[docs] - inter)
+
+    def ordenados(self, palabras, umbral=0.0):
+        """(documentos, similitudes) con sim >= umbral, de mayor a menor (empates: el más viejo)."""
+        docs, sims = self.puntajes(palabras, umbral)
+        if umbral > 0:
+            sel = sims >= umbral
+            docs, sims = docs[sel], sims[sel]
+        orden = np.lexsort((docs, -sims))
+        return docs[orden], sims[orden]
+
+    def mejor(self, palabras, umbral=0.0, filtro=None):
+        """
+        (valor, sim) del documento más parecido con sim >= umbral y, si se
+        pasa, filtro(valor) verdadero. (None, 0.0) si ninguno califica.
+        """
+        docs, sims = self.ordenados(palabras, umbral)
+        for doc, sim in zip(docs.tolist(), sims.tolist()):
+            valor = self.valores[doc]
+            if filtro is None or filtro(valor):
+                return valor, sim
+        return None, 0.0
+
+    def top_k(self, palabras, k, umbral=0.0):
+        docs, sims = self.ordenados(palabras, umbral)
+        return [(self.valores[d], s) for d, s in zip(docs[:k].tolist(), sims[:k].tolist())]
+
+    def stats(self):
+        """Consultas y documentos puntuados, contra los que se puntuarían sin poda."""
+        return {
+            "consultas": self.consultas,
+            "candidatos": self.candidatos,
+            "sin_poda": self.sin_poda,
+            "poda": round(1 - self.candidatos / self.sin_poda, 3) if self.sin_poda else 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    def guardar(self, ruta, firma=""):
+        """Guarda el índice en un .npz (los valores tienen que ser serializables en JSON)."""
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        largos_post = np.array([len(p) for p in self._postings], dtype=np.int64)
+        tmp = ruta + ".tmp.npz"
+        np.savez(
+            tmp,
+            palabras=np.array(json.dumps(list(self._ids), ensure_ascii=False)),
+            inicios=np.concatenate(([0], np.cumsum(largos_post))),
+            docs=np.concatenate([np.frombuffer(p, dtype=np.int32) for p in self._postings]) if self._postings else _VACIO,
+            largos=np.frombuffer(self._largos, dtype=np.int32),
+            valores=np.array(json.dumps(self.valores, ensure_ascii=False)),
+            firma=np.array(firma),
+        )
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta, firma=None):
+        """Índice guardado en `ruta`, o None si no existe o se armó con otra firma."""
+        try:
+            datos = np.load(ruta)
+        except (OSError, ValueError):
+            return None
+        with datos:
+            if firma is not None and str(datos["firma"]) != firma:
+                return None
+            indice = cls()
+            palabras = json.loads(str(datos["palabras"]))
+            inicios, docs = datos["inicios"], datos["docs"].astype(np.int32)
+            indice._ids = {w: i for i, w in enumerate(palabras)}
+            indice._postings = [array("i", docs[inicios[i]:inicios[i + 1]].tobytes()) for i in range(len(palabras))]
+            indice._largos = array("i", datos["largos"].astype(np.int32).tobytes())
+            indice.valores = json.loads(str(datos["valores"]))
+        return indice
+
+
+def indice_persistente(ruta, entradas, firma_extra=()):
+    """
+    Índice de `entradas` [(palabras, valor)] reutilizando el guardado en `ruta`
+    si se armó con exactamente las mismas entradas (y firma_extra, ej. la lista
+    de palabras vacías); si no, lo arma y lo guarda para la próxima corrida.
+    """
+    entradas = [(sorted(ws), v) for ws, v in entradas if ws]
+    f = firma(list(firma_extra), entradas)
+    indice = IndiceJaccard.cargar(ruta, f)
+    if indice is None:
+        indice = IndiceJaccard()
+        for ws, v in entradas:
+            indice.agregar(ws, v)
+        try:
+            indice.guardar(ruta, f)
+        except OSError as e:
+            print(f"  [WARN] No se pudo guardar el índice {ruta}: {e}")
+    return indice
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JACCARD MATRICIAL - emparejamiento por lotes entre dos fuentes
+Para el puente hunterprice y el paso 6c: en vez de consultar el índice
+producto por producto, todas las consultas de una fuente se resuelven de una:
+
+  - documentos y consultas son matrices dispersas binarias (fila = nombre,
+    columna = palabra); Q @ Dᵀ da |A∩B| de todos los pares que comparten
+    alguna palabra y Jaccard = |A∩B| / (|A| + |B| - |A∩B|) sale vectorizado
+  - el filtro de cantidades (si los dos nombres tienen números, tienen que
+    compartir al menos uno) es otra matriz dispersa: una máscara sobre los
+    pares que pasaron el umbral
+  - los pares quedan ordenados por consulta, de mayor a menor sim, y los
+    empates los gana el documento agregado primero (igual que IndiceJaccard)
+
+scipy es opcional: sin scipy cada consulta va al IndiceJaccard (mismo
+resultado, una consulta a la vez).
+"""
+
+import numpy as np
+
+from scripts.core.indice_jaccard import IndiceJaccard
+
+try:
+    from scipy import sparse
+    SCIPY_OK = True
+except ImportError:
+    SCIPY_OK = False
+
+LOTE = 5000   # consultas por producto matricial
+
+
+def _matriz(conjuntos, vocabulario, crecer):
+    """CSR binaria (len(conjuntos), len(vocabulario)); con crecer=False ignora las palabras nuevas."""
+    filas, cols = [], []
+    for i, ws in enumerate(conjuntos):
+        for w in ws:
+            c = vocabulario.get(w)
+            if c is None:
+                if not crecer:
+                    continue
+                c = vocabulario[w] = len(vocabulario)
+            filas.append(i)
+            cols.append(c)
+    datos = np.ones(len(filas), dtype=np.int32)
+    return (datos, (np.asarray(filas, dtype=np.int64), np.asarray(cols, dtype=np.int64)))
+
+
+class MatrizJaccard:
+    """
+    Documentos de una fuente (conjuntos de palabras + cantidades + valor).
+      agregar(palabras, valor, cantidades)         -> número de documento
+      pares(consultas, umbral, cantidades)         -> (inicios, docs, sims) por consulta
+      mejores(consultas, umbral, cantidades)       -> [(valor, sim) | (None, 0.0)]
+    """
+
+    def __init__(self):
+        self.valores = []
+        self._palabras = []
+        self._cantidades = []
+        self._cache = None
+
+    def __len__(self):
+        return len(self.valores)
+
+    def agregar(self, palabras, valor, cantidades=frozenset()):
+        self._palabras.append(palabras)
+        self._cantidades.append(cantidades)
+        self.valores.append(valor)
+        self._cache = None
+        return len(self.valores) - 1
+
+    def _preparar(self):
+        """Matrices de documentos (o el índice de respaldo sin scipy); se arman una vez."""
+        if self._cache is not None:
+            return self._cache
+        n = len(self.valores)
+        if SCIPY_OK:
+            vocab, vocab_cant = {}, {}
+            d = sparse.csr_matrix(_matriz(self._palabras, vocab, True), shape=(n, max(len(vocab), 1)))
+            c = sparse.csr_matrix(_matriz(self._cantidades, vocab_cant, True), shape=(n, max(len(vocab_cant), 1)))
+            self._cache = {
+                "vocab": vocab, "vocab_cant": vocab_cant,
+                "dt": d.T.tocsr(), "cant": c,
+                "largos": np.asarray(d.sum(axis=1)).ravel().astype(np.int64),
+                "con_cant": np.asarray(c.sum(axis=1)).ravel() > 0,
+            }
+        else:
+            indice = IndiceJaccard()
+            for doc, ws in enumerate(self._palabras):
+                indice.agregar(ws, doc)
+            self._cache = {"indice": indice}
+        return self._cache
+
+    def pares(self, consultas, umbral, cantidades=None):
+        """
+        Documentos con sim >= umbral (y cantidades compatibles, si se pasan
+        las de cada consulta) en formato CSR: los de la consulta i son
+        docs[inicios[i]:inicios[i+1]], de mayor a menor sim.
+        """
+        consultas = list(consultas)
+        cantidades = list(cantidades) if cantidades is not None else None
+        if not len(self.valores) or not consultas:
+            return np.zeros(len(consultas) + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        cache = self._preparar()
+        calcular = self._pares_scipy if SCIPY_OK else self._pares_indice
+        partes = [calcular(cache, consultas[i:i + LOTE], umbral, cantidades[i:i + LOTE] if cantidades else None)
+                  for i in range(0, len(consultas), LOTE)]
+        filas = np.concatenate([r + i for (r, _, _), i in zip(partes, range(0, len(consultas), LOTE))])
+        docs = np.concatenate([d for _, d, _ in partes])
+        sims = np.concatenate([s for _, _, s in partes])
+        inicios = np.concatenate(([0], np.cumsum(np.bincount(filas, minlength=len(consultas)))))
+        return inicios, docs, sims
+
+    def _pares_scipy(self, cache, consultas, umbral, cantidades):
+        nq = len(consultas)
+        q = sparse.csr_matrix(_matriz(consultas, cache["vocab"], False), shape=(nq, cache["dt"].shape[0]))
+        s = (q @ cache["dt"]).tocoo()
+        filas, docs, inter = s.row.astype(np.int64), s.col.astype(np.int64), s.data.astype(np.int64)
+        largos_q = np.fromiter(map(len, consultas), dtype=np.int64, count=nq)
+        sims = inter / (largos_q[filas] + cache["largos"][docs] - inter)
+        sel = sims >= umbral
+        filas, docs, sims = filas[sel], docs[sel], sims[sel]
+        if cantidades is not None and len(filas):
+            cq = sparse.csr_matrix(_matriz(cantidades, cache["vocab_cant"], False), shape=(nq, cache["cant"].shape[1]))
+            con_cant_q = np.fromiter((bool(c) for c in cantidades), dtype=bool, count=nq)
+            comparten = np.asarray(cq[filas].multiply(cache["cant"][docs]).sum(axis=1)).ravel() > 0
+            ok = ~con_cant_q[filas] | ~cache["con_cant"][docs] | comparten
+            filas, docs, sims = filas[ok], docs[ok], sims[ok]
+        orden = np.lexsort((docs, -sims, filas))
+        return filas[orden], docs[orden], sims[orden]
+
+    def _pares_indice(self, cache, consultas, umbral, cantidades):
+        filas, docs, sims = [], [], []
+        for i, ws in enumerate(consultas):
+            d, s = cache["indice"].ordenados(ws, umbral)
+            cant_q = cantidades[i] if cantidades is not None else None
+            for doc, sim in zip(d.tolist(), s.tolist()):
+                cant_d = self._cantidades[doc]
+                if cant_q and cant_d and not (cant_q & cant_d):
+                    continue   # cantidades incompatibles
+                filas.append(i)
+                docs.append(doc)
+                sims.append(sim)
+        return np.asarray(filas, dtype=np.int64), np.asarray(docs, dtype=np.int64), np.asarray(sims, dtype=float)
+
+    def mejores(self, consultas, umbral, cantidades=None):
+        """(valor, sim) del mejor documento de cada consulta, o (None, 0.0)."""
+        inicios, docs, sims = self.pares(consultas, umbral, cantidades)
+        salida = []
+        for i in range(len(inicios) - 1):
+            k = inicios[i]
+            salida.append((self.valores[docs[k]], float(sims[k])) if inicios[i + 1] > k else (None, 0.0))
+        return salida
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LIMITADOR DE TASA - presupuesto global de requests por segundo
+Reemplaza los time.sleep() fijos entre páginas: cada request reserva un turno
+y el tiempo total depende de la tasa configurada, no de la cantidad de páginas.
+LimitadorAdaptativo además ajusta esa tasa según cómo responde cada host.
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class LimitadorTasa:
+    """
+    Token bucket thread-safe.
+      rps   : requests por segundo permitidos (<= 0 desactiva el límite)
+      rafaga: cuántos requests pueden salir juntos sin esperar
+    """
+
+    def __init__(self, rps, rafaga=1):
+        self.rps = float(rps)
+        self.rafaga = max(1, int(rafaga))
+        self._lock = threading.Lock()
+        self._proximo = time.monotonic()
+
+    def reservar(self):
+        """Reserva un turno y devuelve los segundos a esperar antes de usarlo."""
+        if self.rps <= 0:
+            return 0.0
+        intervalo = 1.0 / self.rps
+        with self._lock:
+            ahora = time.monotonic()
+            # Permite "acumular" hasta `rafaga` turnos sin uso
+            turno = max(self._proximo, ahora - (self.rafaga - 1) * intervalo)
+            self._proximo = turno + intervalo
+            return max(0.0, turno - ahora)
+
+    def esperar(self):
+        """Bloquea el hilo actual hasta que le toque su turno."""
+        espera = self.reservar()
+        if espera > 0:
+            time.sleep(espera)
+
+
+ESTADOS_FRENO = {403, 429, 503}
+MARCAS_DESAFIO = ("cf-chl", "challenge-platform", "Just a moment...", "Attention Required! | Cloudflare")
+
+
+def es_bloqueo(r):
+    """True si la respuesta es un rechazo por exceso de tráfico (429/403/503 o desafío de Cloudflare)."""
+    if r.status_code in ESTADOS_FRENO:
+        return True
+    if r.status_code == 200 and "cloudflare" in str(getattr(r, "headers", {}).get("server", "")).lower():
+        return any(m in r.text[:5000] for m in MARCAS_DESAFIO)
+    return False
+
+
+class LimitadorAdaptativo(LimitadorTasa):
+    """
+    Token bucket que ajusta su tasa según las respuestas del host (AIMD):
+      - cada `ventana` respuestas sanas seguidas sube `paso` req/s (hasta rps_max)
+      - 429/403/503 o un desafío de Cloudflare: divide la tasa por 2 y pausa
+        con backoff exponencial (o lo que pida Retry-After)
+      - si al cerrar la ventana la latencia media supera factor_latencia x la
+        mejor observada, en vez de subir baja un 20%
+    La tasa actual queda en .rps y metricas() la resume para los logs.
+    """
+
+    def __init__(self, rps, rafaga=1, rps_min=0.1, rps_max=None, paso=0.25, ventana=10,
+                 factor_latencia=2.0, pausa_max=120.0):
+        super().__init__(rps, rafaga)
+        self.rps_min = rps_min
+        self.rps_max = rps_max or rps * 4
+        self.paso = paso
+        self.ventana = ventana
+        self.factor_latencia = factor_latencia
+        self.pausa_max = pausa_max
+        self.respuestas = 0
+        self.bloqueos = 0
+        self._sanas = 0
+        self._bloqueos_seguidos = 0
+        self._latencia = None      # media móvil exponencial (s)
+        self._latencia_min = None
+
+    def _cambiar(self, factor):
+        self.rps = min(self.rps_max, max(self.rps_min, self.rps * factor))
+        self._sanas = 0
+
+    def _cambiar_suma(self, paso):
+        self.rps = min(self.rps_max, max(self.rps_min, self.rps + paso))
+        self._sanas = 0
+
+    def registrar(self, r=None, latencia=None):
+        """Informa el resultado de un request. r=None significa error de red / timeout."""
+        with self._lock:
+            self.respuestas += 1
+            if r is None or es_bloqueo(r):
+                self.bloqueos += 1
+                self._bloqueos_seguidos += 1
+                self._cambiar(0.5)
+                pausa = min(self.pausa_max, 2.0 ** self._bloqueos_seguidos)
+                retry_after = getattr(r, "headers", {}).get("retry-after") if r is not None else None
+                if retry_after and str(retry_after).isdigit():
+                    pausa = min(self.pausa_max, float(retry_after))
+                self._proximo = max(self._proximo, time.monotonic() + pausa)
+                return
+            self._bloqueos_seguidos = 0
+
+            if latencia is not None:
+                self._latencia = latencia if self._latencia is None else 0.8 * self._latencia + 0.2 * latencia
+                self._latencia_min = self._latencia if self._latencia_min is None else min(self._latencia_min, self._latencia)
+
+            # Al completar una ventana de respuestas sanas se decide: si el host se
+            # está poniendo lento se baja la tasa, si no se sube
+            self._sanas += 1
+            if self._sanas >= self.ventana:
+                if self._latencia is not None and self._latencia > self.factor_latencia * self._latencia_min:
+                    self._cambiar(0.8)
+                else:
+                    self._cambiar_suma(self.paso)
+
+    def pedir(self, funcion, *args, **kwargs):
+        """Espera turno, ejecuta funcion(*args, **kwargs) (ej. session.get) y registra el resultado."""
+        self.esperar()
+        t = time.monotonic()
+        try:
+            r = funcion(*args, **kwargs)
+        except Exception:
+            self.registrar(None)
+            raise
+        self.registrar(r, time.monotonic() - t)
+        return r
+
+    def metricas(self):
+        return {
+            "rps": round(self.rps, 2),
+            "respuestas": self.respuestas,
+            "bloqueos": self.bloqueos,
+            "latencia_ms": round(self._latencia * 1000) if self._latencia is not None else None,
+        }
+
+
+_por_host = {}
+_lock_hosts = threading.Lock()
+
+
+def limitador_host(host, rps, **kwargs):
+    """Un LimitadorAdaptativo por host y por proceso, compartido entre hilos y scrapers.
+    `host` puede ser el host o cualquier URL del sitio."""
+    host = urlparse(host).netloc or host
+    with _lock_hosts:
+        if host not in _por_host:
+            _por_host[host] = LimitadorAdaptativo(rps, **kwargs)
+        return _por_host[host]
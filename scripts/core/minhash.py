@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MINHASH / LSH - candidatos aproximados para maestros de cientos de miles de nombres
+El enricher fuzzy compara cada producto contra los 560k nombres de VITAL; con
+LSH cada consulta sólo se compara (con el scorer exacto) contra los pocos
+nombres que caen en el mismo balde en alguna banda.
+
+  - MinHash(num_perm) asigna a cada conjunto de palabras una firma de
+    num_perm mínimos: la fracción de posiciones iguales entre dos firmas
+    estima su Jaccard
+  - IndiceLSH(firmas, bandas, filas) parte las primeras bandas·filas columnas
+    en `bandas` grupos de `filas`; dos nombres son candidatos si coinciden en
+    todas las filas de al menos una banda. La probabilidad de que un par con
+    Jaccard s sea candidato es 1 - (1 - s^filas)^bandas (umbral_lsh() da el s
+    donde la curva cruza 0.5, aprox.)
+
+Cada banda guarda sus claves ordenadas (numpy) en vez de un dict de baldes:
+una consulta es un searchsorted por banda.
+"""
+
+import zlib
+
+import numpy as np
+
+PRIMO = 4294967291          # mayor primo < 2^32: las firmas entran en uint32
+_VACIA = np.iinfo(np.uint32).max
+_LOTE = 50000               # documentos por bloque al calcular firmas
+
+
+class MinHash:
+    """Firmas MinHash reproducibles (misma semilla -> mismas firmas entre corridas)."""
+
+    def __init__(self, num_perm=64, semilla=1):
+        rnd = np.random.RandomState(semilla)
+        self.num_perm = num_perm
+        self._a = rnd.randint(1, PRIMO, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rnd.randint(0, PRIMO, size=(num_perm, 1), dtype=np.uint64)
+        self._ids = {}       # palabra -> columna de _hashes
+        self._crc = []
+
+    def _columnas(self, palabras):
+        cols = []
+        for w in palabras:
+            c = self._ids.get(w)
+            if c is None:
+                c = self._ids[w] = len(self._crc)
+                self._crc.append(zlib.crc32(w.encode("utf-8")))
+            cols.append(c)
+        return cols
+
+    def _permutar(self, crcs):
+        """(num_perm, len(crcs)) con (a·h + b) mod PRIMO; a, h < 2^32 así que no desborda uint64."""
+        h = np.asarray(crcs, dtype=np.uint64)[None, :]
+        return ((self._a * h + self._b) % PRIMO).astype(np.uint32)
+
+    def firma(self, palabras):
+        """Firma (num_perm,) uint32 de un conjunto de palabras."""
+        if not palabras:
+            return np.full(self.num_perm, _VACIA, dtype=np.uint32)
+        crcs = [self._crc[c] for c in self._columnas(palabras)]
+        return self._permutar(crcs).min(axis=1)
+
+    def firmas(self, conjuntos):
+        """Matriz (len(conjuntos), num_perm) uint32, calculada por bloques."""
+        conjuntos = list(conjuntos)
+        salida = np.full((len(conjuntos), self.num_perm), _VACIA, dtype=np.uint32)
+        for ini in range(0, len(conjuntos), _LOTE):
+            bloque = conjuntos[ini:ini + _LOTE]
+            filas = [i for i, ws in enumerate(bloque) if ws]
+            if not filas:
+                continue
+            cols = [self._columnas(bloque[i]) for i in filas]
+            largos = np.array([len(c) for c in cols])
+            planas = np.concatenate([np.asarray(c, dtype=np.int64) for c in cols])
+            unicas, inversa = np.unique(planas, return_inverse=True)
+            valores = self._permutar([self._crc[c] for c in unicas.tolist()])[:, inversa]
+            inicios = np.concatenate(([0], np.cumsum(largos)[:-1]))
+            salida[ini + np.asarray(filas)] = np.minimum.reduceat(valores, inicios, axis=1).T
+        return salida
+
+
+def probabilidad(sim, bandas, filas):
+    """Probabilidad de que un par con Jaccard `sim` salga como candidato."""
+    return 1 - (1 - sim ** filas) ** bandas
+
+
+def umbral_lsh(bandas, filas):
+    return (1 / bandas) ** (1 / filas)
+
+
+class IndiceLSH:
+    """Baldes por banda sobre una matriz de firmas (usa sus primeras bandas·filas columnas)."""
+
+    def __init__(self, firmas, bandas=16, filas=4, semilla=7):
+        if bandas * filas > firmas.shape[1]:
+            raise ValueError(f"bandas·filas = {bandas * filas} supera las {firmas.shape[1]} permutaciones")
+        self.bandas = bandas
+        self.filas = filas
+        rnd = np.random.RandomState(semilla)
+        self._mult = rnd.randint(1, 2 ** 63, size=filas, dtype=np.uint64) | np.uint64(1)
+        vacias = (firmas[:, 0] == _VACIA)
+        self._claves = []
+        self._orden = []
+        for j in range(bandas):
+            claves = self._clave(firmas[:, j * filas:(j + 1) * filas])
+            orden = np.argsort(claves, kind="stable")
+            orden = orden[~vacias[orden]]      # los nombres sin palabras no son candidatos de nadie
+            self._claves.append(claves[orden])
+            self._orden.append(orden.astype(np.int32))
+
+    def _clave(self, columnas):
+        # Combinación lineal con multiplicadores impares: desborda y envuelve en uint64 a propósito
+        with np.errstate(over="ignore"):
+            return (columnas.astype(np.uint64) * self._mult).sum(axis=-1, dtype=np.uint64)
+
+    def candidatos(self, firma):
+        """Documentos que comparten al menos una banda con `firma` (ordenados, sin repetir)."""
+        if firma[0] == _VACIA:
+            return np.zeros(0, dtype=np.int32)
+        claves_q = self._clave(firma[:self.bandas * self.filas].reshape(self.bandas, self.filas))
+        partes = []
+        for claves, orden, k in zip(self._claves, self._orden, claves_q):
+            lo = np.searchsorted(claves, k, "left")
+            hi = np.searchsorted(claves, k, "right")
+            if hi > lo:
+                partes.append(orden[lo:hi])
+        if not partes:
+            return np.zeros(0, dtype=np.int32)
+        return np.unique(np.concatenate(partes))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NORMALIZACIÓN DE NOMBRES - clave de matching en una sola llamada
+tokenizar(nombre) devuelve la clave que antes armaba clave_nombre() con ~15
+re.sub encadenados, más sus tokens y las cantidades que usan los filtros de
+tamaño (_nums / _src_nums), sin volver a recorrer el texto en cada paso.
+
+  1. minúsculas, sin acentos (sólo si el nombre no es ASCII), coma decimal
+     y puntuación -> espacio
+  2. "x" multiplicador antes de número
+  3. UNA pasada con todas las unidades: litros/kilos -> ml/gr (con decimales),
+     cm3/ccm -> ml, grs -> gr, uni -> un, y número pegado a su unidad
+
+clave_referencia() es la implementación original paso a paso: queda como
+referencia para scripts/utils/benchmark_normalizacion.py, que verifica que
+las dos den exactamente lo mismo.
+
+unidades_extra=False reproduce la variante de unificador_v2 (sin cm3/ccm
+y sin pegar "ul").
+
+CacheNombres memoriza el resultado por nombre crudo durante todo el armado
+del catálogo, que pide la clave del mismo nombre en muchos pasos.
+"""
+
+import re
+import sys
+import unicodedata
+from collections import namedtuple
+
+NombreNormalizado = namedtuple("NombreNormalizado", "clave tokens cantidades")
+EntradaNombre = namedtuple("EntradaNombre", "clave tokens palabras cantidades")
+
+# Ruido para el matching por palabras (las de una letra ya se descartan por largo)
+PALABRAS_VACIAS = frozenset({"de", "la", "el", "y", "con", "sin", "pet", "pvc",
+                             "bot", "sdo", "fco", "brik", "en"})
+
+_COMA_DECIMAL = re.compile(r"(\d),(\d)")
+_FUERA_DE_CLAVE = re.compile(r"[^a-z0-9. ]")
+_X_CANTIDAD = re.compile(r"\bx\s*(\d)")
+# Números de cantidad de una clave ('1500' de '1500ml', o sueltos de 2-5 dígitos)
+_NUM_CANTIDAD = re.compile(r"(\d+)(?:ml|gr|kg|un|cc)\b|\b(\d{2,5})\b")
+
+_CANONICA = {"cm3": "ml", "ccm": "ml", "grs": "gr", "uni": "un"}
+
+
+def _patron_unidades(extra):
+    # Litros y kilos aceptan decimales ("1.5 l"); el resto de las unidades sólo enteros
+    enteras = ("cm3|ccm|" if extra else "") + "grs|uni|cc|ml|gr|un" + ("|ul" if extra else "")
+    return re.compile(rf"(\d+\.?\d*)\s*(lts?|l|kgs?)\b|(\d+)\s*({enteras})\b")
+
+
+_UNIDADES = {True: _patron_unidades(True), False: _patron_unidades(False)}
+
+
+def _unidad(m):
+    if m.group(1) is not None:
+        return str(int(float(m.group(1)) * 1000)) + ("gr" if m.group(2)[0] == "k" else "ml")
+    u = m.group(4)
+    return m.group(3) + _CANONICA.get(u, u)
+
+
+def tokenizar(nombre, unidades_extra=True):
+    """
+    Devuelve NombreNormalizado(clave, tokens, cantidades):
+      clave      : igual a clave_referencia(nombre)
+      tokens     : clave.split()
+      cantidades : frozenset de números de cantidad ('1500', '12', ...)
+    """
+    n = (nombre or "").lower().strip()
+    if not n.isascii():
+        n = "".join(c for c in unicodedata.normalize("NFD", n) if unicodedata.category(c) != "Mn")
+    if "," in n:
+        n = _COMA_DECIMAL.sub(r"\1.\2", n)
+    n = _FUERA_DE_CLAVE.sub(" ", n)
+    if "x" in n:
+        n = _X_CANTIDAD.sub(r"\1", n)
+    n = _UNIDADES[unidades_extra].sub(_unidad, n)
+    tokens = n.replace(".", " ").split()
+    clave = " ".join(tokens)
+    return NombreNormalizado(clave, tokens, frozenset(a or b for a, b in _NUM_CANTIDAD.findall(clave)))
+
+
+def cantidades(clave):
+    """Números de cantidad de una clave ya normalizada."""
+    return {a or b for a, b in _NUM_CANTIDAD.findall(clave)}
+
+
+def clave_referencia(nombre, unidades_extra=True):
+    """Implementación original de clave_nombre (un re.sub por regla)."""
+    n = (nombre or "").lower().strip()
+    n = unicodedata.normalize("NFD", n)
+    n = "".join(c for c in n if unicodedata.category(c) != "Mn")
+    n = re.sub(r"(\d),(\d)", r"\1.\2", n)
+    n = re.sub(r"[^a-z0-9. ]", " ", n)
+    n = re.sub(r"\bx\s*(\d)", r"\1", n)
+    if unidades_extra:
+        n = re.sub(r"(\d+)\s*cm3\b",  lambda m: m.group(1)+"ml",  n)
+        n = re.sub(r"(\d+)\s*ccm\b",  lambda m: m.group(1)+"ml",  n)
+    n = re.sub(r"(\d+\.?\d*)\s*lts?\b", lambda m: str(int(float(m.group(1))*1000))+"ml", n)
+    n = re.sub(r"(\d+\.?\d*)\s*lt\b",   lambda m: str(int(float(m.group(1))*1000))+"ml", n)
+    n = re.sub(r"(\d+\.?\d*)\s*l\b",    lambda m: str(int(float(m.group(1))*1000))+"ml", n)
+    n = re.sub(r"(\d+)\s*grs\b", lambda m: m.group(1)+"gr", n)
+    n = re.sub(r"(\d+\.?\d*)\s*kgs?\b", lambda m: str(int(float(m.group(1))*1000))+"gr", n)
+    n = re.sub(r"(\d+)\s*uni\b", lambda m: m.group(1)+"un", n)
+    if unidades_extra:
+        n = re.sub(r"(\d+)\s*(cc|ml|gr|kg|un|ul)\b", r"\1\2", n)
+    else:
+        n = re.sub(r"(\d+)\s*(cc|ml|gr|kg|un)\b", r"\1\2", n)
+    n = re.sub(r"\.", " ", n)
+    return re.sub(r"\s+", " ", n).strip()
+
+
+def palabras(tokens):
+    """Tokens útiles para Jaccard: más de una letra, sin PALABRAS_VACIAS ni números sueltos."""
+    return frozenset(w for w in tokens if len(w) > 1 and w not in PALABRAS_VACIAS and not w.isdigit())
+
+
+class CacheNombres:
+    """
+    Memo nombre crudo -> EntradaNombre(clave, tokens, palabras, cantidades).
+    Cada nombre distinto se tokeniza una sola vez por corrida; stats() resume
+    la tasa de aciertos y la memoria aproximada del memo.
+    """
+
+    def __init__(self, unidades_extra=True):
+        self.unidades_extra = unidades_extra
+        self.aciertos = 0
+        self.fallos = 0
+        self._memo = {}
+
+    def __call__(self, nombre):
+        entrada = self._memo.get(nombre)
+        if entrada is not None:
+            self.aciertos += 1
+            return entrada
+        self.fallos += 1
+        clave, tokens, cant = tokenizar(nombre, self.unidades_extra)
+        entrada = EntradaNombre(clave, tuple(tokens), palabras(tokens), cant)
+        self._memo[nombre] = entrada
+        return entrada
+
+    def clave(self, nombre):
+        return self(nombre).clave
+
+    def __len__(self):
+        return len(self._memo)
+
+    def memoria(self):
+        """Bytes aproximados del memo (dict + nombres + claves, tokens y conjuntos)."""
+        total = sys.getsizeof(self._memo)
+        for nombre, e in self._memo.items():
+            total += sys.getsizeof(nombre) + sys.getsizeof(e) + sys.getsizeof(e.clave)
+            total += sys.getsizeof(e.tokens) + sys.getsizeof(e.palabras) + sys.getsizeof(e.cantidades)
+            total += sum(sys.getsizeof(t) for t in e.tokens)
+        return total
+
+    def stats(self):
+        pedidos = self.aciertos + self.fallos
+        return {
+            "nombres": len(self._memo),
+            "pedidos": pedidos,
+            "tasa_aciertos": round(self.aciertos / pedidos, 3) if pedidos else 0.0,
+            "memoria_kb": round(self.memoria() / 1024),
+        }
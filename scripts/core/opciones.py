@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OPCIONES DE LÍNEA DE COMANDOS - '--nombre=valor' en sys.argv
+Los scripts leen sus flags directo de sys.argv ("--delta" in sys.argv);
+las opciones con valor pasan por opcion():
+
+  opcion("workers", 4)      -> int("8") con --workers=8, 4 si no está
+  opcion("directorio")      -> el valor como str, None si no está
+"""
+
+import sys
+
+
+def opcion(nombre, default=None):
+    """Valor de '--nombre=valor', convertido al tipo de `default` (str si default es None)."""
+    prefijo = f"--{nombre}="
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefijo):
+            valor = arg[len(prefijo):]
+            return valor if default is None else type(default)(valor)
+    return default
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PARSEO HTML - backend de parseo para las páginas de listado
+Las páginas de categoría pesan cientos de KB (ver yaguar_tienda.html) y armar
+un árbol BeautifulSoup completo por página domina el tiempo de CPU del scrapeo.
+
+  lxml : parser en C + XPath compilados una sola vez por target (por defecto)
+  bs4  : BeautifulSoup con html.parser, el camino original en Python puro
+
+Cada target mantiene sus dos implementaciones y elige con parseo.BACKEND.
+Sin lxml instalado se usa bs4 automáticamente; --bs4 lo fuerza en los scrapers.
+"""
+
+from types import SimpleNamespace
+
+try:
+    from lxml import etree, html as lxml_html
+    LXML_DISPONIBLE = True
+except ImportError:
+    LXML_DISPONIBLE = False
+
+BACKENDS = ("lxml", "bs4")
+BACKEND = "lxml" if LXML_DISPONIBLE else "bs4"
+
+
+def usar_backend(nombre):
+    """Cambia el backend activo. Pedir lxml sin tenerlo instalado deja bs4."""
+    global BACKEND
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend de parseo desconocido: {nombre}")
+    BACKEND = nombre if (nombre == "bs4" or LXML_DISPONIBLE) else "bs4"
+    return BACKEND
+
+
+def clase(nombre):
+    """Predicado XPath equivalente a class_=nombre de bs4 (una de las clases del elemento)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {nombre} ')"
+
+
+def compilar(**expresiones):
+    """
+    Compila una vez los XPath de un target: compilar(items="//li", ...).xp.items(doc)
+    Devuelve None si lxml no está instalado (el target usa su camino bs4).
+    """
+    if not LXML_DISPONIBLE:
+        return None
+    return SimpleNamespace(**{k: etree.XPath(v) for k, v in expresiones.items()})
+
+
+def documento(html):
+    """Árbol lxml de la página, o None si viene vacía."""
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def primero(xpath, el):
+    """Primer resultado de un XPath compilado (como select_one/find de bs4), o None."""
+    res = xpath(el)
+    return res[0] if res else None
+
+
+_SIN_TEXTO = {"script", "style", "template"}
+
+
+def _textos(el):
+    if el.text and el.tag not in _SIN_TEXTO:
+        yield el.text
+    for hijo in el:
+        # Comentarios e instrucciones no aportan texto (tag no es str), pero su tail sí
+        if isinstance(hijo.tag, str) and hijo.tag not in _SIN_TEXTO:
+            yield from _textos(hijo)
+        if hijo.tail:
+            yield hijo.tail
+
+
+def texto(el, strip=True):
+    """Igual que el.get_text(strip=...) de bs4: concatena los textos del subárbol,
+    sin el contenido de <script>/<style>/<template> ni comentarios."""
+    if strip:
+        return "".join(s for s in (t.strip() for t in _textos(el)) if s)
+    return "".join(_textos(el))
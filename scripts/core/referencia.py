@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DATOS DE REFERENCIA - snapshots binarios de CODIGOS.xlsx y el Listado Maestro
+Abrir los Excel con openpyxl/pandas tarda segundos y lo hacen varios scripts
+en cada corrida. La primera lectura de cada archivo se guarda en
+data/cache_excel/ como pickle (protocolo 5); las siguientes la levantan en
+milisegundos mientras el archivo no cambie.
+
+  hojas(ruta)                   -> {hoja: [filas como tuplas]}  (como iter_rows(values_only=True))
+  dataframe(ruta, **kw)         -> pd.read_excel(ruta, **kw)
+  compilado(nombre, fuentes, f) -> f() (ej. los dicts armados a partir de las
+                                   filas), cacheado por el contenido de `fuentes`:
+                                   los Excel y los .py que los interpretan
+
+Cada snapshot guarda la huella del Excel (mtime, tamaño, sha1). Si cambió el
+mtime pero no el contenido (ej. se copió el archivo) se reutiliza igual; si
+cambió el contenido se vuelve a leer el Excel y se reemplaza el snapshot.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "data", "cache_excel")
+_HUELLAS = os.path.join(SNAPSHOT_DIR, "huellas.json")
+
+
+def _sha1_archivo(ruta):
+    h = hashlib.sha1()
+    with open(ruta, "rb") as fh:
+        for bloque in iter(lambda: fh.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def huella(ruta):
+    """sha1 del contenido; sólo se recalcula si cambiaron mtime o tamaño."""
+    st = os.stat(ruta)
+    try:
+        with open(_HUELLAS, encoding="utf-8") as fh:
+            huellas = json.load(fh)
+    except (OSError, ValueError):
+        huellas = {}
+    previa = huellas.get(os.path.abspath(ruta))
+    if previa and previa["mtime"] == st.st_mtime and previa["tam"] == st.st_size:
+        return previa["sha1"]
+    sha1 = _sha1_archivo(ruta)
+    huellas[os.path.abspath(ruta)] = {"mtime": st.st_mtime, "tam": st.st_size, "sha1": sha1}
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp = f"{_HUELLAS}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(huellas, fh, indent=1)
+        os.replace(tmp, _HUELLAS)
+    except OSError:
+        pass
+    return sha1
+
+
+def _cacheado(prefijo, sha1, leer):
+    """leer() guardado en <prefijo><sha1>.pkl; borra los de otro sha1 con el mismo prefijo."""
+    destino = os.path.join(SNAPSHOT_DIR, f"{prefijo}{sha1[:16]}.pkl")
+    try:
+        with open(destino, "rb") as fh:
+            return pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    datos = leer()
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(datos, fh, protocol=5)
+        os.replace(tmp, destino)
+        for viejo in os.listdir(SNAPSHOT_DIR):   # versiones anteriores del mismo archivo
+            if viejo.startswith(prefijo) and viejo.endswith(".pkl") and os.path.join(SNAPSHOT_DIR, viejo) != destino:
+                os.remove(os.path.join(SNAPSHOT_DIR, viejo))
+    except OSError as e:
+        print(f"  [WARN] No se pudo guardar el snapshot {destino}: {e}")
+    return datos
+
+
+def snapshot(ruta, tipo, leer, *clave):
+    """
+    leer() cacheado por contenido de `ruta`: el snapshot se llama
+    <archivo>.<tipo>.<sha1>.pkl; `clave` (ej. argumentos de read_excel)
+    entra en el nombre para no mezclar lecturas distintas del mismo archivo.
+    """
+    extra = hashlib.sha1(repr(clave).encode("utf-8")).hexdigest()[:8] if clave else ""
+    return _cacheado(f"{os.path.basename(ruta)}.{tipo}{extra}.", huella(ruta), leer)
+
+
+def compilado(nombre, fuentes, construir):
+    """construir() cacheado mientras no cambie ninguno de los archivos de `fuentes`."""
+    sha1 = hashlib.sha1("|".join(huella(r) for r in fuentes).encode("utf-8")).hexdigest()
+    return _cacheado(f"{nombre}.", sha1, construir)
+
+
+def hojas(ruta):
+    """Todas las hojas como listas de tuplas (fila 1 = encabezado), igual que openpyxl values_only."""
+    def leer():
+        import openpyxl
+        wb = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            return {ws.title: list(ws.iter_rows(values_only=True)) for ws in wb}
+        finally:
+            wb.close()
+    return snapshot(ruta, "hojas", leer)
+
+
+def dataframe(ruta, **kwargs):
+    """pd.read_excel(ruta, **kwargs) con snapshot."""
+    import pandas as pd
+    return snapshot(ruta, "df", lambda: pd.read_excel(ruta, **kwargs), sorted(kwargs.items()))
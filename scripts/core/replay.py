@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+REPLAY HTTP - respuestas grabadas en lugar de los sitios reales
+SesionReplay reemplaza a curl_requests.Session: get()/post() devuelven páginas
+guardadas en disco, así los parsers se pueden probar y medir sin red.
+SesionGrabadora envuelve una sesión real y guarda cada respuesta para
+reproducirla después con SesionReplay.desde_directorio().
+
+Formato de un directorio grabado:
+  <directorio>/indice.json   {"<url>": {"archivo": "<sha1>.html", "status": 200}}
+  <directorio>/<sha1>.html
+"""
+
+import os
+import json
+import hashlib
+from urllib.parse import urlencode
+
+INDICE = "indice.json"
+
+
+def clave_url(url, params=None):
+    """URL + query string ordenada, para que la misma búsqueda dé la misma clave."""
+    if params:
+        sep = "&" if "?" in url else "?"
+        return url + sep + urlencode(sorted(params.items()))
+    return url
+
+
+class RespuestaGrabada:
+    """Lo mínimo de una respuesta de curl_cffi/requests que usan los scrapers."""
+
+    def __init__(self, url, status_code, text, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class SesionReplay:
+    """
+    Sesión falsa que sirve respuestas grabadas.
+      respuestas  : {url: ruta_html} inicial
+      por_defecto : ruta servida para cualquier URL no registrada (si no, 404)
+    Los archivos se leen una sola vez y quedan en memoria.
+    """
+
+    def __init__(self, respuestas=None, por_defecto=None):
+        self.headers = {}
+        self.cookies = {}
+        self.pedidos = 0
+        self._respuestas = {}   # clave -> (status, ruta)
+        self._textos = {}       # ruta -> html
+        self.por_defecto = por_defecto
+        for url, ruta in (respuestas or {}).items():
+            self.registrar(url, ruta)
+
+    @classmethod
+    def desde_directorio(cls, directorio, por_defecto=None):
+        with open(os.path.join(directorio, INDICE), encoding="utf-8") as fh:
+            indice = json.load(fh)
+        sesion = cls(por_defecto=por_defecto)
+        for url, info in indice.items():
+            sesion.registrar(url, os.path.join(directorio, info["archivo"]), info.get("status", 200))
+        return sesion
+
+    def registrar(self, url, ruta, status=200, params=None):
+        self._respuestas[clave_url(url, params)] = (status, ruta)
+
+    def _texto(self, ruta):
+        if ruta not in self._textos:
+            with open(ruta, encoding="utf-8", errors="replace") as fh:
+                self._textos[ruta] = fh.read()
+        return self._textos[ruta]
+
+    def get(self, url, params=None, **kwargs):
+        self.pedidos += 1
+        status, ruta = self._respuestas.get(clave_url(url, params), (200, self.por_defecto))
+        if ruta is None:
+            return RespuestaGrabada(url, 404, "")
+        return RespuestaGrabada(url, status, self._texto(ruta))
+
+    post = get
+
+    def close(self):
+        pass
+
+
+class SesionGrabadora:
+    """Envuelve una sesión real y guarda cada respuesta GET en `directorio`."""
+
+    def __init__(self, sesion, directorio):
+        self.sesion = sesion
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        ruta_indice = os.path.join(directorio, INDICE)
+        self._indice = {}
+        if os.path.exists(ruta_indice):
+            with open(ruta_indice, encoding="utf-8") as fh:
+                self._indice = json.load(fh)
+
+    def __getattr__(self, nombre):
+        return getattr(self.sesion, nombre)
+
+    def get(self, url, params=None, **kwargs):
+        r = self.sesion.get(url, params=params, **kwargs)
+        clave = clave_url(url, params)
+        archivo = hashlib.sha1(clave.encode("utf-8")).hexdigest() + ".html"
+        with open(os.path.join(self.directorio, archivo), "w", encoding="utf-8") as fh:
+            fh.write(r.text)
+        self._indice[clave] = {"archivo": archivo, "status": r.status_code}
+        with open(os.path.join(self.directorio, INDICE), "w", encoding="utf-8") as fh:
+            json.dump(self._indice, fh, ensure_ascii=False, indent=2)
+        return r
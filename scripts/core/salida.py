@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SALIDA JSONL - output en streaming de los scrapers
+Los scrapers escriben un producto por línea a medida que parsean cada página
+(append-only, opcionalmente gzip) en vez de un único json.dump al final.
+El catálogo los lee con leer_productos(), también en streaming, así que la
+memoria no crece con el tamaño del archivo y el output se puede leer mientras
+el scraper todavía está corriendo.
+
+Junto a cada output queda <ruta>.manifiesto (JSON) con su resumen: productos,
+con precio, precios válidos, promedio, la corrección de escala sugerida y el
+sha1 del contenido. Lo escribe SalidaJsonl al cerrar; para outputs viejos o
+escritos por otro medio manifiesto() lo arma en una pasada la primera vez. Así
+el catálogo elige y combina archivos sin volver a parsearlos en cada corrida.
+
+Opcionalmente un output puede tener además su versión columnar
+(<ruta>.columnas/, ver columnar.py): leer_productos(ruta, campos) la usa si
+está al día con el output y lee sólo esas columnas.
+"""
+
+import os
+import glob
+import gzip
+import json
+import hashlib
+import shutil
+
+from scripts.core import columnar
+
+EXTENSIONES = (".json", ".jsonl", ".jsonl.gz")
+MANIFIESTO = ".manifiesto"
+VERSION_MANIFIESTO = 1
+PRECIO_VALIDO = 200   # precio mínimo razonable para Argentina
+
+
+def _abrir(ruta, modo):
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, modo + "t", encoding="utf-8")
+    return open(ruta, modo, encoding="utf-8")
+
+
+class SalidaJsonl:
+    """
+    Sink append-only de productos.
+      ruta  : .jsonl o .jsonl.gz (gzip)
+      clave : opcional, función producto -> clave para descartar repetidos
+      columnar : al cerrar escribe también la versión columnar del output
+    """
+
+    def __init__(self, ruta, clave=None, columnar=False):
+        self.ruta = ruta
+        self.clave = clave
+        self.columnar = columnar
+        self.total = 0
+        self._vistos = set()
+        self._fh = _abrir(ruta, "a")
+
+    def escribir(self, productos):
+        """Agrega los productos (ej. los de una página) y flushea. Devuelve cuántos escribió."""
+        escritos = 0
+        for p in productos:
+            if self.clave:
+                k = self.clave(p)
+                if k in self._vistos:
+                    continue
+                self._vistos.add(k)
+            self._fh.write(json.dumps(p, ensure_ascii=False) + "\n")
+            escritos += 1
+        self._fh.flush()
+        self.total += escritos
+        return escritos
+
+    def cerrar(self):
+        self._fh.close()
+        manifiesto(self.ruta)
+        if self.columnar:
+            convertir_columnar(self.ruta)
+
+    def descartar(self):
+        """Cierra y borra el output con su manifiesto y su versión columnar (ej. corrida rechazada)."""
+        self._fh.close()
+        for ruta in (self.ruta, self.ruta + MANIFIESTO):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        shutil.rmtree(columnar.ruta_columnas(self.ruta), ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def leer_jsonl(ruta):
+    """Itera los productos de un .jsonl/.jsonl.gz, tolerando una última línea incompleta."""
+    with _abrir(ruta, "r") as fh:
+        try:
+            for linea in fh:
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    continue
+        except EOFError:
+            return   # gzip todavía en escritura: se lee hasta donde llegó
+
+
+def leer_productos(ruta, campos=None):
+    """
+    Itera los productos de un output, sea JSON array (formato viejo) o JSONL.
+    Con `campos`, cada producto trae sólo esos campos y, si el output tiene
+    versión columnar al día, se leen de ahí sin parsear el JSON.
+    """
+    if campos is not None:
+        tabla = _tabla_columnar(ruta)
+        if tabla is not None:
+            yield from tabla.productos(campos)
+        else:
+            for p in leer_productos(ruta):
+                yield {k: p[k] for k in campos if k in p}
+        return
+    if ruta.endswith(".json"):
+        with open(ruta, encoding="utf-8") as fh:
+            yield from json.load(fh)
+    else:
+        yield from leer_jsonl(ruta)
+
+
+def escala_sugerida(prom):
+    """
+    Fix de escala para un archivo con precio promedio `prom`, como
+    [factor, aplicar a precios menores a] o None:
+      promedio < $200  -> el scraper guardó miles: x1000 a los precios < $200
+      promedio >= $200 -> x100 a los precios < $100 (centavos sueltos)
+    """
+    if 0 < prom < PRECIO_VALIDO:
+        return [1000, PRECIO_VALIDO]
+    if prom >= PRECIO_VALIDO:
+        return [100, 100]
+    return None
+
+
+def aplicar_escala(p, escala):
+    precio = p.get("precio", 0)
+    if escala and 0 < precio < escala[1]:
+        p["precio"] = round(precio * escala[0], 2)
+    return p
+
+
+def _resumir(ruta):
+    h = hashlib.sha1()
+    with open(ruta, "rb") as fh:
+        for bloque in iter(lambda: fh.read(1 << 20), b""):
+            h.update(bloque)
+    productos, precios = 0, []
+    for p in leer_productos(ruta):
+        productos += 1
+        precio = p.get("precio", 0)
+        if precio > 0:
+            precios.append(precio)
+    prom = sum(precios) / len(precios) if precios else 0
+    escala = escala_sugerida(prom)
+    return {
+        "productos": productos,
+        "con_precio": len(precios),
+        "precios_validos": sum(1 for x in precios if aplicar_escala({"precio": x}, escala)["precio"] > PRECIO_VALIDO),
+        "precio_promedio": prom,
+        "escala": escala,
+        "sha1": h.hexdigest(),
+    }
+
+
+def manifiesto(ruta):
+    """
+    Resumen del output `ruta` (ver docstring del módulo). Vale mientras el
+    archivo tenga el mismo tamaño y mtime que cuando se armó; si no, se
+    recalcula y se reescribe el .manifiesto.
+    """
+    st = os.stat(ruta)
+    destino = ruta + MANIFIESTO
+    try:
+        with open(destino, encoding="utf-8") as fh:
+            m = json.load(fh)
+        if m["version"] == VERSION_MANIFIESTO and m["tam"] == st.st_size and m["mtime"] == st.st_mtime:
+            return m
+    except (OSError, ValueError, KeyError):
+        pass
+    m = _resumir(ruta)
+    m.update(version=VERSION_MANIFIESTO, tam=st.st_size, mtime=st.st_mtime)
+    try:
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(m, fh, indent=1)
+        os.replace(tmp, destino)
+    except OSError:
+        pass   # directorio de sólo lectura: se recalcula la próxima vez
+    return m
+
+
+def leer_columnas(ruta, campos):
+    """
+    {campo: [valor de cada producto]} de un output, con columnar.FALTA donde
+    el producto no tiene el campo. De la versión columnar si está al día.
+    """
+    tabla = _tabla_columnar(ruta)
+    if tabla is not None:
+        return {c: tabla.valores(c) for c in campos}
+    columnas = {c: [] for c in campos}
+    for p in leer_productos(ruta):
+        for c in campos:
+            columnas[c].append(p.get(c, columnar.FALTA))
+    return columnas
+
+
+def _tabla_columnar(ruta):
+    """TablaColumnar de `ruta` si existe y corresponde al contenido actual del output."""
+    if not os.path.isdir(columnar.ruta_columnas(ruta)):
+        return None
+    try:
+        tabla = columnar.TablaColumnar(ruta)
+        return tabla if tabla.sha1 == manifiesto(ruta)["sha1"] else None
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def convertir_columnar(ruta):
+    """Escribe la versión columnar de `ruta` si no la tiene al día. Devuelve True si la escribió."""
+    if _tabla_columnar(ruta) is not None:
+        return False
+    columnar.escribir(ruta, leer_productos(ruta), manifiesto(ruta)["sha1"])
+    return True
+
+
+def listar_outputs(directorio, prefijo, max_archivos=None):
+    """Outputs '<prefijo>*' en cualquier formato soportado, del más reciente al más viejo."""
+    archivos = []
+    for ext in EXTENSIONES:
+        archivos.extend(glob.glob(os.path.join(directorio, f"{prefijo}*{ext}")))
+    archivos = sorted(set(archivos), key=os.path.getmtime, reverse=True)
+    return archivos[:max_archivos] if max_archivos else archivos
+
+
+def ruta_salida(directorio, nombre_base, comprimir=False):
+    """Ruta del output JSONL de una corrida: <nombre_base>.jsonl[.gz]"""
+    return os.path.join(directorio, nombre_base + (".jsonl.gz" if comprimir else ".jsonl"))
@@ -8,10 +8,15 @@ import pandas as pd
 import json
 import os
 import re
+import sys
 from typing import Dict, Set, List, Optional, Tuple
 from collections import defaultdict
 import hashlib
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.core.referencia import dataframe
+
 class EnriquecedorScraping:
     def __init__(self):
         self.base_dir = r"c:\Users\Facun\OneDrive\Escritorio\PROYECTOS PERSONALES\PRECIOS"
@@ -33,17 +38,14 @@ class EnriquecedorScraping:
         # 1. Cargar CODIGOS.xlsx
         path_codigos = os.path.join(self.data_dir, "CODIGOS.xlsx")
         if os.path.exists(path_codigos):
-            xl_codigos = pd.ExcelFile(path_codigos)
-            
-            for sheet_name in xl_codigos.sheet_names:
-                df = pd.read_excel(path_codigos, sheet_name=sheet_name)
+            for sheet_name, df in dataframe(path_codigos, sheet_name=None).items():
                 self._procesar_hoja_codigos(df, sheet_name.lower())
                 print(f"✅ {sheet_name}: {len(df)} registros procesados")
         
         # 2. Cargar Listado Maestro
         path_maestro = os.path.join(self.data_dir, "Listado Maestro 09-03.xlsx")
         if os.path.exists(path_maestro):
-            df_maestro = pd.read_excel(path_maestro)
+            df_maestro = dataframe(path_maestro)
             self._procesar_listado_maestro(df_maestro)
             print(f"✅ Listado Maestro: {len(df_maestro)} registros procesados")
         
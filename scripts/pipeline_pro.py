@@ -16,6 +16,10 @@ import hashlib
 
 # Configuración
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BASE_DIR))
+
+from scripts.core.referencia import dataframe
+
 TARGETS_DIR = os.path.join(BASE_DIR, "..", "targets")
 DATA_DIR = os.path.join(BASE_DIR, "..", "BRUJULA-DE-PRECIOS", "data")
 RAW_DIR = os.path.join(BASE_DIR, "..", "data", "raw")
@@ -32,7 +36,7 @@ class PipelinePro:
     def cargar_listado_maestro(self):
         """Cargar el Listado Maestro"""
         try:
-            df = pd.read_excel(os.path.join(RAW_DIR, "Listado Maestro 09-03.xlsx"))
+            df = dataframe(os.path.join(RAW_DIR, "Listado Maestro 09-03.xlsx"))
             print(f"✅ Listado Maestro cargado: {len(df)} productos")
             return df
         except Exception as e:
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark de la normalización de nombres (clave_nombre / norm_nombre).
+Toma los nombres del Listado Maestro (todas las hojas) y de los últimos
+outputs de cada target, verifica que tokenizar() devuelva exactamente la
+misma clave que la implementación original paso a paso y reporta nombres/seg.
+
+Uso: python scripts/utils/benchmark_normalizacion.py [--repeticiones=5]
+"""
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+import openpyxl
+
+from scripts.core.normalizacion import clave_referencia, tokenizar
+from scripts.core.salida import leer_productos, listar_outputs
+from scripts.core.opciones import opcion
+
+MAESTRO_FILE = os.path.join(BASE_DIR, "data", "raw", "Listado Maestro 09-03.xlsx")
+OUTPUTS = [
+    ("targets/yaguar", "output_yaguar"),
+    ("targets/maxiconsumo", "output_maxiconsumo"),
+    ("targets/maxicarrefour", "output_maxicarrefour"),
+]
+
+
+def nombres_de_prueba():
+    """Textos del Maestro + nombres de los últimos outputs de cada target."""
+    nombres = []
+    wb = openpyxl.load_workbook(MAESTRO_FILE, read_only=True, data_only=True)
+    for ws in wb:
+        for row in ws.iter_rows(min_row=2, values_only=True):
+            nombres.extend(v for v in row if isinstance(v, str))
+    wb.close()
+    for directorio, prefijo in OUTPUTS:
+        for ruta in listar_outputs(os.path.join(BASE_DIR, directorio), prefijo, 1):
+            nombres.extend(str(p["nombre"]) for p in leer_productos(ruta) if p.get("nombre"))
+    return nombres
+
+
+def medir(funcion, nombres, repeticiones):
+    """Mejor de `repeticiones` pasadas, en nombres/seg."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t = time.perf_counter()
+        for n in nombres:
+            funcion(n)
+        mejor = min(mejor, time.perf_counter() - t)
+    return len(nombres) / mejor
+
+
+def main():
+    repeticiones = opcion("repeticiones", 5)
+    nombres = nombres_de_prueba()
+    print(f"{len(nombres)} nombres ({len(set(nombres))} distintos)")
+
+    ok = True
+    for extra, etiqueta in ((True, "clave_nombre"), (False, "norm_nombre")):
+        distintos = [n for n in nombres if tokenizar(n, extra).clave != clave_referencia(n, extra)]
+        if distintos:
+            ok = False
+            print(f"  [ERROR] {etiqueta}: {len(distintos)} claves distintas, ej. {distintos[0]!r}")
+        antes = medir(lambda n: clave_referencia(n, extra), nombres, repeticiones)
+        ahora = medir(lambda n: tokenizar(n, extra), nombres, repeticiones)
+        print(f"  {etiqueta:<13} original {antes:>10,.0f} nombres/s   tokenizar {ahora:>10,.0f} nombres/s   x{ahora / antes:.1f}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
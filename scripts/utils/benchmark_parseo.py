@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de los parsers de listado, sin tocar los sitios reales.
+Cada página se pide a una SesionReplay (HTML grabado) y se parsea con cada
+backend (bs4 y lxml). Reporta páginas/seg y productos/seg, y verifica que
+ambos backends devuelvan exactamente lo mismo.
+
+Uso: python scripts/utils/benchmark_parseo.py [--n=20] [--grabado=DIR] [--base=bench.json [--guardar-base]]
+  --grabado : directorio de SesionGrabadora con páginas reales extra
+  --base    : compara contra una corrida anterior y marca regresiones de velocidad
+
+Los HTML guardados de Yaguar son el login y la home, sin listado: dan 0
+productos con los dos backends. La paridad y el prod/s de Yaguar sólo se
+verifican con --grabado (un listado de categoría grabado con SesionGrabadora);
+sin eso el benchmark lo avisa al final.
+"""
+import os
+import sys
+import json
+import time
+from urllib.parse import urlparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+from scripts.core import parseo
+from scripts.core.replay import SesionReplay, INDICE
+from scripts.core.opciones import opcion
+from targets.yaguar.scraper_pro import parsear_listado, BASE_URL as YAGUAR_URL
+from targets.maxiconsumo.scraper_pro import parsear_pagina, BASE_URL as MAXICONSUMO_URL
+
+TARGETS = {
+    "yaguar": {
+        "fixtures": ["targets/yaguar/yaguar_tienda.html", "targets/yaguar/yaguar_home.html"],
+        "url": f"{YAGUAR_URL}/categoria-producto/almacen/",
+        "parsear": lambda html: parsear_listado(html, "Almacén")[0],
+        "comparar": lambda html: parsear_listado(html, "Almacén"),
+    },
+    "maxiconsumo": {
+        "fixtures": ["targets/maxiconsumo/debug_ean_search.html", "targets/maxiconsumo/debug_product_page.html"],
+        "url": f"{MAXICONSUMO_URL}/almacen.html",
+        "parsear": lambda html: parsear_pagina(html, "Almacen"),
+        "comparar": lambda html: parsear_pagina(html, "Almacen"),
+    },
+}
+TOLERANCIA = 0.8   # más lento que el 80% de la base = regresión
+
+
+def paginas_grabadas(directorio):
+    """(target, url) de un directorio grabado, según el host de cada URL."""
+    with open(os.path.join(directorio, INDICE), encoding="utf-8") as fh:
+        indice = json.load(fh)
+    hosts = {urlparse(cfg["url"]).netloc: t for t, cfg in TARGETS.items()}
+    return [(hosts[urlparse(url).netloc], url) for url in indice if urlparse(url).netloc in hosts]
+
+
+def medir(sesion, url, parsear, n):
+    """Pide y parsea la misma página n veces. Devuelve (pag/s, prod/s)."""
+    productos = 0
+    t = time.perf_counter()
+    for _ in range(n):
+        productos += len(parsear(sesion.get(url).text))
+    dt = time.perf_counter() - t
+    return n / dt, productos / dt
+
+
+def main():
+    n = int(opcion("n", 20))
+    ruta_base = opcion("base")
+    grabado = opcion("grabado")
+    if not parseo.LXML_DISPONIBLE:
+        print("[WARN] lxml no instalado: sólo se mide el backend bs4")
+
+    casos = []   # (target, nombre, sesion, url)
+    for target, cfg in TARGETS.items():
+        for ruta in cfg["fixtures"]:
+            casos.append((target, os.path.basename(ruta), SesionReplay({cfg["url"]: os.path.join(BASE_DIR, ruta)}), cfg["url"]))
+    if grabado:
+        sesion = SesionReplay.desde_directorio(grabado)
+        casos += [(target, urlparse(url).path.strip("/"), sesion, url) for target, url in paginas_grabadas(grabado)]
+
+    backends = [b for b in parseo.BACKENDS if b == "bs4" or parseo.LXML_DISPONIBLE]
+    base = {}
+    if ruta_base and os.path.exists(ruta_base):
+        with open(ruta_base, encoding="utf-8") as fh:
+            base = json.load(fh)
+
+    resultados = {}
+    con_productos = {target: 0 for target in TARGETS}
+    ok = True
+    print(f"{'target':<12} {'página':<28} {'backend':<6} {'pag/s':>8} {'prod/s':>10}  ")
+    for target, nombre, sesion, url in casos:
+        cfg = TARGETS[target]
+        salidas = []
+        for backend in backends:
+            parseo.usar_backend(backend)
+            salidas.append(cfg["comparar"](sesion.get(url).text))
+            pps, prods = medir(sesion, url, cfg["parsear"], n)
+            con_productos[target] += prods > 0
+            clave = f"{target}/{nombre}/{backend}"
+            resultados[clave] = pps
+            nota = ""
+            if clave in base and pps < base[clave] * TOLERANCIA:
+                nota = f"REGRESIÓN ({base[clave]:.1f} pag/s en la base)"
+                ok = False
+            print(f"{target:<12} {nombre[:28]:<28} {backend:<6} {pps:>8.1f} {prods:>10.1f}  {nota}")
+        if any(s != salidas[0] for s in salidas[1:]):
+            print(f"  [ERROR] {target}/{nombre}: los backends devuelven resultados distintos")
+            ok = False
+
+    for target, paginas in con_productos.items():
+        if not paginas:
+            print(f"  [AVISO] {target}: ninguna página con productos, paridad y prod/s sin verificar "
+                  f"(grabar un listado con SesionGrabadora y pasar --grabado=DIR)")
+
+    if ruta_base and "--guardar-base" in sys.argv:
+        with open(ruta_base, "w", encoding="utf-8") as fh:
+            json.dump(resultados, fh, indent=2)
+        print(f"\nBase guardada en: {ruta_base}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
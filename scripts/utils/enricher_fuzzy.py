@@ -1,9 +1,156 @@
 
+"""
+Enriquece output_maxiconsumo.json con EAN/Material/categoría de VITAL (560k)
+por similitud de nombre (WRatio >= 85).
+
+Uso: python scripts/utils/enricher_fuzzy.py [--lsh] [--bandas=16 --filas=4]
+     python scripts/utils/enricher_fuzzy.py --bulk [--workers=-1]
+     python scripts/utils/enricher_fuzzy.py --reporte-lsh [--muestra=300]
+
+  --lsh          cada producto se compara sólo contra los candidatos MinHash/LSH
+                 (palabras normalizadas) en vez de contra los 560k nombres
+  --bulk         agrupa productos y maestro en bloques (sector + unidad) y
+                 puntúa cada bloque entero con process.cdist en todos los núcleos
+  --reporte-lsh  no enriquece: compara, sobre una muestra, el match por fuerza
+                 bruta con el de LSH para varias bandas/filas (recall, candidatos
+                 y ms por producto) para elegir los parámetros
+"""
 import pandas as pd
 import json
 import os
+import sys
+import time
+import random
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
 from rapidfuzz import process, fuzz
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+from scripts.core.engine_precios import extraer_unidad
+from scripts.core.minhash import MinHash, IndiceLSH, umbral_lsh
+from scripts.core.normalizacion import tokenizar, palabras
+from scripts.core.opciones import opcion
+
+UMBRAL = 85
+PERMUTACIONES = 64
+CONFIGS_REPORTE = [(8, 8), (16, 4), (21, 3), (32, 2)]   # (bandas, filas)
+MAX_CELDAS = 25_000_000   # celdas float32 por llamada a cdist (~100 MB)
+
+
+def palabras_nombre(nombre):
+    tokens = tokenizar(nombre).tokens
+    return palabras(tokens) or set(tokens)
+
+
+def match_bruto(nombre, vital_names):
+    """(nombre_vital, score) del mejor WRatio contra todo el maestro."""
+    match = process.extractOne(nombre, vital_names, scorer=fuzz.WRatio)
+    return (match[0], match[1]) if match else (None, 0)
+
+
+def match_lsh(nombre, vital_names, minhash, lsh):
+    """(nombre_vital, score) del mejor WRatio entre los candidatos LSH, o (None, 0)."""
+    cands = lsh.candidatos(minhash.firma(palabras_nombre(nombre)))
+    if not len(cands):
+        return None, 0
+    match = process.extractOne(nombre, [vital_names[i] for i in cands.tolist()], scorer=fuzz.WRatio)
+    return (match[0], match[1]) if match else (None, 0)
+
+
+def _sector(s):
+    s = unicodedata.normalize("NFD", str(s or "").lower().strip())
+    return "".join(c for c in s if unicodedata.category(c) != "Mn")
+
+
+def bloque(sector, unidad, bloques):
+    """
+    Bloque de candidatos más específico que exista en el maestro:
+    (sector, unidad) > unidad > sector > todo el maestro.
+    """
+    con_unidad = unidad != "S/U"
+    for clave in ((sector, unidad) if sector and con_unidad else None,
+                  ("*", unidad) if con_unidad else None,
+                  (sector, "*") if sector else None):
+        if clave in bloques:
+            return clave
+    return ("*", "*")
+
+
+def match_bulk(nombres, sectores, vital_names, vital_sectores, workers=-1):
+    """
+    [(nombre_vital, score)] por producto: cada bloque de productos se puntúa
+    contra su bloque del maestro con una sola matriz cdist (score_cutoff=UMBRAL,
+    así que lo que no llega queda en 0) y se toma el máximo por fila.
+    """
+    unidades_v = [extraer_unidad(n) for n in vital_names]
+    sectores_v = [_sector(s) for s in vital_sectores]
+    bloques = defaultdict(list)
+    for i, (sec, uni) in enumerate(zip(sectores_v, unidades_v)):
+        bloques[(sec, uni)].append(i)
+        bloques[("*", uni)].append(i)
+        bloques[(sec, "*")].append(i)
+    bloques[("*", "*")] = list(range(len(vital_names)))
+
+    grupos = defaultdict(list)
+    for j, (nombre, sector) in enumerate(zip(nombres, sectores)):
+        grupos[bloque(_sector(sector), extraer_unidad(nombre), bloques)].append(j)
+    print(f"🧱 {len(grupos)} bloques (máx. {max(map(len, grupos.values()), default=0)} productos)")
+
+    resultado = [(None, 0)] * len(nombres)
+    for clave, filas in grupos.items():
+        columnas = bloques[clave]
+        elegidos = [vital_names[i] for i in columnas]
+        paso = max(1, MAX_CELDAS // len(columnas))
+        for ini in range(0, len(filas), paso):
+            lote = filas[ini:ini + paso]
+            scores = process.cdist([nombres[j] for j in lote], elegidos, scorer=fuzz.WRatio,
+                                   score_cutoff=UMBRAL, dtype=np.float32, workers=workers)
+            mejores = scores.argmax(axis=1)
+            for j, k, sc in zip(lote, mejores.tolist(), scores[np.arange(len(lote)), mejores].tolist()):
+                if sc >= UMBRAL:
+                    resultado[j] = (elegidos[k], sc)
+    return resultado
+
+
+def indexar(vital_names):
+    """MinHash + firmas de todos los nombres del maestro."""
+    t = time.perf_counter()
+    minhash = MinHash(PERMUTACIONES)
+    firmas = minhash.firmas(palabras_nombre(n) for n in vital_names)
+    print(f"🔢 Firmas MinHash de {len(vital_names)} nombres en {time.perf_counter() - t:.1f}s")
+    return minhash, firmas
+
+
+def reporte_lsh(productos, vital_names, muestra):
+    """Recall y latencia de LSH contra la fuerza bruta, para cada (bandas, filas)."""
+    nombres = [str(p['nombre']).upper().strip() for p in random.Random(0).sample(productos, min(muestra, len(productos)))]
+    t = time.perf_counter()
+    brutos = [match_bruto(n, vital_names) for n in nombres]
+    ms_bruto = (time.perf_counter() - t) * 1000 / len(nombres)
+    aceptados = [i for i, (_, score) in enumerate(brutos) if score >= UMBRAL]
+    print(f"\nFuerza bruta: {ms_bruto:.1f} ms/producto, {len(aceptados)}/{len(nombres)} matches >= {UMBRAL}")
+
+    minhash, firmas = indexar(vital_names)
+    print(f"{'bandas':>6} {'filas':>5} {'umbral':>6} {'recall':>7} {'candidatos':>10} {'ms/prod':>8} {'x':>6}")
+    for bandas, filas in CONFIGS_REPORTE:
+        lsh = IndiceLSH(firmas, bandas, filas)
+        t = time.perf_counter()
+        cands = 0
+        resultados = []
+        for n in nombres:
+            cands += len(lsh.candidatos(minhash.firma(palabras_nombre(n))))
+            resultados.append(match_lsh(n, vital_names, minhash, lsh))
+        ms = (time.perf_counter() - t) * 1000 / len(nombres)
+        # Recall: mismo score que la fuerza bruta (un empate con otro nombre también vale)
+        recall = sum(resultados[i][1] >= brutos[i][1] for i in aceptados) / len(aceptados) if aceptados else 0.0
+        print(f"{bandas:>6} {filas:>5} {umbral_lsh(bandas, filas):>6.2f} {recall:>7.1%} "
+              f"{cands / len(nombres):>10.0f} {ms:>8.2f} {ms_bruto / ms:>6.0f}")
+
+
 def enrich():
     print("⌛ Cargando Master de Vital (560k)...")
     path_vital = "VITAL-all-products-20250921.xlsx"
@@ -28,16 +175,28 @@ def enrich():
     with open(json_path, 'r', encoding='utf-8') as f:
         productos = json.load(f)
 
+    if "--reporte-lsh" in sys.argv:
+        reporte_lsh(productos, vital_names, opcion("muestra", 300))
+        return
+
+    nombres_maxi = [str(p['nombre']).upper().strip() for p in productos]
     print(f"🔎 Empezando matching de {len(productos)} productos...")
-    enriquecidos = 0
-    for i, p in enumerate(productos):
-        name_maxi = str(p['nombre']).upper().strip()
-        
+    if "--bulk" in sys.argv:
+        t = time.perf_counter()
+        matches = match_bulk(nombres_maxi, [p.get('sector', '') for p in productos],
+                             vital_names, df_vital['sector'].tolist(), opcion("workers", -1))
+        print(f"⚡ cdist por bloques: {time.perf_counter() - t:.1f}s")
+    elif "--lsh" in sys.argv:
+        minhash, firmas = indexar(vital_names)
+        lsh = IndiceLSH(firmas, opcion("bandas", 16), opcion("filas", 4))
+        matches = (match_lsh(n, vital_names, minhash, lsh) for n in nombres_maxi)
+    else:
         # Buscamos el mejor match (usamos WRatio que es flexible)
-        match = process.extractOne(name_maxi, vital_names, scorer=fuzz.WRatio)
-        
-        if match and match[1] >= 85: # Umbral de confianza
-            best_name = match[0]
+        matches = (match_bruto(n, vital_names) for n in nombres_maxi)
+
+    enriquecidos = 0
+    for i, (p, (best_name, score)) in enumerate(zip(productos, matches)):
+        if best_name and score >= UMBRAL: # Umbral de confianza
             meta = mapping[best_name]
             p['ean'] = str(meta['ean'])
             p['material'] = str(meta['Material'])
@@ -3,12 +3,19 @@
 """
 SCRAPER API REAL MAXICARREFOUR
 Basado en el análisis del JavaScript fetchFunctions.js
+
+Modo --lote: busca todos los EANs del Listado Maestro que falten en el último
+output_maxicarrefour*, clase A primero, con requests concurrentes sobre una
+AsyncSession (CrawlerAsync) y cada resultado escrito apenas llega.
+Uso: python scraper_api_real.py --lote [--limite=N] [--workers=8] [--rps=2.0] [--gzip]
 """
 
 import os
+import sys
 import json
 import re
 import time
+import asyncio
 import requests
 from datetime import datetime
 import pandas as pd
@@ -16,6 +23,24 @@ import pandas as pd
 # Configuración
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 RAW_DIR = os.path.join(BASE_DIR, "data", "raw")
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modo --lote: ~25k EANs a 2 req/s (hasta 8 si el sitio responde bien) entran en una noche
+RPS_LOTE = 2.0
+CONCURRENCIA_LOTE = 8
+PRIORIDAD_ABC = {"A": 0, "B": 1, "C": 2, "D": 3, "E": 4}   # Indicador ABC del Maestro; sin clase va al final
+REANUDAR_HORAS = 20   # búsquedas por API más nuevas que esto cuentan como ya hechas
+# Texto de la página de búsqueda cuando no hay productos: sólo eso cuenta como "sin resultado"
+MARCAS_SIN_RESULTADOS = ("no se encontraron productos", "no encontramos productos", "sin resultados")
+sys.path.append(BASE_DIR)
+
+from scripts.core.crawler import CrawlerAsync, Objetivo, Tarea
+from scripts.core.limitador import es_bloqueo, limitador_host
+from scripts.core.referencia import dataframe
+from scripts.core.salida import SalidaJsonl, leer_productos, listar_outputs, ruta_salida
+from scripts.core.opciones import opcion
+from config import MAXICARREFOUR_CONFIG
+
+RPS_INICIAL = MAXICARREFOUR_CONFIG["rps_inicial"]  # búsquedas/seg al arrancar (antes 2 s fijos); el limitador la adapta
 
 class MaxiCarrefourAPIScraper:
     def __init__(self):
@@ -47,6 +72,7 @@ class MaxiCarrefourAPIScraper:
         
         self.session.headers.update(self.headers)
         self.session.cookies.update(self.cookies)
+        self.limitador = limitador_host(self.base_url, RPS_INICIAL)
         
         # Cargar Listado Maestro
         self.listado_maestro = self.cargar_listado_maestro()
@@ -55,7 +81,7 @@ class MaxiCarrefourAPIScraper:
         """Cargar el Listado Maestro"""
         try:
             maestro_file = os.path.join(RAW_DIR, "Listado Maestro 09-03.xlsx")
-            df = pd.read_excel(maestro_file)
+            df = dataframe(maestro_file)
             print(f"📋 Listado Maestro cargado: {len(df)} productos")
             return df
         except Exception as e:
@@ -73,73 +99,106 @@ class MaxiCarrefourAPIScraper:
         except:
             return 0.0
     
+    def params_busqueda(self, ean):
+        """Query string de la API de búsqueda (basada en fetchFunctions.js)"""
+        return {
+            'currentUrl': f'search/{ean}',
+            'filters': '',
+            'orderBy': 'default',
+            'currentPage': 1,
+            'itemsPerPage': 12,
+            'method': 'productsList'
+        }
+    
+    def producto_json(self, item, ean):
+        """Producto de la respuesta JSON (búsqueda VTEX) con las mismas claves que el del HTML"""
+        if 'precio' in item:
+            return item
+        sku = (item.get('items') or [{}])[0]
+        oferta = (sku.get('sellers') or [{}])[0].get('commertialOffer') or {}
+        imagen = (sku.get('images') or [{}])[0].get('imageUrl', '')
+        return {
+            'nombre': item.get('productName', ''),
+            'precio': self.limpiar_precio(oferta.get('Price')),
+            'sku': sku.get('ean') or ean,
+            'ean_buscado': ean,
+            'imagen': imagen,
+            'sector': 'Por determinar',
+            'subcategoria': 'Por determinar',
+            'fuente': 'MaxiCarrefour-API',
+            'stock': bool(oferta.get('AvailableQuantity', 1)),
+        }
+
+    def parsear_respuesta_api(self, texto, ean):
+        """Parsear la respuesta de la API: JSON si se puede, sino HTML. Sólo productos con precio."""
+        try:
+            data = json.loads(texto)
+        except Exception:
+            data = None
+        if data is not None:
+            if isinstance(data, dict):
+                data = data.get('products', data.get('productos'))
+            if not isinstance(data, list):
+                print(f"    ⚠️ Respuesta JSON sin lista de productos")
+                return []
+            productos = [self.producto_json(p, ean) for p in data if isinstance(p, dict)]
+            productos = [p for p in productos if p.get('precio')]
+            print(f"    ✅ Respuesta JSON con {len(data)} elementos, {len(productos)} con precio")
+            return productos
+        
+        # Parsear como HTML
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(texto, 'html.parser')
+        
+        # Buscar productos usando selectores del HTML
+        items = soup.find_all('div', class_='item_card') or soup.find_all('[class*="product"]') or soup.find_all('[class*="shelf-item"]')
+        
+        print(f"    ✅ HTML con {len(items)} productos")
+        
+        productos = []
+        for item in items:
+            try:
+                nombre_elem = item.find('h2') or item.find('h3') or item.find('[class*="name"]') or item.find('[class*="title"]')
+                precio_elem = item.find('span', class_=re.compile(r'price|Price')) or item.find('[class*="price"]')
+                sku_elem = item.find('[class*="sku"]') or item.find('[class*="ean"]')
+                imagen_elem = item.find('img')
+                
+                if nombre_elem:
+                    nombre = nombre_elem.get_text().strip()
+                    precio = self.limpiar_precio(precio_elem.get_text()) if precio_elem else 0.0
+                    sku = sku_elem.get_text().strip() if sku_elem else ean
+                    imagen = imagen_elem.get('src', '') if imagen_elem else ''
+                    
+                    if precio > 0:
+                        productos.append({
+                            'nombre': nombre,
+                            'precio': precio,
+                            'sku': sku,
+                            'ean_buscado': ean,
+                            'imagen': imagen,
+                            'sector': 'Por determinar',
+                            'subcategoria': 'Por determinar',
+                            'fuente': 'MaxiCarrefour-API',
+                            'stock': True
+                        })
+            except Exception as e:
+                continue
+        
+        return productos
+    
     def buscar_por_ean_api(self, ean):
         """Buscar producto por EAN usando la API real"""
         try:
-            # URL de la API real basada en fetchFunctions.js
-            params = {
-                'currentUrl': f'search/{ean}',
-                'filters': '',
-                'orderBy': 'default',
-                'currentPage': 1,
-                'itemsPerPage': 12,
-                'method': 'productsList'
-            }
-            
             print(f"  🔍 Buscando EAN {ean} via API...")
             
-            response = self.session.get(self.api_url, params=params, timeout=30)
+            response = self.limitador.pedir(self.session.get, self.api_url, params=self.params_busqueda(ean), timeout=30)
             
             print(f"    Status: {response.status_code}")
             print(f"    Content-Type: {response.headers.get('content-type', 'N/A')}")
             print(f"    Content-Length: {len(response.text)}")
             
             if response.status_code == 200:
-                # Intentar parsear como JSON
-                try:
-                    data = response.json()
-                    print(f"    ✅ Respuesta JSON con {len(data)} elementos")
-                    return data
-                except:
-                    # Parsear como HTML
-                    from bs4 import BeautifulSoup
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Buscar productos usando selectores del HTML
-                    items = soup.find_all('div', class_='item_card') or soup.find_all('[class*="product"]') or soup.find_all('[class*="shelf-item"]')
-                    
-                    print(f"    ✅ HTML con {len(items)} productos")
-                    
-                    productos = []
-                    for item in items:
-                        try:
-                            nombre_elem = item.find('h2') or item.find('h3') or item.find('[class*="name"]') or item.find('[class*="title"]')
-                            precio_elem = item.find('span', class_=re.compile(r'price|Price')) or item.find('[class*="price"]')
-                            sku_elem = item.find('[class*="sku"]') or item.find('[class*="ean"]')
-                            imagen_elem = item.find('img')
-                            
-                            if nombre_elem:
-                                nombre = nombre_elem.get_text().strip()
-                                precio = self.limpiar_precio(precio_elem.get_text()) if precio_elem else 0.0
-                                sku = sku_elem.get_text().strip() if sku_elem else ean
-                                imagen = imagen_elem.get('src', '') if imagen_elem else ''
-                                
-                                if precio > 0:
-                                    productos.append({
-                                        'nombre': nombre,
-                                        'precio': precio,
-                                        'sku': sku,
-                                        'ean_buscado': ean,
-                                        'imagen': imagen,
-                                        'sector': 'Por determinar',
-                                        'subcategoria': 'Por determinar',
-                                        'fuente': 'MaxiCarrefour-API',
-                                        'stock': True
-                                    })
-                        except Exception as e:
-                            continue
-                    
-                    return productos
+                return self.parsear_respuesta_api(response.text, ean)
             else:
                 print(f"    ❌ Error HTTP {response.status_code}")
                 return []
@@ -172,8 +231,9 @@ class MaxiCarrefourAPIScraper:
         
         return resultado
     
-    def scraear_desde_listado_maestro_api(self, limite=50):
-        """Scraear productos usando API y EANs del Listado Maestro"""
+    def scraear_desde_listado_maestro_api(self, limite=50, salida=None):
+        """Scraear productos usando API y EANs del Listado Maestro.
+        Con `salida` (SalidaJsonl) cada resultado se escribe apenas se encuentra."""
         print(f"📋 Scrapeando desde Listado Maestro usando API (límite: {limite})...")
         
         productos = []
@@ -204,22 +264,197 @@ class MaxiCarrefourAPIScraper:
                             p['nombre_maestro'] = nombre_maestro
                         
                         productos.extend(resultado)
+                        if salida:
+                            salida.escribir(resultado)
                         print(f"    ✅ Encontrados: {len(resultado)} productos")
                     else:
                         print(f"    ❌ No encontrado: {ean}")
                 
-                # Delay entre búsquedas para no ser bloqueado
-                time.sleep(2)
-                
             except Exception as e:
                 print(f"    ❌ Error procesando fila {idx}: {e}")
                 continue
         
         print(f"📦 Se encontraron {len(productos)} productos de {limite} buscados")
+        print(f"   Limitador: {self.limitador.metricas()}")
         return productos
 
+
+def busqueda_vacia(texto):
+    """
+    True si la respuesta es una búsqueda que el sitio contestó sin productos
+    (JSON con lista vacía o la página de "no se encontraron"). Una página de
+    login, un desafío o precios en 0 por cookies vencidas no lo son.
+    """
+    try:
+        data = json.loads(texto)
+    except ValueError:
+        return any(m in texto[:20000].lower() for m in MARCAS_SIN_RESULTADOS)
+    if isinstance(data, dict):
+        data = data.get('products', data.get('productos'))
+    return data == []
+
+
+def eans_cubiertos(directorio=SCRIPT_DIR, reanudar_horas=REANUDAR_HORAS):
+    """
+    EANs que no hace falta volver a buscar: los que tienen precio en el último
+    output_maxicarrefour* y los buscados por API en las últimas
+    `reanudar_horas`, con precio o sin resultado (sin_resultado_api_*), así
+    una corrida --lote cortada retoma donde quedó.
+    """
+    archivos = listar_outputs(directorio, "output_maxicarrefour", 1)
+    desde = time.time() - reanudar_horas * 3600
+    archivos += [f for f in listar_outputs(directorio, "output_api_maxicarrefour_") if os.path.getmtime(f) >= desde]
+    cubiertos = set()
+    for ruta in archivos:
+        for p in leer_productos(ruta):
+            if p.get('precio'):
+                cubiertos.add(str(p.get('ean_buscado') or p.get('sku', '')).strip())
+    for ruta in listar_outputs(directorio, "sin_resultado_api_maxicarrefour_"):
+        if os.path.getmtime(ruta) >= desde:
+            cubiertos.update(str(p.get('ean_buscado', '')).strip() for p in leer_productos(ruta))
+    cubiertos.discard('')
+    return cubiertos
+
+
+def eans_a_buscar(listado_maestro, omitir=(), limite=None):
+    """
+    Filas del Maestro a buscar por API: EAN válido, sin repetir y fuera de
+    `omitir`, ordenadas por Indicador ABC (A primero, orden del Maestro dentro
+    de cada clase). Devuelve [(idx, datos)] con a lo sumo `limite` elementos.
+    """
+    vistos = set(omitir)
+    filas = []
+    for idx, row in listado_maestro.iterrows():
+        ean = str(row['Código EAN']).strip()
+        if len(ean) < 10 or ean in vistos:
+            continue
+        vistos.add(ean)
+        filas.append((PRIORIDAD_ABC.get(str(row.get('Indicador ABC', '')).strip().upper(), 5), idx, {
+            'ean': ean,
+            'sector': str(row['SECTOR']).strip(),
+            'subcategoria': str(row.get('CATEGORIAS', '')),
+            'nombre_maestro': str(row['Texto breve material']).strip(),
+        }))
+    filas.sort(key=lambda f: f[0])
+    return [(idx, datos) for _, idx, datos in filas[:limite]]
+
+
+class ObjetivoMaxiCarrefour(Objetivo):
+    """
+    Búsqueda por EAN del Listado Maestro contra la API de MaxiCarrefour.
+      omitir : EANs que no hace falta buscar (ej. eans_cubiertos())
+      salida : SalidaJsonl donde cada resultado se escribe apenas se parsea
+      sin_resultado : SalidaJsonl opcional con los EANs cuya búsqueda volvió
+                      confirmada sin resultados (busqueda_vacia). Un error HTTP,
+                      un bloqueo o una respuesta con productos sin precio cuenta
+                      como error: el EAN se vuelve a buscar en la próxima corrida
+    """
+
+    nombre = "maxicarrefour"
+    rps = RPS_INICIAL
+    concurrencia = 2
+
+    def __init__(self, scraper=None, limite=50, omitir=(), salida=None, sin_resultado=None):
+        self.scraper = scraper or MaxiCarrefourAPIScraper()
+        self.headers = self.scraper.headers
+        self.limite = limite
+        self.omitir = omitir
+        self.salida = salida
+        self.sin_resultado = sin_resultado
+        self.buscados = 0
+        self.encontrados = 0
+        self._tareas = None
+
+    def preparar(self):
+        return dict(self.scraper.cookies)
+
+    def tareas_iniciales(self):
+        # Se arman una vez (recorrer el Maestro es lo caro); buscar_en_lote las cuenta antes de correr
+        if self._tareas is None:
+            self._tareas = [
+                Tarea(self.scraper.api_url, clave=(idx,), params=self.scraper.params_busqueda(datos['ean']), datos=datos)
+                for idx, datos in eans_a_buscar(self.scraper.listado_maestro, self.omitir, self.limite)
+            ]
+        return self._tareas
+
+    def parsear(self, tarea, r):
+        self.buscados += 1
+        if r.status_code != 200 or es_bloqueo(r) or "login" in str(r.url):
+            raise Exception(f"status {r.status_code}, bloqueo o login (EAN {tarea.datos['ean']})")
+        productos = self.scraper.parsear_respuesta_api(r.text, tarea.datos['ean'])
+        if not productos and not busqueda_vacia(r.text):
+            raise Exception(f"respuesta sin productos con precio ni 'sin resultados' (EAN {tarea.datos['ean']})")
+        # Asignar sector y subcategoría del maestro
+        for p in productos:
+            p['sector'] = tarea.datos['sector']
+            p['subcategoria'] = tarea.datos['subcategoria']
+            p['nombre_maestro'] = tarea.datos['nombre_maestro']
+        if productos:
+            self.encontrados += 1
+        if self.salida:
+            self.salida.escribir(productos)
+        if self.sin_resultado is not None and not productos:
+            self.sin_resultado.escribir([{'ean_buscado': tarea.datos['ean']}])
+        if self.buscados % 100 == 0:
+            print(f"  📦 {self.buscados} EANs buscados, {self.encontrados} encontrados")
+        return productos, []
+
+    def guardar(self, productos):
+        return guardar_productos(productos)
+
+
+def abrir_salida(comprimir=False, prefijo="output_api_maxicarrefour_"):
+    """Output JSONL con timestamp de esta corrida (.jsonl.gz si comprimir)."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return SalidaJsonl(ruta_salida(os.path.dirname(os.path.abspath(__file__)), f"{prefijo}{timestamp}", comprimir))
+
+
+def guardar_productos(productos):
+    """Escribe el output de una sola vez y devuelve la ruta."""
+    with abrir_salida() as salida:
+        salida.escribir(productos)
+    return salida.ruta
+
+
+def buscar_en_lote(scraper, limite=None, workers=CONCURRENCIA_LOTE, rps=RPS_LOTE, comprimir=False):
+    """
+    Busca por API los EANs del Maestro que todavía no tienen precio, en
+    paralelo y por prioridad ABC. Los resultados quedan en disco a medida que
+    llegan, así que cortar la corrida (Ctrl+C) no pierde nada. Devuelve la ruta.
+    """
+    cubiertos = eans_cubiertos()
+    print(f"📋 EANs ya cubiertos por el último output: {len(cubiertos)}")
+    with abrir_salida(comprimir) as salida, abrir_salida(prefijo="sin_resultado_api_maxicarrefour_") as sin_resultado:
+        objetivo = ObjetivoMaxiCarrefour(scraper, limite=limite, omitir=cubiertos, salida=salida,
+                                         sin_resultado=sin_resultado)
+        objetivo.concurrencia = workers
+        objetivo.rps = rps
+        pendientes = len(objetivo.tareas_iniciales())
+        # rps=0 es "sin límite": no hay estimación de duración
+        tasa = f"{rps} req/s iniciales, ~{pendientes / rps / 3600:.1f} h como máximo" if rps else "sin límite de req/s"
+        print(f"🔍 EANs a buscar: {pendientes} ({workers} en paralelo, {tasa})")
+        crawler = CrawlerAsync([objetivo])
+        try:
+            asyncio.run(crawler.correr())
+        except KeyboardInterrupt:
+            print("\nCancelado: lo encontrado hasta ahora ya está guardado")
+    if not sin_resultado.total:
+        sin_resultado.descartar()
+    for host, m in crawler.metricas().items():
+        print(f"   Limitador {host}: {m}")
+    print(f"📦 {objetivo.encontrados}/{objetivo.buscados} EANs encontrados, {salida.total} productos, "
+          f"{sin_resultado.total} sin resultado ({crawler.errores[objetivo.nombre]} errores)")
+    print(f"💾 Resultados guardados: {salida.ruta}")
+    return salida.ruta
+
+
 if __name__ == "__main__":
     scraper = MaxiCarrefourAPIScraper()
+
+    if "--lote" in sys.argv:
+        buscar_en_lote(scraper, limite=opcion("limite", 0) or None, workers=opcion("workers", CONCURRENCIA_LOTE),
+                       rps=opcion("rps", RPS_LOTE), comprimir="--gzip" in sys.argv)
+        sys.exit(0)
     
     # Probar API primero
     resultado_prueba = scraper.probar_api_con_ean_conocido()
@@ -231,18 +466,12 @@ if __name__ == "__main__":
         
         # Probar con 50 productos de Bebidas
         productos_bebidas = scraper.listado_maestro[scraper.listado_maestro['SECTOR'] == 'Bebidas'].head(50)
-        productos_encontrados = scraper.scraear_desde_listado_maestro_api(limite=len(productos_bebidas))
+        # Los resultados se van guardando a medida que aparecen
+        with abrir_salida(comprimir="--gzip" in sys.argv) as salida:
+            productos_encontrados = scraper.scraear_desde_listado_maestro_api(limite=len(productos_bebidas), salida=salida)
         
         print(f"\n📊 RESULTADO FINAL:")
         print(f"  📦 Total productos encontrados: {len(productos_encontrados)}")
-        
-        # Guardar resultados
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = os.path.join(os.path.dirname(__file__), f"output_api_maxicarrefour_{timestamp}.json")
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(productos_encontrados, f, ensure_ascii=False, indent=2)
-        
-        print(f"  💾 Resultados guardados: {output_file}")
+        print(f"  💾 Resultados guardados: {salida.ruta}")
     else:
         print("\n❌ API NO FUNCIONA - REVISAR CONFIGURACIÓN")
@@ -6,17 +6,25 @@ Estrategia: paginar categorias top-level en /sucursal_burzaco/{categoria}.html
 """
 
 import os
-import json
 import re
-import time
 import sys
 from datetime import datetime
 from curl_cffi import requests as curl_requests
 from bs4 import BeautifulSoup
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+from scripts.core import parseo
+from scripts.core.bitacora import BitacoraCrawl
+from scripts.core.cache_http import SesionCacheada, cache_target, parsear_respuesta
+from scripts.core.delta import EstadoDelta, huella_pagina
+from scripts.core.crawler import Objetivo, Tarea
+from scripts.core.limitador import limitador_host
+from scripts.core.salida import SalidaJsonl, ruta_salida
+
 BASE_URL = "https://maxiconsumo.com/sucursal_burzaco"
-DELAY = 0.4
+RPS_INICIAL = 2.5   # antes 0.4 s fijos entre páginas; el limitador adaptativo la ajusta
 MIN_PRODUCTS_EXPECTED = 500
 IMPERSONATE = "safari15_3"
 
@@ -57,6 +65,13 @@ def limpiar_precio(texto):
 
 
 def parsear_pagina(html, sector):
+    """Productos de una página de categoría, con el backend de parseo activo."""
+    if parseo.BACKEND == "lxml":
+        return _parsear_pagina_lxml(html, sector)
+    return _parsear_pagina_bs4(html, sector)
+
+
+def _parsear_pagina_bs4(html, sector):
     soup = BeautifulSoup(html, "html.parser")
     items = soup.find_all("li", class_="item product product-item")
     productos = []
@@ -76,101 +91,253 @@ def parsear_pagina(html, sector):
             img = item.find("img", class_="product-image-photo")
             imagen = img.get("src", "") if img else ""
 
-            productos.append({
-                "nombre": nombre,
-                "precio": precio,
-                "sku": sku,
-                "ean": "",
-                "imagen": imagen,
-                "link": link,
-                "sector": sector,
-                "subcategoria": "",
-                "fuente": "Maxiconsumo",
-                "stock": True,
-                "fecha_scraping": datetime.now().strftime("%Y-%m-%d"),
-            })
+            productos.append(_producto(nombre, precio, sku, imagen, link, sector))
+        except Exception:
+            continue
+    return productos
+
+
+# Mismos selectores que _parsear_pagina_bs4, compilados una vez
+_XP = parseo.compilar(
+    items='//li[normalize-space(@class)="item product product-item"]',
+    enlace=f".//a[{parseo.clase('product-item-link')}]",
+    precio=f".//span[{parseo.clase('price')}]",
+    img=f".//img[{parseo.clase('product-image-photo')}]",
+)
+
+
+def _parsear_pagina_lxml(html, sector):
+    doc = parseo.documento(html)
+    if doc is None:
+        return []
+    productos = []
+    for item in _XP.items(doc):
+        try:
+            enlace = parseo.primero(_XP.enlace, item)
+            if enlace is None:
+                continue
+            nombre = parseo.texto(enlace)
+            link = enlace.get("href", "")
+            sku_m = re.search(r"-(\d+)(?:\.html)?$", link)
+            sku = sku_m.group(1) if sku_m else ""
+
+            precio_span = parseo.primero(_XP.precio, item)
+            precio = limpiar_precio(parseo.texto(precio_span)) if precio_span is not None else 0.0
+
+            img = parseo.primero(_XP.img, item)
+            imagen = img.get("src", "") if img is not None else ""
+
+            productos.append(_producto(nombre, precio, sku, imagen, link, sector))
         except Exception:
             continue
     return productos
 
 
-def scrape_categoria(session, nombre_display, slug, idx, total):
+def _producto(nombre, precio, sku, imagen, link, sector):
+    return {
+        "nombre": nombre,
+        "precio": precio,
+        "sku": sku,
+        "ean": "",
+        "imagen": imagen,
+        "link": link,
+        "sector": sector,
+        "subcategoria": "",
+        "fuente": "Maxiconsumo",
+        "stock": True,
+        "fecha_scraping": datetime.now().strftime("%Y-%m-%d"),
+    }
+
+
+def clave_producto(p):
+    return p["sku"] or p["nombre"]
+
+
+def scrape_categoria(session, nombre_display, slug, idx, total, bitacora=None, salida=None, estado=None):
+    """Pagina la categoría hasta que una página no aporte productos nuevos.
+    Con `bitacora`, las páginas ya completadas hoy se releen de ahí sin pedirlas.
+    Con `salida`, los productos nuevos de cada página se escriben en el momento.
+    Con `estado` en modo delta, si la página 1 no cambió se omite la categoría."""
     print(f"\n[{idx}/{total}] Sector: {nombre_display}")
     url_base = f"{BASE_URL}/{slug}.html"
 
     sector_prods = {}
     pagina = 1
+    huella = None
+    completa = False
+    limitador = limitador_host(BASE_URL, RPS_INICIAL)
 
     while True:
         url = url_base if pagina == 1 else f"{url_base}?p={pagina}"
         try:
-            r = session.get(url, impersonate=IMPERSONATE, headers=HEADERS, timeout=25)
-            if r.status_code != 200:
-                print(f"  [WARN] Pag {pagina}: status {r.status_code}")
-                break
+            if not (bitacora and bitacora.completada(slug, pagina)):
+                r = limitador.pedir(session.get, url, impersonate=IMPERSONATE, headers=HEADERS, timeout=25)
+                if r.status_code != 200:
+                    print(f"  [WARN] Pag {pagina}: status {r.status_code}")
+                    completa = False
+                    break
+                prods = parsear_respuesta(r, parsear_pagina, nombre_display)
+                if bitacora and prods:   # una página vacía (fin, bloqueo o challenge) se vuelve a pedir
+                    bitacora.registrar(slug, pagina, prods)
+            else:
+                prods = bitacora.productos(slug, pagina)
 
-            prods = parsear_pagina(r.text, nombre_display)
             if not prods:
+                completa = True
                 break
 
-            nuevos = 0
+            if pagina == 1:
+                huella = huella_pagina(prods)
+                if estado and estado.sin_cambios(slug, huella):
+                    print(f"  {nombre_display}: sin cambios, se omite ({estado.productos_previos(slug)} productos la última vez)")
+                    return {}
+
+            nuevos = []
             for p in prods:
-                key = p["sku"] or p["nombre"]
+                key = clave_producto(p)
                 if key not in sector_prods:
                     sector_prods[key] = p
-                    nuevos += 1
+                    nuevos.append(p)
+            if salida:
+                salida.escribir(nuevos)
 
             if pagina % 5 == 0:
                 print(f"  Pag {pagina}: {len(sector_prods)} unicos acumulados")
 
-            if nuevos == 0:
+            if not nuevos:
+                completa = True
                 break
 
             pagina += 1
-            time.sleep(DELAY)
 
         except Exception as e:
             print(f"  [ERROR] Pag {pagina}: {e}")
             break
 
     print(f"  {nombre_display}: {len(sector_prods)} productos totales")
+    if estado and completa and huella:
+        estado.registrar(slug, huella, len(sector_prods))
     return sector_prods
 
 
+class ObjetivoMaxiconsumo(Objetivo):
+    """Categorías de Maxiconsumo: cada página encola la siguiente mientras aparezcan productos nuevos."""
+
+    nombre = "maxiconsumo"
+    rps = RPS_INICIAL
+    concurrencia = len(CATEGORIAS)
+    impersonate = IMPERSONATE
+    headers = HEADERS
+
+    def __init__(self):
+        self._vistos = {}   # slug -> claves ya vistas (sku o nombre)
+
+    def tareas_iniciales(self):
+        return [
+            Tarea(f"{BASE_URL}/{slug}.html", clave=(i, 1), datos={"sector": nombre, "slug": slug, "pagina": 1})
+            for i, (nombre, slug) in enumerate(CATEGORIAS)
+        ]
+
+    def parsear(self, tarea, r):
+        if r.status_code != 200:
+            raise Exception(f"status {r.status_code}")
+        vistos = self._vistos.setdefault(tarea.datos["slug"], set())
+        nuevos = []
+        for p in parsear_pagina(r.text, tarea.datos["sector"]):
+            key = clave_producto(p)
+            if key not in vistos:
+                vistos.add(key)
+                nuevos.append(p)
+        if not nuevos:
+            return [], []
+        pagina = tarea.datos["pagina"] + 1
+        siguiente = Tarea(f"{BASE_URL}/{tarea.datos['slug']}.html?p={pagina}", clave=(tarea.clave[0], pagina),
+                          datos={**tarea.datos, "pagina": pagina})
+        return nuevos, [siguiente]
+
+    def consolidar(self, resultados):
+        todos = {}
+        for p in super().consolidar(resultados):
+            todos.setdefault(clave_producto(p), p)
+        return list(todos.values())
+
+    def guardar(self, productos):
+        return guardar_productos(productos)
+
+
+def abrir_salida(comprimir=False, delta=False, columnar=False):
+    """Output JSONL con timestamp, deduplicado por SKU (o nombre) entre categorías.
+    En modo delta es delta_maxiconsumo_<ts>: sólo las categorías re-scrapeadas.
+    Con columnar, al cerrar se escribe también la versión columnar (--columnar)."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    prefijo = "delta_maxiconsumo" if delta else "output_maxiconsumo"
+    ruta = ruta_salida(os.path.dirname(os.path.abspath(__file__)), f"{prefijo}_{timestamp}", comprimir)
+    return SalidaJsonl(ruta, clave=clave_producto, columnar=columnar)
+
+
+def guardar_productos(productos):
+    """Escribe el output de una sola vez y devuelve la ruta."""
+    with abrir_salida() as salida:
+        salida.escribir(productos)
+    return salida.ruta
+
+
 def main():
     print("INICIO: Scraper Maxiconsumo PRO")
     print(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Categorias: {len(CATEGORIAS)}")
+    # --bs4 fuerza el parser original en Python puro
+    if "--bs4" in sys.argv:
+        parseo.usar_backend("bs4")
+    print(f"Parser HTML: {parseo.BACKEND}")
     print("=" * 50)
 
     session = curl_requests.Session()
     session.headers.update(HEADERS)
-
-    todos = {}
-
+    # Cache HTTP en disco: revalida con ETag/Last-Modified y no reparsea páginas idénticas
+    cache = None
+    if "--sin-cache" not in sys.argv:
+        cache = cache_target("maxiconsumo")
+        session = SesionCacheada(session, cache)
+
+    # Checkpoints del día: --reiniciar descarta lo ya scrapeado hoy
+    bitacora = BitacoraCrawl(os.path.dirname(os.path.abspath(__file__)), "maxiconsumo",
+                             reiniciar="--reiniciar" in sys.argv)
+
+    # --delta: sólo las categorías cuya página 1 cambió (o con refresco completo vencido)
+    modo_delta = "--delta" in sys.argv
+    estado = EstadoDelta(os.path.dirname(os.path.abspath(__file__)), "maxiconsumo", activo=modo_delta)
+
+    # Output en streaming: cada página se agrega al .jsonl apenas se parsea
+    salida = abrir_salida(comprimir="--gzip" in sys.argv, delta=modo_delta, columnar="--columnar" in sys.argv)
     for idx, (nombre, slug) in enumerate(CATEGORIAS, start=1):
-        prods = scrape_categoria(session, nombre, slug, idx, len(CATEGORIAS))
-        for key, prod in prods.items():
-            if key not in todos:
-                todos[key] = prod
-
-    productos_lista = list(todos.values())
-
-    if len(productos_lista) < MIN_PRODUCTS_EXPECTED:
-        print(f"ERROR: Productos insuficientes: {len(productos_lista)} < {MIN_PRODUCTS_EXPECTED}")
+        scrape_categoria(session, nombre, slug, idx, len(CATEGORIAS), bitacora=bitacora, salida=salida, estado=estado)
+    bitacora.cerrar()
+    salida.cerrar()
+
+    if modo_delta:
+        print(f"\nCategorias sin cambios omitidas: {len(estado.omitidas)}/{len(CATEGORIAS)}")
+        if not salida.total:
+            salida.descartar()
+            estado.guardar()
+            print("Nada cambio: no se genera delta")
+            return None
+    elif salida.total < MIN_PRODUCTS_EXPECTED:
+        print(f"ERROR: Productos insuficientes: {salida.total} < {MIN_PRODUCTS_EXPECTED}")
+        # No dejar un output parcial que el catálogo tome como el más reciente, ni
+        # marcar sus categorías como scrapeadas para el próximo --delta
+        salida.descartar()
         sys.exit(1)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(os.path.dirname(__file__), f"output_maxiconsumo_{timestamp}.json")
-
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(productos_lista, f, ensure_ascii=False, indent=2)
+    # El estado delta sólo se guarda con el output aceptado
+    estado.guardar()
 
     print("\n" + "=" * 50)
-    print(f"Scraping completo -- {len(productos_lista)} productos unicos")
-    print(f"Guardado en: {output_file}")
+    print(f"Scraping completo -- {salida.total} productos unicos")
+    print(f"Guardado en: {salida.ruta}")
+    if cache:
+        print(f"Cache HTTP: {cache.aciertos} paginas sin cambios, {cache.descargas} nuevas")
 
-    return productos_lista
+    return salida.ruta
 
 
 if __name__ == "__main__":
@@ -4,16 +4,34 @@ import re
 import requests
 import time
 import sys
+import queue
+import threading
 import pandas as pd
+from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 from curl_cffi import requests as curl_requests
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+from scripts.core.bitacora import BitacoraCrawl, bitacoras
+from scripts.core.cache_http import SesionCacheada, cache_target, parsear_respuesta
+from scripts.core.limitador import es_bloqueo
+from scripts.core.opciones import opcion
+
 # --- CONFIGURACIÓN ---
 URL_BASE_SITE = "https://maxiconsumo.com"
 SUCURSAL = "sucursal_burzaco" # Podés cambiar a sucursal_moreno si preferís
 EXCEL_PATH = "data/raw/Listado Maestro 09-03.xlsx"
 OUTPUT_FILE = "output_maxiconsumo.json"
 DELAY = 1.0  # Un poco más lento para ser indetectable con cookies reales
+WORKERS = 5   # --workers=N en modo --maestro
+# Un barrido --maestro (~25k EANs) puede pasar la medianoche: su bitácora se identifica
+# por el inicio y una corrida nueva retoma el último si no terminó y empezó hace < BARRIDO_DIAS
+BITACORA_MAESTRO = "maxiconsumo_maestro"
+FORMATO_BARRIDO = "%Y%m%d_%H%M%S"
+BARRIDO_DIAS = 3
+HTTP = curl_requests  # main() lo envuelve con el cache HTTP salvo --sin-cache
 
 # PEGAR ACÁ TU COOKIE (La parseamos automáticamente)
 RAW_COOKIE = 'mage-banners-cache-storage=%7B%7D; customer_type=categorizado; form_key=TyKFVmlygVALWiHB; mage-cache-storage=%7B%7D; mage-cache-storage-section-invalidation=%7B%7D; mage-messages=; recently_viewed_product=%7B%7D; recently_viewed_product_previous=%7B%7D; recently_compared_product=%7B%7D; recently_viewed_product_previous=%7B%7D; product_data_storage=%7B%7D; private_content_version=c2af6ad8f19036f7db55f1a63f528168; form_key=TyKFVmlygVALWiHB; mage-cache-sessid=true; section_data_ids=%7B%22customer%22%3A1774473269%2C%22compare-products%22%3A1774473269%2C%22last-ordered-items%22%3A1774473269%2C%22cart%22%3A1774473269%2C%22directory-data%22%3A1774473269%2C%22captcha%22%3A1774473269%2C%22wishlist%22%3A1774473269%2C%22instant-purchase%22%3A1774473269%2C%22loggedAsCustomer%22%3A1774473269%2C%22multiplewishlist%22%3A1774473269%2C%22persistent%22%3A1774473269%2C%22review%22%3A1774473269%2C%22recently_viewed_product%22%3A1774473269%2C%22recently_compared_product%22%3A1774473269%2C%22product_data_storage%22%3A1774473269%2C%22paypal-billing-agreement%22%3A1774473269%7D'
@@ -46,52 +64,122 @@ def save_data(unique_products, filename=OUTPUT_FILE):
         with open(sync_output, "w", encoding="utf-8") as f:
             json.dump(result_list, f, ensure_ascii=False, indent=2)
 
-def scrape_sku_deep(sku, unique_products, cookies):
+def parse_search_result(html):
+    """Primer producto de una página de búsqueda: (nombre, precio, ean, imagen) o None."""
+    soup = BeautifulSoup(html, "html.parser")
+    item = soup.select_one(".product-item")
+    if not item: return None
+
+    nombre_elem = item.select_one(".product-item-name a")
+    if not nombre_elem: return None
+    nombre = nombre_elem.get_text(strip=True)
+
+    price_elem = item.select_one('span[id^="price-including-tax-"] .price') or item.select_one(".price")
+    precio = clean_price(price_elem.get_text(strip=True)) if price_elem else 0
+
+    ean = extract_ean(item)
+    img_url = ""
+    img_tag = item.select_one("img.product-image-photo")
+    if img_tag:
+        img_url = img_tag.get('src') or img_tag.get('data-src') or ""
+    return [nombre, precio, ean, img_url]
+
+class BusquedaFallida(Exception):
+    """Alguna variante de la búsqueda no tuvo respuesta válida (error de red, status != 200 o bloqueo)."""
+
+
+def scrape_sku_deep(sku, cookies):
+    """
+    Busca un SKU/EAN en el sitio (no toca estado compartido). Devuelve el
+    producto, o None si el sitio respondió que no hay resultados para todas
+    las variantes. Si no lo encontró y alguna variante no obtuvo respuesta
+    válida levanta BusquedaFallida: eso no es un "no encontrado" y no se debe
+    registrar como hecho.
+    """
     # Probamos con el SKU original (con ceros) y limpio
     variants = [sku, sku.lstrip('0')]
+    ultimo_error = None
     for s in variants:
         url = f"{URL_BASE_SITE}/{SUCURSAL}/catalogsearch/result/?q={s}"
         try:
-            r = curl_requests.get(url, impersonate="chrome110", timeout=15, cookies=cookies)
-            if r.status_code != 200: continue
-            
-            soup = BeautifulSoup(r.text, "html.parser")
-            item = soup.select_one(".product-item")
-            if not item: continue
-            
-            nombre_elem = item.select_one(".product-item-name a")
-            if not nombre_elem: continue
-            nombre = nombre_elem.get_text(strip=True)
-            
-            price_elem = item.select_one('span[id^="price-including-tax-"] .price') or item.select_one(".price")
-            precio = clean_price(price_elem.get_text(strip=True)) if price_elem else 0
-            
-            ean = extract_ean(item)
-            img_url = ""
-            img_tag = item.select_one("img.product-image-photo")
-            if img_tag:
-                img_url = img_tag.get('src') or img_tag.get('data-src') or ""
-
-            if sku not in unique_products:
-                unique_products[sku] = {
-                    "nombre": nombre, "precio": precio, "sku": sku, "ean": ean,
-                    "sector": "Almacén", "subcategoria": "Maestro",
-                    "imagen": img_url, "fuente": "Maxiconsumo"
-                }
-                return True
-        except Exception:
+            r = HTTP.get(url, impersonate="chrome110", timeout=15, cookies=cookies)
+        except Exception as e:
+            ultimo_error = e
+            continue
+        if r.status_code != 200 or es_bloqueo(r):
+            ultimo_error = f"status {r.status_code}"
+            continue
+
+        encontrado = parsear_respuesta(r, parse_search_result)
+        if not encontrado: continue
+        nombre, precio, ean, img_url = encontrado
+
+        return {
+            "nombre": nombre, "precio": precio, "sku": sku, "ean": ean,
+            "sector": "Almacén", "subcategoria": "Maestro",
+            "imagen": img_url, "fuente": "Maxiconsumo"
+        }
+    if ultimo_error is not None:
+        raise BusquedaFallida(f"{sku}: {ultimo_error}")
+    return None
+
+def ultimo_barrido(directorio):
+    """Id del último barrido --maestro si empezó hace menos de BARRIDO_DIAS, sino None."""
+    limite = datetime.now() - timedelta(days=BARRIDO_DIAS)
+    for barrido in reversed(bitacoras(directorio, BITACORA_MAESTRO)):
+        try:
+            inicio = datetime.strptime(barrido, FORMATO_BARRIDO)
+        except ValueError:
+            continue   # bitácoras por día de versiones anteriores
+        return barrido if inicio > limite else None
+    return None
+
+
+def pendientes_barrido(eans, bitacora):
+    """[(ean, ean_str)] de los EANs válidos que la bitácora no tiene, y cuántos ya tiene."""
+    pendientes = []
+    hechas = 0
+    for ean in eans:
+        try:
+            ean_str = str(int(float(ean)))
+        except (TypeError, ValueError):
             continue
-    return False
+        if len(ean_str) < 8:
+            continue
+        if bitacora.completada("maestro", ean_str):
+            hechas += 1
+        else:
+            pendientes.append((ean, ean_str))
+    return pendientes, hechas
+
+
+def escritor(cola, bitacora, total):
+    """Único consumidor de la cola: cada EAN procesado va a la bitácora (append + flush)."""
+    procesados = encontrados = 0
+    while True:
+        item = cola.get()
+        if item is None:
+            return
+        ean_str, productos = item
+        bitacora.registrar("maestro", ean_str, productos)
+        procesados += 1
+        encontrados += bool(productos)
+        if procesados % 100 == 0:
+            print(f"--- 💾 {procesados}/{total} EANs procesados, {encontrados} capturados ---")
+
 
 def main():
+    global HTTP
     use_maestro = "--maestro" in sys.argv
-    unique_products = {}
     cookies = get_cookies_dict()
+    if "--sin-cache" not in sys.argv:
+        HTTP = SesionCacheada(curl_requests, cache_target("maxiconsumo_busquedas"))
 
     from concurrent.futures import ThreadPoolExecutor
     
     if use_maestro:
-        print(f"🚀 TURBO ACTIVADO: 5 Trabajadores en paralelo - {SUCURSAL}")
+        workers = opcion("workers", WORKERS)
+        print(f"🚀 TURBO ACTIVADO: {workers} Trabajadores en paralelo - {SUCURSAL}")
         df_maestro = pd.read_excel(EXCEL_PATH, sheet_name="Sheet1")
         df_maxi = pd.read_excel(EXCEL_PATH, sheet_name="MAXICONSUMO")
         
@@ -104,30 +192,66 @@ def main():
 
         eans = df_maestro[col_ean].dropna().unique().tolist()
         maxi_map = df_maxi.set_index(col_ean_m)[col_sku_m].to_dict() if col_ean_m else {}
+
+        # Los EANs ya procesados en este barrido (con o sin match) están en su bitácora: se
+        # saltean. --reanudar=<id> retoma ese barrido; --reiniciar arranca uno nuevo.
+        directorio = os.path.dirname(os.path.abspath(__file__))
+        reiniciar = "--reiniciar" in sys.argv
+        elegido = opcion("reanudar")
+        barrido = elegido or (None if reiniciar else ultimo_barrido(directorio))
+        bitacora = pendientes = None
+        if barrido:
+            bitacora = BitacoraCrawl(directorio, BITACORA_MAESTRO, fecha=barrido, reiniciar=reiniciar and bool(elegido))
+            pendientes, hechas = pendientes_barrido(eans, bitacora)
+            if not pendientes and not elegido:
+                bitacora.cerrar()   # el último barrido está completo: se arranca otro
+                bitacora = None
+        if bitacora is None:
+            barrido = datetime.now().strftime(FORMATO_BARRIDO)
+            bitacora = BitacoraCrawl(directorio, BITACORA_MAESTRO, fecha=barrido)
+            pendientes, hechas = pendientes_barrido(eans, bitacora)
         
-        print(f"📦 Procesando {len(eans)} referencias. ¡Mirá la pantalla! 👇")
+        print(f"📦 Barrido {barrido}: procesando {len(pendientes)} referencias ({hechas} ya hechas). ¡Mirá la pantalla! 👇")
+
+        cola = queue.Queue()
+        hilo_escritor = threading.Thread(target=escritor, args=(cola, bitacora, len(pendientes)), daemon=True)
+        hilo_escritor.start()
 
-        def task(ean):
+        def task(item):
+            ean, ean_str = item
+            # Sólo las respuestas definitivas (encontrado / sin resultados) van a la
+            # bitácora; un request fallido deja el EAN pendiente para la próxima corrida
             try:
-                ean_str = str(int(float(ean)))
-                if not ean_str or len(ean_str) < 8: return
                 sku_val = maxi_map.get(ean)
                 sku_ref = str(sku_val).split('.')[0] if not pd.isna(sku_val) else ""
                 
-                if scrape_sku_deep(ean_str, unique_products, cookies):
+                producto = scrape_sku_deep(ean_str, cookies)
+                if producto:
                     print(f" ✅ EAN {ean_str} CAPTURADO")
-                elif sku_ref and sku_ref != "nan" and scrape_sku_deep(sku_ref, unique_products, cookies):
-                    print(f" ✅ SKU {sku_ref} CAPTURADO (extra)")
-                else:
-                    pass # Evitamos llenar la consola si no hay match
-            except: pass
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            for i, _ in enumerate(executor.map(task, eans), 1):
-                if i % 100 == 0:
-                    save_data(unique_products, "output_maxiconsumo.json")
-                    print(f"--- 💾 Snapshot guardado: {len(unique_products)} total ---")
-                    
+                elif sku_ref and sku_ref != "nan":
+                    producto = scrape_sku_deep(sku_ref, cookies)
+                    if producto:
+                        print(f" ✅ SKU {sku_ref} CAPTURADO (extra)")
+                cola.put((ean_str, [producto] if producto else []))
+            except BusquedaFallida as e:
+                print(f" ⚠️ EAN {ean_str} sin respuesta ({e}): queda pendiente")
+            except Exception as e:
+                print(f" ❌ EAN {ean_str}: {e}")
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for _ in executor.map(task, pendientes):
+                    pass
+        finally:
+            cola.put(None)
+            hilo_escritor.join()
+            bitacora.cerrar()
+
+        # Un único snapshot al final, armado desde la bitácora de todo el barrido
+        unique_products = {}
+        for reg in bitacora.registros():
+            for p in reg["productos"]:
+                unique_products.setdefault(p["sku"], p)
         save_data(unique_products, "output_maxiconsumo.json")
         print(f"\n✅ Proceso finalizado. Total Global Maxi: {len(unique_products)} materiales.")
     else:
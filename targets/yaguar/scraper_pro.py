@@ -6,9 +6,10 @@ Scraping completo con login, paginación, retry automático y validación.
 """
 
 import os
-import json
+import sys
 import re
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from bs4 import BeautifulSoup
 from curl_cffi import requests as curl_requests
@@ -20,6 +21,17 @@ load_dotenv()
 # El scraper funciona sin over-engineering
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+from scripts.core import parseo
+from scripts.core.bitacora import BitacoraCrawl
+from scripts.core.cache_http import SesionCacheada, cache_target, parsear_respuesta
+from scripts.core.delta import EstadoDelta, huella_pagina
+from scripts.core.crawler import Objetivo, Tarea
+from scripts.core.limitador import LimitadorAdaptativo, limitador_host
+from scripts.core.salida import SalidaJsonl, ruta_salida
+from scripts.core.opciones import opcion
+from config import YAGUAR_CONFIG
 
 CATEGORIAS = [
     {"slug": "almacen",    "nombre": "Almacén"},
@@ -46,8 +58,13 @@ HEADERS = {
 }
 
 IMPERSONATE = "safari15_3"
-DELAY_ENTRE_PAGINAS = 1.0   # segundos entre páginas
-DELAY_ENTRE_CATEGORIAS = 2.0
+# Tasa de arranque del modo secuencial (antes 1 s fijo entre páginas); el
+# limitador adaptativo la sube mientras el sitio responde bien y frena ante 429/403
+RPS_SECUENCIAL = YAGUAR_CONFIG["rps_inicial"]
+
+# Modo concurrente (--concurrente): hilos y presupuesto global de requests/seg
+WORKERS = YAGUAR_CONFIG["workers"]
+REQUESTS_POR_SEGUNDO = YAGUAR_CONFIG["requests_por_segundo"]
 
 # Configuración simple
 MIN_PRODUCTS_EXPECTED = 1000  # Mínimo de productos esperados
@@ -99,9 +116,13 @@ def login(session):
 
 def obtener_max_pagina(soup):
     """Extrae el número total de páginas leyendo los hrefs de paginación."""
+    return _max_pagina(a["href"] for a in soup.find_all("a", href=True))
+
+
+def _max_pagina(hrefs):
     max_page = 1
-    for a in soup.find_all("a", href=True):
-        m = re.search(r"/page/(\d+)/", a["href"])
+    for href in hrefs:
+        m = re.search(r"/page/(\d+)/", href)
         if m:
             num = int(m.group(1))
             if num > max_page:
@@ -168,16 +189,7 @@ def parsear_productos(soup, categoria_nombre):
             link_elem = item.select_one('a[href*="/producto/"]')
             link = link_elem["href"] if link_elem else ""
 
-            productos.append({
-                "nombre": nombre,
-                "sku": sku,
-                "precio": precio,
-                "imagen": imagen,
-                "link": link,
-                "categoria": categoria_nombre,
-                "fuente": "Yaguar",
-                "fecha": datetime.now().strftime("%Y-%m-%d"),
-            })
+            productos.append(_producto(nombre, sku, precio, imagen, link, categoria_nombre))
 
         except Exception:
             continue
@@ -185,48 +197,155 @@ def parsear_productos(soup, categoria_nombre):
     return productos
 
 
-def scrapear_categoria(session, slug, nombre, idx, total):
-    """Scrapea todas las páginas de una categoría."""
+def _producto(nombre, sku, precio, imagen, link, categoria_nombre):
+    return {
+        "nombre": nombre,
+        "sku": sku,
+        "precio": precio,
+        "imagen": imagen,
+        "link": link,
+        "categoria": categoria_nombre,
+        "fuente": "Yaguar",
+        "fecha": datetime.now().strftime("%Y-%m-%d"),
+    }
+
+
+# Mismos selectores que parsear_productos/obtener_max_pagina, compilados una vez
+_XP = parseo.compilar(
+    items=f"//*[{parseo.clase('e-loop-item')}]",
+    nombre=f".//h3[{parseo.clase('product_title')} and {parseo.clase('entry-title')}]",
+    h2=".//h2",
+    precio=f".//*[{parseo.clase('woocommerce-Price-amount')} and {parseo.clase('amount')}]",
+    img=".//img",
+    link='.//a[contains(@href, "/producto/")]',
+    hrefs="//a/@href",
+)
+
+
+def _parsear_productos_lxml(doc, categoria_nombre):
+    """parsear_productos sobre un árbol lxml."""
+    productos = []
+
+    for item in _XP.items(doc):
+        try:
+            nombre_elem = parseo.primero(_XP.nombre, item)
+            if nombre_elem is None:
+                continue
+            nombre = parseo.texto(nombre_elem)
+            if not nombre or len(nombre) < 3:
+                continue
+
+            sku = ""
+            for h2 in _XP.h2(item):
+                m_sku = re.search(r"Cod\.?\s*(\d+)", parseo.texto(h2, strip=False))
+                if m_sku:
+                    sku = m_sku.group(1)
+                    break
+
+            precio = 0.0
+            precio_elem = parseo.primero(_XP.precio, item)
+            if precio_elem is not None:
+                precio = limpiar_precio(parseo.texto(precio_elem))
+
+            if precio <= 0:
+                continue
+
+            img_elem = parseo.primero(_XP.img, item)
+            imagen = ""
+            if img_elem is not None:
+                imagen = img_elem.get("src", img_elem.get("data-src", ""))
+
+            link_elem = parseo.primero(_XP.link, item)
+            link = link_elem.get("href") if link_elem is not None else ""
+
+            productos.append(_producto(nombre, sku, precio, imagen, link, categoria_nombre))
+
+        except Exception:
+            continue
+
+    return productos
+
+
+def parsear_listado(html, categoria_nombre):
+    """Productos y cantidad de páginas de un listado, con el backend de parseo activo."""
+    if parseo.BACKEND == "lxml":
+        doc = parseo.documento(html)
+        if doc is None:
+            return [], 1
+        return _parsear_productos_lxml(doc, categoria_nombre), _max_pagina(_XP.hrefs(doc))
+    soup = BeautifulSoup(html, "html.parser")
+    return parsear_productos(soup, categoria_nombre), obtener_max_pagina(soup)
+
+
+def scrapear_categoria(session, slug, nombre, idx, total, bitacora=None, salida=None, estado=None):
+    """
+    Scrapea todas las páginas de una categoría.
+    Con `bitacora`, las páginas ya completadas hoy se toman de ahí sin pedirlas
+    y cada página nueva queda registrada apenas se parsea.
+    Con `salida` (SalidaJsonl), cada página se escribe al output apenas se obtiene.
+    Con `estado` (EstadoDelta) en modo delta, si la página 1 no cambió se omite
+    el resto de la categoría.
+    """
     base_cat_url = f"{BASE_URL}/categoria-producto/{slug}/"
+    limitador = limitador_host(BASE_URL, RPS_SECUENCIAL)
 
     def _get_first_page():
-        r = session.get(base_cat_url, headers=HEADERS, impersonate=IMPERSONATE, timeout=30)
+        r = limitador.pedir(session.get, base_cat_url, headers=HEADERS, impersonate=IMPERSONATE, timeout=30)
         if r.status_code != 200 or "login" in r.url:
             raise Exception(f"Error accediendo a categoría (status {r.status_code})")
         return r
 
     def _get_page(pagina):
         url_pagina = f"{base_cat_url}page/{pagina}/"
-        r = session.get(url_pagina, headers=HEADERS, impersonate=IMPERSONATE, timeout=30)
+        r = limitador.pedir(session.get, url_pagina, headers=HEADERS, impersonate=IMPERSONATE, timeout=30)
         if r.status_code != 200:
             raise Exception(f"Página {pagina}: status {r.status_code}")
         return r
 
     try:
-        r = _get_first_page()
-        soup = BeautifulSoup(r.text, "html.parser")
-        max_pagina = obtener_max_pagina(soup)
-        todos = parsear_productos(soup, nombre)
+        if bitacora and bitacora.completada(slug, 1):
+            max_pagina = bitacora.meta(slug, 1, "max_pagina", 1)
+            todos = list(bitacora.productos(slug, 1))
+        else:
+            r = _get_first_page()
+            todos, max_pagina = parsear_respuesta(r, parsear_listado, nombre)
+            if bitacora and todos:   # una página vacía (bloqueo, challenge) se vuelve a pedir
+                bitacora.registrar(slug, 1, todos, max_pagina=max_pagina)
 
         print(f"\n[{idx}/{total}] Sector: {nombre}")
+        huella = huella_pagina(todos, max_pagina)
+        if estado and estado.sin_cambios(slug, huella):
+            print(f"  {nombre.lower()}: sin cambios, se omite ({estado.productos_previos(slug)} productos la última vez)")
+            return []
+        if salida:
+            salida.escribir(todos)
         print(f"  {nombre.lower()}: ~{max_pagina * len(todos)} productos estimados ({max_pagina} páginas)")
 
+        completa = True
         for pagina in range(2, max_pagina + 1):
             try:
-                r = _get_page(pagina)
-                soup = BeautifulSoup(r.text, "html.parser")
-                prods = parsear_productos(soup, nombre)
+                if not (bitacora and bitacora.completada(slug, pagina)):
+                    r = _get_page(pagina)
+                    prods, _ = parsear_respuesta(r, parsear_listado, nombre)
+                    if bitacora and prods:
+                        bitacora.registrar(slug, pagina, prods)
+                else:
+                    prods = bitacora.productos(slug, pagina)
                 if not prods:
                     break
                 todos.extend(prods)
+                if salida:
+                    salida.escribir(prods)
                 if pagina % 5 == 0 or pagina == max_pagina:
-                    print(f"    Pag {pagina}/{max_pagina}: {len(todos)} unicos acumulados")
-                time.sleep(DELAY_ENTRE_PAGINAS)
+                    print(f"    Pag {pagina}/{max_pagina}: {len(todos)} unicos acumulados ({limitador.rps:.1f} req/s)")
             except Exception as e:
                 print(f"  ❌ Error en página {pagina}: {e}")
+                completa = False
                 break
 
         print(f"  {nombre.lower()}: {len(todos)} productos totales")
+        if estado and completa:
+            estado.registrar(slug, huella, len(todos))
         return todos
 
     except Exception as e:
@@ -234,6 +353,183 @@ def scrapear_categoria(session, slug, nombre, idx, total):
         return []
 
 
+# ---------------------------------------------------------------------------
+# Modo concurrente
+# ---------------------------------------------------------------------------
+_hilo = threading.local()
+
+
+def _sesion_hilo(cookies, cache=None):
+    """Sesión propia de cada hilo (curl no comparte handles), con las cookies del login."""
+    s = getattr(_hilo, "session", None)
+    if s is None:
+        s = curl_requests.Session()
+        s.cookies.update(cookies)
+        if cache:
+            s = SesionCacheada(s, cache)
+        _hilo.session = s
+    return s
+
+
+def _descargar_pagina(cookies, limitador, url, cache=None):
+    """Descarga una página respetando el presupuesto global de requests."""
+    r = limitador.pedir(_sesion_hilo(cookies, cache).get, url, headers=HEADERS, impersonate=IMPERSONATE, timeout=30)
+    if r.status_code != 200 or "login" in r.url:
+        raise Exception(f"status {r.status_code}")
+    return r
+
+
+def scrapear_concurrente(session, categorias, workers=WORKERS, rps=REQUESTS_POR_SEGUNDO, bitacora=None, salida=None, estado=None):
+    """
+    Scrapea todas las categorías con `workers` hilos y un límite global de `rps`.
+    Primero baja la página 1 de cada categoría para conocer max_pagina y luego
+    encola el resto de las páginas. Devuelve {nombre_categoria: [productos]}.
+    Las páginas ya registradas en `bitacora` no se vuelven a pedir; con `salida`
+    cada página se escribe al output a medida que se ensambla. Con `estado` en
+    modo delta, las categorías cuya página 1 no cambió no encolan el resto.
+    """
+    limitador = LimitadorAdaptativo(rps, rafaga=workers)
+    cookies = session.cookies
+    cache = getattr(session, "cache", None)   # si la sesión principal usa cache HTTP, los hilos también
+    total = len(categorias)
+    resultados = {}
+
+    def _pendiente(slug, pagina, url):
+        if bitacora and bitacora.completada(slug, pagina):
+            return None
+        return pool.submit(_descargar_pagina, cookies, limitador, url, cache)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        primeras = [
+            _pendiente(cat["slug"], 1, f"{BASE_URL}/categoria-producto/{cat['slug']}/")
+            for cat in categorias
+        ]
+
+        pendientes = []   # (slug, nombre, huella, productos_pag1, [(pagina, future | None)])
+        for idx, (cat, fut) in enumerate(zip(categorias, primeras), start=1):
+            slug, nombre = cat["slug"], cat["nombre"]
+            if fut is None:
+                max_pagina = bitacora.meta(slug, 1, "max_pagina", 1)
+                todos = list(bitacora.productos(slug, 1))
+            else:
+                try:
+                    r = fut.result()
+                except Exception as e:
+                    print(f"  ❌ Error en categoría {nombre}: {e}")
+                    resultados[nombre] = []
+                    continue
+                todos, max_pagina = parsear_respuesta(r, parsear_listado, nombre)
+                if bitacora and todos:
+                    bitacora.registrar(slug, 1, todos, max_pagina=max_pagina)
+
+            print(f"\n[{idx}/{total}] Sector: {nombre}")
+            huella = huella_pagina(todos, max_pagina)
+            if estado and estado.sin_cambios(slug, huella):
+                print(f"  {nombre.lower()}: sin cambios, se omite ({estado.productos_previos(slug)} productos la última vez)")
+                resultados[nombre] = []
+                continue
+            print(f"  {nombre.lower()}: ~{max_pagina * len(todos)} productos estimados ({max_pagina} páginas)")
+
+            base_cat_url = f"{BASE_URL}/categoria-producto/{slug}/"
+            futuros = [
+                (pagina, _pendiente(slug, pagina, f"{base_cat_url}page/{pagina}/"))
+                for pagina in range(2, max_pagina + 1)
+            ]
+            pendientes.append((slug, nombre, huella, todos, futuros))
+
+        # Ensamblar en orden de página: igual que el modo secuencial, se corta
+        # en la primera página vacía o con error.
+        for slug, nombre, huella, todos, futuros in pendientes:
+            if salida:
+                salida.escribir(todos)
+            completa = True
+            for i, (pagina, fut) in enumerate(futuros):
+                if fut is None:
+                    prods = bitacora.productos(slug, pagina)
+                else:
+                    try:
+                        prods, _ = parsear_respuesta(fut.result(), parsear_listado, nombre)
+                        if bitacora and prods:
+                            bitacora.registrar(slug, pagina, prods)
+                    except Exception as e:
+                        print(f"  ❌ Error en página {pagina} ({nombre}): {e}")
+                        prods = []
+                        completa = False
+                if not prods:
+                    for _, resto in futuros[i + 1:]:
+                        if resto is not None:
+                            resto.cancel()
+                    break
+                todos.extend(prods)
+                if salida:
+                    salida.escribir(prods)
+            print(f"  {nombre.lower()}: {len(todos)} productos totales")
+            if estado and completa:
+                estado.registrar(slug, huella, len(todos))
+            resultados[nombre] = todos
+
+    print(f"  Limitador: {limitador.metricas()}")
+    return resultados
+
+
+# ---------------------------------------------------------------------------
+# Objetivo para el crawler async (scrape_todos.py)
+# ---------------------------------------------------------------------------
+class ObjetivoYaguar(Objetivo):
+    """Categorías de Yaguar: la página 1 de cada una define cuántas páginas encolar."""
+
+    nombre = "yaguar"
+    rps = REQUESTS_POR_SEGUNDO
+    concurrencia = WORKERS
+    impersonate = IMPERSONATE
+    headers = HEADERS
+
+    def preparar(self):
+        session = curl_requests.Session()
+        if not login(session):
+            return None
+        return session.cookies.get_dict()
+
+    def tareas_iniciales(self):
+        return [
+            Tarea(f"{BASE_URL}/categoria-producto/{cat['slug']}/", clave=(i, 1), datos={"categoria": cat["nombre"], "pagina": 1})
+            for i, cat in enumerate(CATEGORIAS)
+        ]
+
+    def parsear(self, tarea, r):
+        if r.status_code != 200 or "login" in r.url:
+            raise Exception(f"status {r.status_code}")
+        productos, max_pagina = parsear_listado(r.text, tarea.datos["categoria"])
+        nuevas = []
+        if tarea.datos["pagina"] == 1:
+            nuevas = [
+                Tarea(f"{tarea.url}page/{pagina}/", clave=(tarea.clave[0], pagina),
+                      datos={"categoria": tarea.datos["categoria"], "pagina": pagina})
+                for pagina in range(2, max_pagina + 1)
+            ]
+        return productos, nuevas
+
+    def guardar(self, productos):
+        return guardar_productos(productos)
+
+
+def abrir_salida(comprimir=False, delta=False, columnar=False):
+    """Output JSONL con timestamp de esta corrida (.jsonl.gz si comprimir).
+    En modo delta es delta_yaguar_<ts>: sólo las categorías re-scrapeadas.
+    Con columnar, al cerrar se escribe también la versión columnar (--columnar)."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    prefijo = "delta_yaguar" if delta else "output_yaguar"
+    return SalidaJsonl(ruta_salida(os.path.join(BASE_DIR, "targets", "yaguar"), f"{prefijo}_{timestamp}", comprimir),
+                       columnar=columnar)
+
+
+def guardar_productos(productos):
+    """Escribe el output de una sola vez y devuelve la ruta."""
+    with abrir_salida() as salida:
+        salida.escribir(productos)
+    return salida.ruta
+
+
 def main():
     print("🚀 Scraper Yaguar PRO — Catálogo Completo")
     print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -244,37 +540,69 @@ def main():
     if not login(session):
         print("❌ Login fallido")
         return None
+    # Cache HTTP en disco: revalida con ETag/Last-Modified y no reparsea páginas idénticas
+    cache = None
+    if "--sin-cache" not in sys.argv:
+        cache = cache_target("yaguar")
+        session = SesionCacheada(session, cache)
 
-    todos_los_productos = []
     resumen = {}
 
     total_cats = len(CATEGORIAS)
     print(f"Sectores a scrapear: {total_cats}")
+    # --bs4 fuerza el parser original en Python puro
+    if "--bs4" in sys.argv:
+        parseo.usar_backend("bs4")
+    print(f"Parser HTML: {parseo.BACKEND}")
     print("=" * 55)
 
-    for idx, cat in enumerate(CATEGORIAS, start=1):
-        productos = scrapear_categoria(session, cat["slug"], cat["nombre"], idx, total_cats)
-        todos_los_productos.extend(productos)
-        resumen[cat["nombre"]] = len(productos)
-        time.sleep(DELAY_ENTRE_CATEGORIAS)
-
-    # Guardar output
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(BASE_DIR, "targets", "yaguar", f"output_yaguar_{timestamp}.json")
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(todos_los_productos, f, ensure_ascii=False, indent=2)
+    # Checkpoints del día: --reiniciar descarta lo ya scrapeado hoy
+    bitacora = BitacoraCrawl(os.path.join(BASE_DIR, "targets", "yaguar"), "yaguar",
+                             reiniciar="--reiniciar" in sys.argv)
+
+    # --delta: sólo las categorías cuya página 1 cambió (o con refresco completo vencido)
+    modo_delta = "--delta" in sys.argv
+    estado = EstadoDelta(os.path.join(BASE_DIR, "targets", "yaguar"), "yaguar", activo=modo_delta)
+
+    # Output en streaming: cada página se agrega al .jsonl apenas se parsea
+    salida = abrir_salida(comprimir="--gzip" in sys.argv, delta=modo_delta, columnar="--columnar" in sys.argv)
+    print(f"💾 Escribiendo en: {salida.ruta}")
+
+    if "--concurrente" in sys.argv:
+        workers = opcion("workers", WORKERS)
+        rps = opcion("rps", REQUESTS_POR_SEGUNDO)
+        print(f"Modo concurrente: {workers} hilos, {rps} req/s iniciales")
+        por_categoria = scrapear_concurrente(session, CATEGORIAS, workers, rps,
+                                             bitacora=bitacora, salida=salida, estado=estado)
+        for cat in CATEGORIAS:
+            resumen[cat["nombre"]] = len(por_categoria.get(cat["nombre"], []))
+    else:
+        for idx, cat in enumerate(CATEGORIAS, start=1):
+            productos = scrapear_categoria(session, cat["slug"], cat["nombre"], idx, total_cats,
+                                           bitacora=bitacora, salida=salida, estado=estado)
+            resumen[cat["nombre"]] = len(productos)
+        print(f"  Limitador: {limitador_host(BASE_URL, RPS_SECUENCIAL).metricas()}")
+    bitacora.cerrar()
+    salida.cerrar()
+    estado.guardar()
 
-    print(f"\n💾 Guardado en: {output_file}")
     print("\n" + "=" * 50)
     print(f"✅ Scraping completo")
-    print(f"📦 Total productos: {len(todos_los_productos)}")
-    print(f"💾 Guardado en: {output_file}")
+    print(f"📦 Total productos: {salida.total}")
+    if modo_delta:
+        print(f"♻️  Categorías sin cambios omitidas: {len(estado.omitidas)}/{total_cats}")
+        if not salida.total:
+            salida.descartar()
+            print("💾 Nada cambió: no se genera delta")
+            return None
+    print(f"💾 Guardado en: {salida.ruta}")
+    if cache:
+        print(f"🗂️  Cache HTTP: {cache.aciertos} páginas sin cambios, {cache.descargas} nuevas")
     print("\nResumen por categoría:")
     for cat_nombre, count in resumen.items():
         print(f"  {cat_nombre}: {count}")
 
-    return todos_los_productos
+    return salida.ruta
 
 
 if __name__ == "__main__":
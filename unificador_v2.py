@@ -8,9 +8,13 @@ Misma logica que actualizar_catalogo.py con tres mejoras:
   3. Reporte detallado al final
 """
 
-import os, json, glob, re, unicodedata
+import os, json, re
 from datetime import datetime
-from collections import defaultdict
+
+from scripts.core.indice_jaccard import indice_persistente
+from scripts.core.normalizacion import tokenizar
+from scripts.core.referencia import compilado, hojas
+from scripts.core.salida import leer_productos, listar_outputs, manifiesto
 
 try:
     import openpyxl
@@ -26,6 +30,7 @@ MAXICONSUMO_DIR = os.path.join(BASE_DIR, "targets", "maxiconsumo")
 CODIGOS_FILE    = os.path.join(BASE_DIR, "data", "raw", "CODIGOS.xlsx")
 MAESTRO_FILE    = os.path.join(BASE_DIR, "data", "raw", "Listado Maestro 09-03.xlsx")
 OUTPUT_FILE     = os.path.join(BASE_DIR, "BRUJULA-DE-PRECIOS", "data", "processed", "catalogo_unificado.json")
+INDICE_FILE     = os.path.join(BASE_DIR, "data", "cache_indices", "maestro_unificador.npz")
 
 _FUZZ_TH = 0.75  # subido desde 0.60
 
@@ -51,21 +56,8 @@ def norm_sector(raw):
     return SECTOR_MAP.get((raw or "").lower().strip(), (raw or "Almacén").strip().title())
 
 def norm_nombre(nombre):
-    n = (nombre or "").lower().strip()
-    n = unicodedata.normalize("NFD", n)
-    n = "".join(c for c in n if unicodedata.category(c) != "Mn")
-    n = re.sub(r"(\d),(\d)", r"\1.\2", n)
-    n = re.sub(r"[^a-z0-9. ]", " ", n)
-    n = re.sub(r"\bx\s*(\d)", r"\1", n)
-    n = re.sub(r"(\d+\.?\d*)\s*lts?\b", lambda m: str(int(float(m.group(1))*1000))+"ml", n)
-    n = re.sub(r"(\d+\.?\d*)\s*lt\b",   lambda m: str(int(float(m.group(1))*1000))+"ml", n)
-    n = re.sub(r"(\d+\.?\d*)\s*l\b",    lambda m: str(int(float(m.group(1))*1000))+"ml", n)
-    n = re.sub(r"(\d+)\s*grs\b", lambda m: m.group(1)+"gr", n)
-    n = re.sub(r"(\d+\.?\d*)\s*kgs?\b", lambda m: str(int(float(m.group(1))*1000))+"gr", n)
-    n = re.sub(r"(\d+)\s*uni\b", lambda m: m.group(1)+"un", n)
-    n = re.sub(r"(\d+)\s*(cc|ml|gr|kg|un)\b", r"\1\2", n)
-    n = re.sub(r"\.", " ", n)
-    return re.sub(r"\s+", " ", n).strip()
+    # Variante sin cm3/ccm ni "ul" de la clave del catálogo
+    return tokenizar(nombre, unidades_extra=False).clave
 
 def display_nombre(nombre):
     n = (nombre or "").strip()
@@ -96,35 +88,39 @@ def precio_valido(p): return p > 200
 
 # ---------------------------------------------------------------------------
 def cargar_excel():
+    if not EXCEL_OK:
+        return {}, {}, {}, {}, {}, {}
+    fuentes = [f for f in (CODIGOS_FILE, MAESTRO_FILE) if os.path.isfile(f)] + [os.path.abspath(__file__)]
+    mapas = compilado("referencia_unificador", fuentes, _leer_excel)
+    print(f"  Referencia: Yaguar={len(mapas[0])} SKUs, Maxiconsumo={len(mapas[1])} SKUs, "
+          f"Maestro={len(mapas[4])} EANs")
+    return mapas
+
+def _leer_excel():
     yag_sku_ean, mco_sku_ean = {}, {}
     ean_yag_sku, ean_mco_sku = {}, {}
     ean_master, nombre_ean   = {}, {}
 
-    if not EXCEL_OK:
-        return yag_sku_ean, mco_sku_ean, ean_yag_sku, ean_mco_sku, ean_master, nombre_ean
-
     if os.path.isfile(CODIGOS_FILE):
-        wb = openpyxl.load_workbook(CODIGOS_FILE, read_only=True, data_only=True)
-        for row in wb["YAGUAR"].iter_rows(min_row=2, values_only=True):
+        wb = hojas(CODIGOS_FILE)
+        for row in wb["YAGUAR"][1:]:
             try:
                 sku, ean = str(int(row[1])), str(int(row[2]))
                 if len(ean) >= 8:
                     yag_sku_ean[sku] = ean
                     ean_yag_sku[ean] = sku
             except: pass
-        for row in wb["MAXICONSUMO"].iter_rows(min_row=2, values_only=True):
+        for row in wb["MAXICONSUMO"][1:]:
             try:
                 sku, ean = str(int(row[1])), str(int(row[3]))
                 if len(ean) >= 8:
                     mco_sku_ean[sku] = ean
                     ean_mco_sku[ean] = sku
             except: pass
-        wb.close()
         print(f"  CODIGOS: Yaguar={len(yag_sku_ean)} SKUs, Maxiconsumo={len(mco_sku_ean)} SKUs")
 
     if os.path.isfile(MAESTRO_FILE):
-        wb = openpyxl.load_workbook(MAESTRO_FILE, read_only=True, data_only=True)
-        for row in wb["Sheet1"].iter_rows(min_row=2, values_only=True):
+        for row in hojas(MAESTRO_FILE)["Sheet1"][1:]:
             nombre, abc, sector, ean_col, barcode = row[1], row[2], row[3], row[6], row[8]
             ean_val = None
             for v in (ean_col, barcode):
@@ -141,65 +137,52 @@ def cargar_excel():
             clave = norm_nombre(nombre_str)
             if clave and len(clave) > 5:
                 nombre_ean[clave] = ean_val
-        wb.close()
         print(f"  Maestro: {len(ean_master)} EANs, {len(nombre_ean)} nombres indexados")
 
     return yag_sku_ean, mco_sku_ean, ean_yag_sku, ean_mco_sku, ean_master, nombre_ean
 
 # ---------------------------------------------------------------------------
-def cargar_yaguar():
-    archivos = sorted(glob.glob(os.path.join(YAGUAR_DIR, "output_yaguar_*.json")),
-                      key=os.path.getmtime, reverse=True)[:8]
-    sku_mejor = {}
+def _corregidos(ruta):
+    """Productos del output (.json o .jsonl[.gz]) con el fix x1000; el promedio sale del manifiesto."""
+    prom = manifiesto(ruta)["precio_promedio"]
+    for p in leer_productos(ruta):
+        if 0 < p.get("precio",0) < 200 and prom < 200:
+            p["precio"] = round(p["precio"] * 1000, 2)
+        yield p
+
+def _combinar_por_sku(archivos):
+    sku_mejor, vistos = {}, set()
     for f in archivos:
         try:
-            data = json.load(open(f, encoding="utf-8"))
-            if not data: continue
-            prom = sum(p.get("precio",0) for p in data if p.get("precio",0) > 0) / max(sum(1 for p in data if p.get("precio",0) > 0), 1)
-            for p in data:
-                if 0 < p.get("precio",0) < 200 and prom < 200:
-                    p["precio"] = round(p["precio"] * 1000, 2)
+            m = manifiesto(f)
+            if not m["con_precio"] or m["sha1"] in vistos: continue   # no aporta SKUs nuevos
+            vistos.add(m["sha1"])
+            for p in _corregidos(f):
                 sku = str(p.get("sku","")).strip()
                 if sku and p.get("precio",0) > 0 and sku not in sku_mejor:
                     sku_mejor[sku] = p
         except: pass
-    result = list(sku_mejor.values())
+    return list(sku_mejor.values())
+
+def cargar_yaguar():
+    result = _combinar_por_sku(listar_outputs(YAGUAR_DIR, "output_yaguar_", 8))
     print(f"  Yaguar: {len(result)} prods únicos")
     return result
 
 def cargar_maxicarrefour():
-    archivos = sorted(glob.glob(os.path.join(MAXICARRE_DIR, "output_maxicarrefour_*.json")),
-                      key=os.path.getmtime, reverse=True)
-    for f in archivos:
+    for f in listar_outputs(MAXICARRE_DIR, "output_maxicarrefour_"):
         try:
-            data = json.load(open(f, encoding="utf-8"))
-            con_precio = sum(1 for p in data if p.get("precio",0) > 0)
+            con_precio = manifiesto(f)["con_precio"]
             if con_precio > 100:
+                data = list(leer_productos(f))
                 print(f"  MaxiCarrefour: {len(data)} productos ({con_precio} con precio)")
-                if con_precio == 0:
-                    print("  [WARN] Cookies probablemente vencidas")
                 return data
         except: pass
     print("  [SKIP] No se encontró output de MaxiCarrefour")
     return []
 
 def cargar_maxiconsumo():
-    archivos = sorted(glob.glob(os.path.join(MAXICONSUMO_DIR, "output_maxiconsumo_*.json")),
-                      key=os.path.getmtime, reverse=True)[:8]
-    sku_mejor = {}
-    for f in archivos:
-        try:
-            data = json.load(open(f, encoding="utf-8"))
-            if not data: continue
-            prom = sum(p.get("precio",0) for p in data if p.get("precio",0) > 0) / max(sum(1 for p in data if p.get("precio",0) > 0), 1)
-            for p in data:
-                if 0 < p.get("precio",0) < 200 and prom < 200:
-                    p["precio"] = round(p["precio"] * 1000, 2)
-                sku = str(p.get("sku","")).strip()
-                if sku and p.get("precio",0) > 0 and sku not in sku_mejor:
-                    sku_mejor[sku] = p
-        except: pass
-    result = list(sku_mejor.values())
+    result = _combinar_por_sku(listar_outputs(MAXICONSUMO_DIR, "output_maxiconsumo_", 8))
     print(f"  Maxiconsumo: {len(result)} prods únicos")
     return result
 
@@ -211,31 +194,20 @@ def construir_catalogo(yag_data, cf_data, mco_data,
 
     # Índice fuzzy por nombre sobre el Maestro
     _STOP = {"de","la","el","en","y","x","con","por","para","un","una","del","los","las","al","ml","gr","cc","kg"}
-    fuzz_entries = []
-    fuzz_idx = defaultdict(list)
-    for clave, ean in nombre_ean.items():
-        ws = {w for w in clave.split() if len(w) > 1 and w not in _STOP}
-        if not ws: continue
-        i = len(fuzz_entries)
-        fuzz_entries.append((ws, ean))
-        for w in ws: fuzz_idx[w].append(i)
+    fuzz_idx = indice_persistente(
+        INDICE_FILE,
+        (({w for w in clave.split() if len(w) > 1 and w not in _STOP}, ean) for clave, ean in nombre_ean.items()),
+        sorted(_STOP),
+    )
+
+    def palabras_fuzzy(nombre):
+        return {w for w in norm_nombre(nombre).split() if len(w) > 1 and w not in _STOP}
 
     def fuzzy_ean(nombre_prod):
-        cl = norm_nombre(nombre_prod)
-        ws_p = {w for w in cl.split() if len(w) > 1 and w not in _STOP}
+        ws_p = palabras_fuzzy(nombre_prod)
         if not ws_p: return "", 0.0
-        cands = set()
-        for w in ws_p:
-            for i in fuzz_idx.get(w, []): cands.add(i)
-        best_sim, best_ean = 0.0, ""
-        for i in cands:
-            ws_m, ean = fuzz_entries[i]
-            inter = len(ws_p & ws_m)
-            union = len(ws_p | ws_m)
-            sim = inter / union if union else 0.0
-            if sim > best_sim:
-                best_sim, best_ean = sim, ean
-        return (best_ean, best_sim) if best_sim >= _FUZZ_TH else ("", best_sim)
+        best_ean, best_sim = fuzz_idx.mejor(ws_p, _FUZZ_TH)
+        return (best_ean, best_sim) if best_ean else ("", 0.0)
 
     def resolver_ean(sku, sku_map, nombre):
         ean = sku_map.get(str(sku).strip(), "")
@@ -276,18 +248,7 @@ def construir_catalogo(yag_data, cf_data, mco_data,
         if not sku or sku in yag_sku_set: continue
         ean_r = nombre_ean.get(norm_nombre(p.get("nombre","")), "")
         if not ean_r:
-            cl = norm_nombre(p.get("nombre",""))
-            ws_p = {w for w in cl.split() if len(w) > 1 and w not in _STOP}
-            cands = set()
-            for w in ws_p:
-                for i in fuzz_idx.get(w, []): cands.add(i)
-            best_sim, best_ean = 0.0, ""
-            for i in cands:
-                ws_m, ean = fuzz_entries[i]
-                inter = len(ws_p & ws_m); union = len(ws_p | ws_m)
-                sim = inter / union if union else 0.0
-                if sim > best_sim: best_sim, best_ean = sim, ean
-            if best_sim >= _FUZZ1B_TH: ean_r = best_ean
+            ean_r = fuzz_idx.mejor(palabras_fuzzy(p.get("nombre","")), _FUZZ1B_TH)[0] or ""
         if ean_r and ean_r not in ean_yag_sku:
             ean_yag_sku[ean_r] = sku; yag_sku_set.add(sku); ean_yag_nuevos += 1
 
@@ -296,18 +257,7 @@ def construir_catalogo(yag_data, cf_data, mco_data,
         if not sku or sku in mco_sku_set: continue
         ean_r = nombre_ean.get(norm_nombre(p.get("nombre","")), "")
         if not ean_r:
-            cl = norm_nombre(p.get("nombre",""))
-            ws_p = {w for w in cl.split() if len(w) > 1 and w not in _STOP}
-            cands = set()
-            for w in ws_p:
-                for i in fuzz_idx.get(w, []): cands.add(i)
-            best_sim, best_ean = 0.0, ""
-            for i in cands:
-                ws_m, ean = fuzz_entries[i]
-                inter = len(ws_p & ws_m); union = len(ws_p | ws_m)
-                sim = inter / union if union else 0.0
-                if sim > best_sim: best_sim, best_ean = sim, ean
-            if best_sim >= _FUZZ1B_TH: ean_r = best_ean
+            ean_r = fuzz_idx.mejor(palabras_fuzzy(p.get("nombre","")), _FUZZ1B_TH)[0] or ""
         if ean_r and ean_r not in ean_mco_sku:
             ean_mco_sku[ean_r] = sku; mco_sku_set.add(sku); ean_mco_nuevos += 1
 